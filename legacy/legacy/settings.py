@@ -146,3 +146,5 @@ CACHES = {
 INVENTORIES_PER_PAGE = 5
 STORES_PER_PAGE = 5
 WIDGETS_PER_PAGE = 5
+AGGREGATE_CACHE_TIMEOUT = 60 * 60
+INVENTORY_ADJUST_MAX_ROWS = 1000
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, When
+
+from simple.aggregates import bump_version
+from simple.forms import InventoryAdjustForm
+from simple.models import Inventory, Store, StoreInventoryTotals, Widget
+
+INVALID_CHOICE_MSG = 'Select a valid choice. That choice is not one of the available choices.'
+
+ADJUST_UPDATE_SIZE = 500
+
+class InsufficientStock(Exception):
+    def __init__(self, errors):
+        super(InsufficientStock, self).__init__(
+            '{} adjustments would leave a negative quantity'.format(len(errors)))
+        self.errors = errors
+
+def validate_adjustments(rows, user):
+    """
+    rows: list of decoded JSON objects, one per adjustment
+    user: django.contrib.auth.models.User owning the adjusted stores
+    return: (deltas, errors) where deltas is an OrderedDict of
+            (store_id, widget_id) -> summed delta in first seen order and
+            errors maps the index of each rejected row to its errors
+
+    Stores and widgets of the whole batch are checked with one query
+    each.
+    """
+    forms = [InventoryAdjustForm(data=row) if isinstance(row, dict) else None
+             for row in rows]
+    store_ids = set()
+    widget_ids = set()
+    for form in forms:
+        if form is not None and form.is_valid():
+            store_ids.add(form.cleaned_data['store'])
+            widget_ids.add(form.cleaned_data['widget'])
+    stores = set(Store.objects.filter(created_by=user,
+                                      deleted=False,
+                                      pk__in=store_ids).values_list(
+                                      'id', flat=True))
+    widgets = set(Widget.objects.filter(deleted=False,
+                                        pk__in=widget_ids).values_list(
+                                        'id', flat=True))
+    deltas = OrderedDict()
+    errors = {}
+    for idx, form in enumerate(forms):
+        if form is None:
+            errors[idx] = {'__all__': ['expected a JSON object']}
+            continue
+        if not form.is_valid():
+            errors[idx] = form.errors
+            continue
+        key = (form.cleaned_data['store'], form.cleaned_data['widget'])
+        row_errors = {}
+        if key[0] not in stores:
+            row_errors['store'] = [INVALID_CHOICE_MSG]
+        if key[1] not in widgets:
+            row_errors['widget'] = [INVALID_CHOICE_MSG]
+        if row_errors:
+            errors[idx] = row_errors
+            continue
+        deltas[key] = deltas.get(key, 0) + form.cleaned_data['delta']
+    return (deltas, errors)
+
+def _get_rows(store_ids, widget_ids, user=None, lock=False):
+    queryset = Inventory.objects.filter(store_id__in=store_ids,
+                                        widget_id__in=widget_ids,
+                                        deleted=False)
+    if user is not None:
+        queryset = queryset.filter(created_by=user)
+    if lock:
+        queryset = queryset.select_for_update()
+    return queryset.order_by('pk').values_list('id', 'store_id', 'widget_id',
+                                               'quantity', 'created_by_id')
+
+def apply_adjustments(deltas, user):
+    """
+    deltas: OrderedDict of (store_id, widget_id) -> quantity change from
+            validate_adjustments
+    user: django.contrib.auth.models.User owning the adjusted rows
+    return: list of {store, widget, inventory, quantity} dicts holding the
+            quantities after the batch, in deltas order; inventory is None
+            for a key that had no row and a net delta of zero
+    raise: InsufficientStock when a quantity would fall below zero, in
+           which case nothing is written
+
+    The batch is one transaction. The widgets are locked while their
+    cost is read, then the stores' totals rows and only then the
+    inventory rows, the order Widget.save(), Inventory.save() and the
+    delete receivers take them in, so a concurrent reprice cannot miss
+    the batch's value and concurrent batches and single row saves on the
+    same stores queue instead of deadlocking or creating duplicate rows.
+    The user's active row per key, the oldest when there are several, is
+    moved by one UPDATE ... CASE per ADJUST_UPDATE_SIZE rows computing
+    quantity + delta in the database; missing rows are bulk inserted,
+    unless their deltas sum to zero, and the store totals move by the
+    summed deltas.
+    """
+    store_ids = sorted(set(key[0] for key in deltas))
+    widget_ids = sorted(set(key[1] for key in deltas))
+    with transaction.atomic():
+        costs = Widget.objects.lock_costs(widget_ids)
+        StoreInventoryTotals.objects.lock(store_ids)
+        existing = {}
+        held = set()
+        for pk, store_id, widget_id, quantity, owner in _get_rows(
+                store_ids, widget_ids, lock=True):
+            held.add((store_id, widget_id))
+            if owner == user.pk:
+                existing.setdefault((store_id, widget_id), (pk, quantity))
+        errors = []
+        for key, delta in deltas.items():
+            quantity = existing.get(key, (None, 0))[1]
+            if quantity + delta < 0:
+                errors.append({'store': key[0],
+                               'widget': key[1],
+                               'quantity': quantity,
+                               'delta': delta})
+        if errors:
+            raise InsufficientStock(errors)
+        updates = [(existing[key][0], delta)
+                   for key, delta in deltas.items()
+                   if key in existing and delta]
+        for idx in range(0, len(updates), ADJUST_UPDATE_SIZE):
+            chunk = updates[idx:idx + ADJUST_UPDATE_SIZE]
+            Inventory.objects.filter(pk__in=[pk for pk, delta in chunk]).update(
+                quantity=Case(*[When(pk=pk, then=F('quantity') + delta)
+                                for pk, delta in chunk],
+                              output_field=PositiveIntegerField()))
+        Inventory.objects.bulk_create([
+            Inventory(created_by=user,
+                      store_id=key[0],
+                      widget_id=key[1],
+                      quantity=delta)
+            for key, delta in deltas.items() if key not in existing and delta])
+        totals = {}
+        for key, delta in deltas.items():
+            total = totals.setdefault(key[0], [0, Decimal('0.00'), 0])
+            total[0] += delta
+            total[1] += delta * costs[key[1]]
+            if key not in held and delta:
+                total[2] += 1
+        StoreInventoryTotals.objects.apply(totals)
+        bump_version(Inventory, user.pk)
+        current = {}
+        for pk, store_id, widget_id, quantity, owner in _get_rows(
+                store_ids, widget_ids, user):
+            current.setdefault((store_id, widget_id), (pk, quantity))
+    return [{'store': key[0],
+             'widget': key[1],
+             'inventory': current.get(key, (None, 0))[0],
+             'quantity': current.get(key, (None, 0))[1]}
+            for key in deltas]
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from decimal import Decimal
+from random import getrandbits
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+def _version_key(model, user_id):
+    return 'simple:prefix:{}:{}:version'.format(model._meta.model_name, user_id)
+
+def get_version(model, user_id):
+    """
+    return: the current version of the user's prefix sums of model; a
+            missing key starts a random one so an evicted version is
+            never reused
+    """
+    key = _version_key(model, user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, getrandbits(48), None)
+        version = cache.get(key)
+    return version
+
+def bump_version(model, user_id):
+    """
+    model: Model class whose rows for user_id changed
+    user_id: int, owner of the changed rows
+
+    The version moves once the surrounding transaction commits, so a
+    reader can never cache sums of uncommitted rows under it.
+    """
+    def bump():
+        try:
+            cache.incr(_version_key(model, user_id))
+        except ValueError as e:
+            pass
+    transaction.on_commit(bump)
+
+def build_prefix_sums(queryset, name, per_page):
+    """
+    queryset: QuerySet of the rows to sum
+    name: str, integer or decimal field
+    per_page: int, rows per page
+    return: list of ints where entry i is the sum of name over the first
+            i * per_page rows in pk order, the last entry being the grand
+            total; decimals are held in units of their last place
+    """
+    places = getattr(queryset.model._meta.get_field(name), 'decimal_places', 0)
+    scale = 10 ** places
+    sums = [0]
+    running = 0
+    count = 0
+    for value in queryset.order_by('pk').values_list(name, flat=True).iterator():
+        running += int(value * scale) if places else value
+        count += 1
+        if count % per_page == 0:
+            sums.append(running)
+    if count % per_page:
+        sums.append(running)
+    return sums
+
+def page_sums(queryset, name, user_id, page, per_page):
+    """
+    queryset: QuerySet of user_id's active rows
+    name: str, field to sum
+    user_id: int, owner of the rows, keys the cache
+    page: int, zero based page number
+    per_page: int, rows per page
+    return: (page_sum, total) where page_sum is None for a page past the
+            end, like Sum() over no rows
+
+    The prefix sums are cached under the owner's current version, so
+    every page and the grand total are a subtraction until one of the
+    rows changes and bump_version() moves the key on.
+    """
+    model = queryset.model
+    key = 'simple:prefix:{}:{}:{}:{}:{}'.format(model._meta.model_name,
+                                                name,
+                                                user_id,
+                                                per_page,
+                                                get_version(model, user_id))
+    sums = cache.get(key)
+    if sums is None:
+        sums = build_prefix_sums(queryset, name, per_page)
+        cache.set(key, sums, settings.AGGREGATE_CACHE_TIMEOUT)
+    places = getattr(model._meta.get_field(name), 'decimal_places', 0)
+    def to_value(units):
+        return Decimal(units).scaleb(-places) if places else units
+    page_sum = None
+    if page + 1 < len(sums):
+        page_sum = to_value(sums[page + 1] - sums[page])
+    return (page_sum, to_value(sums[-1]))
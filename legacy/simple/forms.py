@@ -1,7 +1,8 @@
 from decimal import Decimal
 from re import match
 
-from django.forms import CharField, DecimalField, Form, ModelForm
+from django.forms import CharField, DecimalField, Form, IntegerField
+from django.forms import ModelForm
 from django.forms import NumberInput, TextInput, ValidationError
 
 from simple.models import Inventory, Store, Widget
@@ -11,6 +12,15 @@ class InventoryForm(ModelForm):
         model = Inventory
         fields = ['created_by', 'store', 'widget', 'quantity']
 
+class InventoryAdjustForm(Form):
+    """
+    one (store, widget, delta) row of a bulk stock adjustment; store and
+    widget are resolved by the caller for the whole batch at once
+    """
+    store = IntegerField()
+    widget = IntegerField()
+    delta = IntegerField()
+
 class StoreForm(ModelForm):
     class Meta:
         model = Store
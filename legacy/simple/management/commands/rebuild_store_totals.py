@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from simple.models import StoreInventoryTotals
+
+class Command(BaseCommand):
+    help = 'Recompute simple.StoreInventoryTotals from inventory rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store',
+                            type=int,
+                            action='append',
+                            default=None,
+                            help='store pk to rebuild, may be repeated, '
+                                 'default: all stores')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written = StoreInventoryTotals.objects.rebuild(options['store'])
+        self.stdout.write(self.style.SUCCESS(
+            'rebuilt inventory totals for {} stores'.format(written)))
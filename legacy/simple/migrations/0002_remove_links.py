@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 06:48
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simple', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='inventory',
+            name='dlink',
+        ),
+        migrations.RemoveField(
+            model_name='inventory',
+            name='link',
+        ),
+        migrations.RemoveField(
+            model_name='inventory',
+            name='ulink',
+        ),
+        migrations.RemoveField(
+            model_name='store',
+            name='dlink',
+        ),
+        migrations.RemoveField(
+            model_name='store',
+            name='link',
+        ),
+        migrations.RemoveField(
+            model_name='store',
+            name='ulink',
+        ),
+        migrations.RemoveField(
+            model_name='widget',
+            name='dlink',
+        ),
+        migrations.RemoveField(
+            model_name='widget',
+            name='link',
+        ),
+        migrations.RemoveField(
+            model_name='widget',
+            name='ulink',
+        ),
+    ]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 07:11
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_store_totals(apps, schema_editor):
+    """
+    computes the totals of every existing store from its active inventory
+    """
+    Inventory = apps.get_model('simple', 'Inventory')
+    Store = apps.get_model('simple', 'Store')
+    StoreInventoryTotals = apps.get_model('simple', 'StoreInventoryTotals')
+    rows = Inventory.objects.filter(deleted=False).values('store_id').annotate(
+               quantity=models.Sum('quantity'),
+               widgets=models.Count('widget', distinct=True)).order_by()
+    totals = dict((row['store_id'], row) for row in rows)
+    StoreInventoryTotals.objects.bulk_create([
+        StoreInventoryTotals(store_id=store_id,
+                             quantity=totals.get(store_id, {}).get('quantity', 0),
+                             widgets=totals.get(store_id, {}).get('widgets', 0))
+        for store_id in Store.objects.values_list('id', flat=True)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simple', '0002_remove_links'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreInventoryTotals',
+            fields=[
+                ('store', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='totals', serialize=False, to='simple.Store')),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('widgets', models.PositiveIntegerField(default=0)),
+                ('updated', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.RunPython(populate_store_totals,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 07:13
+from __future__ import unicode_literals
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def populate_store_values(apps, schema_editor):
+    """
+    computes the stock value of every existing store from its active
+    inventory and the current widget costs
+    """
+    Inventory = apps.get_model('simple', 'Inventory')
+    StoreInventoryTotals = apps.get_model('simple', 'StoreInventoryTotals')
+    value = models.ExpressionWrapper(
+                models.F('quantity') * models.F('widget__cost'),
+                output_field=models.DecimalField(max_digits=20,
+                                                 decimal_places=2))
+    rows = Inventory.objects.filter(deleted=False).values('store_id').annotate(
+               value=models.Sum(value)).order_by()
+    for row in rows:
+        StoreInventoryTotals.objects.filter(store_id=row['store_id']).update(
+            value=row['value'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simple', '0003_storeinventorytotals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storeinventorytotals',
+            name='value',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20),
+        ),
+        migrations.RunPython(populate_store_values,
+                             migrations.RunPython.noop),
+    ]
@@ -5,9 +5,65 @@ from decimal import Decimal
 
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils.timezone import now
 
-class Widget(models.Model):
+from simple.aggregates import bump_version
+
+URL_PK_SENTINEL = 987654321
+
+_url_templates = {}
+
+def get_object_url(viewname, pk):
+    """
+    viewname: str, namespaced url name taking a single pk kwarg
+    pk: int or None
+    return: str, same as reverse(viewname, kwargs={'pk': pk}) but built
+            from a prefix/suffix resolved once per viewname
+    """
+    if pk is None:
+        return None
+    if viewname not in _url_templates:
+        url = reverse(viewname, kwargs={'pk': URL_PK_SENTINEL})
+        _url_templates[viewname] = url.split(str(URL_PK_SENTINEL), 1)
+    prefix, suffix = _url_templates[viewname]
+    return '{0}{1}{2}'.format(prefix, pk, suffix)
+
+class LinkMixin(object):
+    """
+    derives detail/update/delete urls from the primary key instead of
+    storing them, so a create is a single INSERT
+    link_views: tuple of (detail, update, delete) url names
+    """
+    link_views = (None, None, None)
+
+    @property
+    def link(self):
+        return get_object_url(self.link_views[0], self.pk)
+
+    @property
+    def ulink(self):
+        return get_object_url(self.link_views[1], self.pk)
+
+    @property
+    def dlink(self):
+        return get_object_url(self.link_views[2], self.pk)
+
+class WidgetQuerySet(models.QuerySet):
+    def lock_costs(self, widget_ids):
+        """
+        widget_ids: list of Widget pks
+        return: dict of widget pk -> cost, the widgets locked in pk order
+                until the transaction ends so no cost changes under a
+                caller valuing stock with it
+        """
+        return dict(self.select_for_update().filter(
+                        pk__in=[pk for pk in widget_ids if pk is not None]
+                        ).order_by('pk').values_list('id', 'cost'))
+
+class Widget(LinkMixin, models.Model):
     created_by = models.ForeignKey(User,
                                    on_delete=models.CASCADE)
     name = models.CharField(max_length=20,
@@ -22,25 +78,30 @@ class Widget(models.Model):
                                decimal_places=2,
                                default=Decimal('0.00'))
     deleted = models.BooleanField(default=False)
-    link = models.URLField(max_length=30,
-                           null=True,
-                           blank=False)
-    ulink = models.URLField(max_length=30,
-                            null=True,
-                            blank=False)
-    dlink = models.URLField(max_length=30,
-                            null=True,
-                            blank=False)
+
+    link_views = ('simple:widget-detail',
+                  'simple:widget-update',
+                  'simple:widget-delete')
+
+    objects = WidgetQuerySet.as_manager()
 
     def save(self, *args, **kwargs):
-        super(Widget, self).save(*args, **kwargs)
-        kwargs = {'link': reverse('simple:widget-detail',
-                                  kwargs = {'pk': self.pk}),
-                  'ulink': reverse('simple:widget-update',
-                                   kwargs = {'pk': self.pk}),
-                  'dlink': reverse('simple:widget-delete',
-                                   kwargs = {'pk': self.pk})}
-        Widget.objects.filter(pk=self.pk).update(**kwargs)
+        """
+        writes the row; a cost change moves the value of every store that
+        holds the widget by quantity * (new cost - old cost) in the same
+        transaction
+        """
+        with transaction.atomic(using=kwargs.get('using')):
+            old_cost = None
+            if self.pk is not None:
+                old_cost = Widget.objects.select_for_update().filter(
+                               pk=self.pk).values_list(
+                               'cost', flat=True).first()
+            super(Widget, self).save(*args, **kwargs)
+            cost = self._meta.get_field('cost').to_python(self.cost)
+            if old_cost is not None and cost != old_cost:
+                StoreInventoryTotals.objects.reprice(self.pk, cost - old_cost)
+            bump_version(Widget, self.created_by_id)
 
     def __str__(self):
         return self.name
@@ -51,7 +112,7 @@ class Widget(models.Model):
         else:
             return '%r' % (self.__class__)
 
-class Store(models.Model):
+class Store(LinkMixin, models.Model):
     created_by = models.ForeignKey(User,
                                    on_delete=models.CASCADE)
     name = models.CharField(max_length=20,
@@ -63,25 +124,10 @@ class Store(models.Model):
                                 blank=False,
                                 unique=True)
     deleted = models.BooleanField(default=False)
-    link = models.URLField(max_length=30,
-                           null=True,
-                           blank=False)
-    ulink = models.URLField(max_length=30,
-                            null=True,
-                            blank=False)
-    dlink = models.URLField(max_length=30,
-                            null=True,
-                            blank=False)
 
-    def save(self, *args, **kwargs):
-        super(Store, self).save(*args, **kwargs)
-        kwargs = {'link': reverse('simple:store-detail',
-                                  kwargs = {'pk': self.pk}),
-                  'ulink': reverse('simple:store-update',
-                                   kwargs = {'pk': self.pk}),
-                  'dlink': reverse('simple:store-delete',
-                                   kwargs = {'pk': self.pk})}
-        Store.objects.filter(pk=self.pk).update(**kwargs)
+    link_views = ('simple:store-detail',
+                  'simple:store-update',
+                  'simple:store-delete')
 
     def __str__(self):
         return '{0}:{1}'.format(self.name, self.location)
@@ -92,7 +138,7 @@ class Store(models.Model):
         else:
             return '%r' % (self.__class__)
 
-class Inventory(models.Model):
+class Inventory(LinkMixin, models.Model):
     created_by = models.ForeignKey(User,
                                    null=False,
                                    on_delete=models.CASCADE)
@@ -106,25 +152,61 @@ class Inventory(models.Model):
                                            null=False,
                                            blank=False)
     deleted = models.BooleanField(default=False)
-    link = models.URLField(max_length=30,
-                           null=True,
-                           blank=False)
-    ulink = models.URLField(max_length=30,
-                            null=True,
-                            blank=False)
-    dlink = models.URLField(max_length=30,
-                            null=True,
-                            blank=False)
+
+    link_views = ('simple:inventory-detail',
+                  'simple:inventory-update',
+                  'simple:inventory-delete')
+
+    def _get_contribution(self):
+        """
+        return: (store_id, widget_id, quantity) the row adds to its store's
+                totals, None while it is soft deleted
+        """
+        if self.deleted:
+            return None
+        return (self.store_id, self.widget_id, self.quantity)
 
     def save(self, *args, **kwargs):
-        super(Inventory, self).save(*args, **kwargs)
-        kwargs = {'link': reverse('simple:inventory-detail',
-                                  kwargs = {'pk': self.pk}),
-                  'ulink': reverse('simple:inventory-update',
-                                   kwargs = {'pk': self.pk}),
-                  'dlink': reverse('simple:inventory-delete',
-                                   kwargs = {'pk': self.pk})}
-        Inventory.objects.filter(pk=self.pk).update(**kwargs)
+        """
+        writes the row and applies the change it makes to its store's
+        quantity, value and distinct widgets to StoreInventoryTotals in the
+        same transaction; the stored row is locked and re-read first so the
+        delta is exact
+
+        Every writer locks widgets, then totals rows, then Inventory rows,
+        as apply_adjustments does, so the stored row's store and widget
+        are read without a lock, their widgets and totals locked, and only
+        then the row itself, re-checking that it still points at them.
+        """
+        with transaction.atomic(using=kwargs.get('using')):
+            old = None
+            owners = set([self.created_by_id])
+            if self.pk is not None:
+                stored = Inventory.objects.filter(pk=self.pk)
+                pairs = set([(self.store_id, self.widget_id)])
+                row = None
+                pair = stored.values_list('store_id', 'widget_id').first()
+                while pair is not None:
+                    pairs.add(pair)
+                    Widget.objects.lock_costs([p[1] for p in pairs])
+                    StoreInventoryTotals.objects.lock(
+                        set(p[0] for p in pairs if p[0] is not None))
+                    row = stored.select_for_update().values_list(
+                              'store_id', 'widget_id', 'quantity', 'deleted',
+                              'created_by_id').first()
+                    if row is None or row[:2] in pairs:
+                        break
+                    pair = row[:2]
+                if row is not None:
+                    owners.add(row[4])
+                    if not row[3]:
+                        old = row[:3]
+            super(Inventory, self).save(*args, **kwargs)
+            StoreInventoryTotals.objects.adjust(self.pk,
+                                                old,
+                                                self._get_contribution())
+            for user_id in owners:
+                bump_version(Inventory, user_id)
 
     def __str__(self):
         return '{0}:{1}'.format(self.store, self.widget)
@@ -134,3 +216,236 @@ class Inventory(models.Model):
             return '%r:%r' % (self.__class__, self.id)
         else:
             return '%r' % (self.__class__)
+
+INVENTORY_VALUE = models.ExpressionWrapper(
+                      models.F('quantity') * models.F('widget__cost'),
+                      output_field=models.DecimalField(max_digits=20,
+                                                       decimal_places=2))
+
+class StoreInventoryTotalsQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """
+        user: django.contrib.auth.models.User owning the stores
+        return: totals of the user's active stores in store order
+        """
+        return self.filter(store__created_by=user,
+                           store__deleted=False).order_by('store_id')
+
+    def valuation(self):
+        """
+        return: Decimal, summed stock value of the selected stores, read
+                from one totals row per store instead of joining every
+                Inventory row to its Widget
+        """
+        return self.aggregate(value=models.Sum('value'))['value'] or Decimal('0.00')
+
+    def lock(self, store_ids):
+        """
+        store_ids: list of Store pks
+        creates missing totals rows and locks them all in store order, so
+        writers touching the same stores apply one after another
+        """
+        for store_id in sorted(store_ids):
+            self.get_or_create(store_id=store_id)
+        list(self.select_for_update().filter(store_id__in=store_ids))
+
+    def apply(self, deltas):
+        """
+        deltas: dict of store_id -> (quantity, value, widgets) changes for
+                totals rows already locked by the caller
+        return: number of totals rows written
+        """
+        timestamp = now()
+        written = 0
+        for store_id, (quantity, value, widgets) in deltas.items():
+            written += self.filter(store_id=store_id).update(
+                           quantity=models.F('quantity') + quantity,
+                           value=models.F('value') + value,
+                           widgets=models.F('widgets') + widgets,
+                           updated=timestamp)
+        return written
+
+    def adjust(self, inventory_id, old, new):
+        """
+        inventory_id: pk of the Inventory row that was written
+        old: (store_id, widget_id, quantity) the row contributed before the
+             write, None when it was new or soft deleted
+        new: the same after the write, None when it was deleted
+        return: number of totals rows written
+
+        Quantity and value move by the difference alone, so a write costs
+        the same however many rows the store holds. Distinct widgets only
+        change when this row was the store's last active row of a widget
+        or is now its first, which is one LIMIT 1 query each. The widgets
+        are locked while their cost is read and then the totals rows, the
+        order Widget.save() takes them in, so a concurrent reprice cannot
+        miss this row's value and concurrent writers to one store apply in
+        turn.
+        """
+        if old == new:
+            return 0
+        costs = Widget.objects.lock_costs([c[1] for c in (old, new) if c])
+        deltas = {}
+        for contribution, sign in ((old, -1), (new, 1)):
+            if contribution is None:
+                continue
+            store_id, widget_id, quantity = contribution
+            delta = deltas.setdefault(store_id, [0, Decimal('0.00'), 0])
+            delta[0] += sign * quantity
+            delta[1] += sign * quantity * costs.get(widget_id, Decimal('0.00'))
+        self.lock(list(deltas))
+        pairs = [c[:2] if c and c[1] is not None else None for c in (old, new)]
+        if pairs[0] != pairs[1]:
+            for pair, sign in zip(pairs, (-1, 1)):
+                if pair is None:
+                    continue
+                held = Inventory.objects.filter(store_id=pair[0],
+                                                widget_id=pair[1],
+                                                deleted=False).exclude(
+                                                pk=inventory_id).exists()
+                if not held:
+                    deltas[pair[0]][2] += sign
+        return self.apply(deltas)
+
+    def remove(self, old):
+        """
+        old: (store_id, widget_id, quantity, value) a deleted Inventory
+             row contributed, None when it was soft deleted
+        return: number of totals rows written
+
+        Quantity and value move by the row's share. Distinct widgets are
+        recounted for the store once no active row of the widget is left,
+        which stays exact when a cascade or QuerySet.delete() removes
+        several rows of one widget in a single statement. A store whose
+        totals row is already gone, e.g. in the same cascade, is skipped.
+        """
+        if old is None:
+            return 0
+        store_id, widget_id, quantity, value = old
+        if not list(self.select_for_update().filter(store_id=store_id)):
+            return 0
+        written = self.apply({store_id: (-quantity, -value, 0)})
+        active = Inventory.objects.filter(store_id=store_id, deleted=False)
+        if (widget_id is not None and
+                not active.filter(widget_id=widget_id).exists()):
+            self.filter(store_id=store_id).update(
+                widgets=active.aggregate(
+                            widgets=models.Count('widget', distinct=True)
+                            )['widgets'])
+        return written
+
+    def reprice(self, widget_id, cost_delta):
+        """
+        widget_id: Widget pk whose cost changed
+        cost_delta: Decimal, new cost minus old cost
+        return: number of totals rows written
+
+        Only the stores holding the widget are touched, each by its summed
+        quantity of the widget times cost_delta.
+        """
+        rows = Inventory.objects.filter(widget_id=widget_id,
+                                        deleted=False).values(
+                                        'store_id').annotate(
+                                        quantity=models.Sum('quantity')
+                                        ).order_by('store_id')
+        rows = [(row['store_id'], row['quantity']) for row in rows]
+        self.lock([store_id for store_id, quantity in rows])
+        timestamp = now()
+        written = 0
+        for store_id, quantity in rows:
+            written += self.filter(store_id=store_id).update(
+                           value=models.F('value') + quantity * cost_delta,
+                           updated=timestamp)
+        return written
+
+    def rebuild(self, store_ids=None):
+        """
+        store_ids: list of Store pks, default every store
+        return: number of totals rows written
+
+        One grouped aggregate covers all requested stores; stores without
+        active inventory get zero totals.
+        """
+        stores = Store.objects.order_by('id')
+        if store_ids is not None:
+            stores = stores.filter(pk__in=store_ids)
+        store_ids = list(stores.values_list('id', flat=True))
+        rows = Inventory.objects.filter(store_id__in=store_ids,
+                                        deleted=False).values(
+                                        'store_id').annotate(
+                                        quantity_sum=models.Sum('quantity'),
+                                        value_sum=models.Sum(INVENTORY_VALUE),
+                                        widget_count=models.Count('widget',
+                                                                  distinct=True)
+                                        ).order_by()
+        totals = dict((row['store_id'], row) for row in rows)
+        empty = {'quantity_sum': 0,
+                 'value_sum': Decimal('0.00'),
+                 'widget_count': 0}
+        timestamp = now()
+        self.filter(store_id__in=store_ids).delete()
+        self.bulk_create([
+            StoreInventoryTotals(store_id=store_id,
+                                 quantity=totals.get(store_id, empty)['quantity_sum'],
+                                 value=totals.get(store_id, empty)['value_sum'] or 0,
+                                 widgets=totals.get(store_id, empty)['widget_count'],
+                                 updated=timestamp)
+            for store_id in store_ids])
+        return len(store_ids)
+
+class StoreInventoryTotals(models.Model):
+    """
+    per-store totals of active Inventory rows, value being the sum of
+    quantity * widget cost, kept current by Inventory.save(), Widget.save()
+    and the delete receivers below, which also see cascades and
+    QuerySet.delete(), so store level totals are a primary key lookup;
+    code moving quantities with QuerySet.update() applies its own deltas
+    as apply_adjustments does
+    """
+    store = models.OneToOneField(Store,
+                                 primary_key=True,
+                                 related_name='totals',
+                                 on_delete=models.CASCADE)
+    quantity = models.BigIntegerField(default=0)
+    value = models.DecimalField(max_digits=20,
+                                decimal_places=2,
+                                default=Decimal('0.00'))
+    widgets = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(null=True)
+
+    objects = StoreInventoryTotalsQuerySet.as_manager()
+
+    def __str__(self):
+        return '{0}:{1}'.format(self.store_id, self.quantity)
+
+@receiver(pre_delete, sender=Inventory)
+def lock_deleted_inventory(sender, instance, **kwargs):
+    """
+    locks the widget and store totals of the row about to be deleted and
+    then the row, the order Inventory.save() takes them in, and keeps
+    what the row adds to its store's totals for remove_deleted_inventory;
+    read here since a cascade may delete the widget before the row
+    """
+    stored = Inventory.objects.filter(pk=instance.pk, deleted=False)
+    row = None
+    pair = stored.values_list('store_id', 'widget_id').first()
+    while pair is not None:
+        costs = Widget.objects.lock_costs([pair[1]])
+        list(StoreInventoryTotals.objects.select_for_update().filter(
+                 store_id=pair[0]))
+        row = stored.select_for_update().values_list(
+                  'store_id', 'widget_id', 'quantity').first()
+        pair = row[:2] if row is not None and row[:2] != pair else None
+    if row is not None:
+        row += (row[2] * costs.get(row[1], Decimal('0.00')),)
+    instance._totals_contribution = row
+
+@receiver(post_delete, sender=Inventory)
+def remove_deleted_inventory(sender, instance, **kwargs):
+    StoreInventoryTotals.objects.remove(
+        getattr(instance, '_totals_contribution', None))
+    bump_version(Inventory, instance.created_by_id)
+
+@receiver(post_delete, sender=Widget)
+def bump_deleted_widget(sender, instance, **kwargs):
+    bump_version(Widget, instance.created_by_id)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from decimal import Decimal
+from json import dumps, loads
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import RequestFactory, TestCase
+
+from simple.adjustments import InsufficientStock, apply_adjustments
+from simple.adjustments import validate_adjustments
+from simple.models import Inventory, Store, StoreInventoryTotals, Widget
+from simple.tests.utils import get_locations, get_random_sku
+from simple.views import inventory_adjust
+
+class TestInventoryAdjustments(TestCase):
+    def setUp(self):
+        self.user = User.objects.get(username='superuser')
+        locations = get_locations()
+        self.stores = [Store.objects.create(name=name,
+                                            location=locations[idx],
+                                            created_by=self.user)
+                       for idx, name in enumerate(['Moon', 'Sun'])]
+        self.widgets = [Widget.objects.create(name=name,
+                                              sku=get_random_sku(),
+                                              cost=Decimal('2.00'),
+                                              created_by=self.user)
+                        for name in ['Moon', 'Sun']]
+        self.inv = Inventory.objects.create(store=self.stores[0],
+                                            widget=self.widgets[0],
+                                            quantity=10,
+                                            created_by=self.user)
+
+    def tearDown(self):
+        self.user = None
+        self.stores = None
+        self.widgets = None
+        self.inv = None
+
+    def _row(self, store, widget, delta):
+        return {'store': store.pk, 'widget': widget.pk, 'delta': delta}
+
+    def _post(self, rows):
+        request = RequestFactory().post(path=reverse('simple:inventory-adjust'),
+                                        data=dumps(rows),
+                                        content_type='application/json')
+        request.user = self.user
+        return inventory_adjust(request)
+
+    def test_01_validate(self):
+        rows = [self._row(self.stores[0], self.widgets[0], 2),
+                self._row(self.stores[0], self.widgets[0], -5),
+                {'store': self.stores[0].pk, 'widget': 0, 'delta': 1},
+                {'store': self.stores[0].pk, 'widget': self.widgets[0].pk},
+                'x']
+        deltas, errors = validate_adjustments(rows, self.user)
+        self.assertEqual({(self.stores[0].pk, self.widgets[0].pk): -3},
+                         dict(deltas))
+        self.assertEqual([2, 3, 4], sorted(errors))
+        self.assertIn('widget', errors[2])
+        self.assertIn('delta', errors[3])
+
+    def test_02_apply_updates_and_creates(self):
+        rows = [self._row(self.stores[0], self.widgets[0], -4),
+                self._row(self.stores[0], self.widgets[1], 3),
+                self._row(self.stores[1], self.widgets[0], 5)]
+        deltas, errors = validate_adjustments(rows, self.user)
+        results = apply_adjustments(deltas, self.user)
+        self.assertEqual([6, 3, 5], [r['quantity'] for r in results])
+        self.assertEqual(self.inv.pk, results[0]['inventory'])
+        self.assertEqual(6, Inventory.objects.get(pk=self.inv.pk).quantity)
+        totals = StoreInventoryTotals.objects.get(pk=self.stores[0].pk)
+        self.assertEqual((9, 2, Decimal('18.00')),
+                         (totals.quantity, totals.widgets, totals.value))
+        totals = StoreInventoryTotals.objects.get(pk=self.stores[1].pk)
+        self.assertEqual((5, 1, Decimal('10.00')),
+                         (totals.quantity, totals.widgets, totals.value))
+
+    def test_03_insufficient_stock_writes_nothing(self):
+        rows = [self._row(self.stores[0], self.widgets[1], 3),
+                self._row(self.stores[0], self.widgets[0], -11)]
+        deltas, errors = validate_adjustments(rows, self.user)
+        count = Inventory.objects.count()
+        with self.assertRaises(InsufficientStock) as context:
+            apply_adjustments(deltas, self.user)
+        self.assertEqual(10, context.exception.errors[0]['quantity'])
+        self.assertEqual(count, Inventory.objects.count())
+        self.assertEqual(10, Inventory.objects.get(pk=self.inv.pk).quantity)
+
+    def test_04_view(self):
+        rows = [self._row(self.stores[0], self.widgets[0], 1)] * 100
+        response = self._post(rows)
+        self.assertEqual(200, response.status_code)
+        results = loads(response.content.decode('utf-8'))['results']
+        self.assertEqual(1, len(results))
+        self.assertEqual(110, results[0]['quantity'])
+        response = self._post([self._row(self.stores[0], self.widgets[0], -200)])
+        self.assertEqual(409, response.status_code)
+        response = self._post({'store': 1})
+        self.assertEqual(400, response.status_code)
+        with self.settings(INVENTORY_ADJUST_MAX_ROWS=2):
+            response = self._post(rows)
+        self.assertEqual(413, response.status_code)
+
+    def test_05_zero_net_delta_without_row_is_skipped(self):
+        rows = [self._row(self.stores[0], self.widgets[1], 3),
+                self._row(self.stores[0], self.widgets[1], -3)]
+        deltas, errors = validate_adjustments(rows, self.user)
+        count = Inventory.objects.count()
+        results = apply_adjustments(deltas, self.user)
+        self.assertEqual([{'store': self.stores[0].pk,
+                           'widget': self.widgets[1].pk,
+                           'inventory': None,
+                           'quantity': 0}], results)
+        self.assertEqual(count, Inventory.objects.count())
+        totals = StoreInventoryTotals.objects.get(pk=self.stores[0].pk)
+        self.assertEqual((10, 1, Decimal('20.00')),
+                         (totals.quantity, totals.widgets, totals.value))
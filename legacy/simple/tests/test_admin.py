@@ -80,14 +80,14 @@ class TestInventoryAdmin(TestCase):
     def test_07_base_fields(self):
         ma = ModelAdmin(Inventory, self.site)
         base_fields = ['created_by', 'store', 'widget', 'quantity',
-                       'deleted', 'link', 'ulink', 'dlink']
+                       'deleted']
         self.assertListEqual(base_fields,
                              list(ma.get_form(self.request).base_fields))
 
     def test_08_fields(self):
         ma = ModelAdmin(Inventory, self.site)
         fields = ['created_by', 'store', 'widget', 'quantity',
-                  'deleted', 'link', 'ulink', 'dlink']
+                  'deleted']
         self.assertListEqual(fields, list(ma.get_fields(self.request)))
 
     def test_09_field_lookup(self):
@@ -169,12 +169,12 @@ class TestStoreAdmin(TestCase):
 
     def test_07_base_fields(self):
         ma = ModelAdmin(Store, self.site)
-        base_fields = ['created_by', 'name', 'location', 'deleted', 'link', 'ulink', 'dlink']
+        base_fields = ['created_by', 'name', 'location', 'deleted']
         self.assertListEqual(base_fields, list(ma.get_form(self.request).base_fields))
 
     def test_08_fields(self):
         ma = ModelAdmin(Store, self.site)
-        fields = ['created_by', 'name', 'location', 'deleted', 'link', 'ulink', 'dlink']
+        fields = ['created_by', 'name', 'location', 'deleted']
         self.assertListEqual(fields, list(ma.get_fields(self.request)))
 
     def test_09_field_lookup(self):
@@ -247,12 +247,12 @@ class TestWidgetAdmin(TestCase):
 
     def test_07_base_fields(self):
         ma = ModelAdmin(Widget, self.site)
-        base_fields = ['created_by', 'name', 'sku', 'cost', 'deleted', 'link', 'ulink', 'dlink']
+        base_fields = ['created_by', 'name', 'sku', 'cost', 'deleted']
         self.assertListEqual(base_fields, list(ma.get_form(self.request).base_fields))
 
     def test_08_fields(self):
         ma = ModelAdmin(Widget, self.site)
-        fields = ['created_by', 'name', 'sku', 'cost', 'deleted', 'link', 'ulink', 'dlink']
+        fields = ['created_by', 'name', 'sku', 'cost', 'deleted']
         self.assertListEqual(fields, list(ma.get_fields(self.request)))
 
     def test_09_field_lookup(self):
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection, models
+from django.test import TestCase, override_settings
+
+from simple.aggregates import build_prefix_sums, page_sums
+from simple.models import Inventory, Store, Widget
+from simple.tests.utils import get_locations, get_random_sku
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                      'LOCATION': 'test-aggregates'}}
+
+@override_settings(CACHES=LOCMEM)
+class TestPageSums(TestCase):
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        locations = get_locations()
+        self.stores = [Store.objects.create(name=name,
+                                            location=locations[idx],
+                                            created_by=self.user)
+                       for idx, name in enumerate(['Moon', 'Sun'])]
+        self.widgets = [Widget.objects.create(name='W{}'.format(idx),
+                                              sku=get_random_sku(),
+                                              cost=Decimal('1.25') * (idx + 1),
+                                              created_by=self.user)
+                        for idx in range(7)]
+        for idx in range(12):
+            Inventory.objects.create(store=self.stores[idx % 2],
+                                     widget=self.widgets[idx % 7],
+                                     quantity=idx + 1,
+                                     created_by=self.user)
+        self._commit()
+
+    def tearDown(self):
+        self.user = None
+        self.stores = None
+        self.widgets = None
+
+    def _commit(self):
+        callbacks, connection.run_on_commit = connection.run_on_commit, []
+        for sids, func in callbacks:
+            func()
+
+    def _inventories(self):
+        return Inventory.objects.filter(created_by=self.user, deleted=False)
+
+    def test_01_prefix_sums_match_slices(self):
+        widgets = Widget.objects.filter(created_by=self.user, deleted=False)
+        for queryset, name in ((self._inventories(), 'quantity'),
+                               (widgets, 'cost')):
+            ordered = queryset.order_by('pk')
+            pages = (ordered.count() + 4) // 5
+            for page in range(pages + 1):
+                expected = ordered[page * 5:page * 5 + 5].aggregate(
+                               total=models.Sum(name))['total']
+                actual, total = page_sums(queryset, name, self.user.pk,
+                                          page, 5)
+                self.assertEqual(expected, actual)
+                self.assertEqual(ordered.aggregate(
+                                     total=models.Sum(name))['total'], total)
+
+    def test_02_cached_until_version_moves(self):
+        before = page_sums(self._inventories(), 'quantity', self.user.pk, 0, 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(before, page_sums(self._inventories(), 'quantity',
+                                               self.user.pk, 0, 5))
+        inv = self._inventories().order_by('pk').first()
+        inv.quantity += 10
+        inv.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(before, page_sums(self._inventories(), 'quantity',
+                                               self.user.pk, 0, 5))
+        self._commit()
+        after = page_sums(self._inventories(), 'quantity', self.user.pk, 0, 5)
+        self.assertEqual((before[0] + 10, before[1] + 10), after)
+
+    def test_03_partial_last_page(self):
+        sums = build_prefix_sums(self._inventories(), 'quantity', 5)
+        count = self._inventories().count()
+        self.assertEqual(1 + (count + 4) // 5, len(sums))
+        self.assertEqual(0, sums[0])
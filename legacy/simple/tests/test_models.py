@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from decimal import Decimal
+
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
 from django.test import TestCase
-from django.db import IntegrityError
+from django.test.utils import CaptureQueriesContext
+from django.db import IntegrityError, connection
+from django.utils.six import StringIO
 
-from simple.models import Inventory, Store, Widget
+from simple.models import Inventory, Store, StoreInventoryTotals, Widget
 from simple.tests.utils import get_locations, get_random_sku, get_random_cost
 
 class TestInventoryModel(TestCase):
@@ -103,14 +109,19 @@ class TestInventoryModel(TestCase):
         self.i_data.update({'store': s,
                             'widget': w})
         expected = Inventory(**self.i_data)
-        expected.save()
         self.assertIsNone(expected.link)
         self.assertIsNone(expected.dlink)
         self.assertIsNone(expected.ulink)
+        expected.save()
+        kwargs = {'pk': expected.pk}
+        self.assertEqual(reverse('simple:inventory-detail', kwargs=kwargs),
+                         expected.link)
+        self.assertEqual(reverse('simple:inventory-update', kwargs=kwargs),
+                         expected.ulink)
+        self.assertEqual(reverse('simple:inventory-delete', kwargs=kwargs),
+                         expected.dlink)
         actual = Inventory.objects.get(id=expected.id)
-        self.assertIsNotNone(actual.link)
-        self.assertIsNotNone(actual.dlink)
-        self.assertIsNotNone(actual.ulink)
+        self.assertEqual(expected.link, actual.link)
 
 
 class TestStoreModel(TestCase):
@@ -172,14 +183,19 @@ class TestStoreModel(TestCase):
 
     def test_07_save(self):
         expected = Store(**self.data)
-        expected.save()
         self.assertIsNone(expected.link)
         self.assertIsNone(expected.dlink)
         self.assertIsNone(expected.ulink)
+        expected.save()
+        kwargs = {'pk': expected.pk}
+        self.assertEqual(reverse('simple:store-detail', kwargs=kwargs),
+                         expected.link)
+        self.assertEqual(reverse('simple:store-update', kwargs=kwargs),
+                         expected.ulink)
+        self.assertEqual(reverse('simple:store-delete', kwargs=kwargs),
+                         expected.dlink)
         actual = Store.objects.get(id=expected.id)
-        self.assertIsNotNone(actual.link)
-        self.assertIsNotNone(actual.dlink)
-        self.assertIsNotNone(actual.ulink)
+        self.assertEqual(expected.link, actual.link)
 
 class TestWidgetModel(TestCase):
     def setUp(self):
@@ -237,11 +253,165 @@ class TestWidgetModel(TestCase):
 
     def test_07_save(self):
         expected = Widget(**self.data)
-        expected.save()
         self.assertIsNone(expected.link)
         self.assertIsNone(expected.dlink)
         self.assertIsNone(expected.ulink)
+        expected.save()
+        kwargs = {'pk': expected.pk}
+        self.assertEqual(reverse('simple:widget-detail', kwargs=kwargs),
+                         expected.link)
+        self.assertEqual(reverse('simple:widget-update', kwargs=kwargs),
+                         expected.ulink)
+        self.assertEqual(reverse('simple:widget-delete', kwargs=kwargs),
+                         expected.dlink)
         actual = Widget.objects.get(id=expected.id)
-        self.assertIsNotNone(actual.link)
-        self.assertIsNotNone(actual.dlink)
-        self.assertIsNotNone(actual.ulink)
+        self.assertEqual(expected.link, actual.link)
+
+class TestStoreInventoryTotalsModel(TestCase):
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        locations = get_locations()
+        self.stores = [Store.objects.create(name=name,
+                                            location=locations[idx],
+                                            created_by=self.user)
+                       for idx, name in enumerate(['Moon', 'Sun'])]
+        self.widgets = [Widget.objects.create(name=name,
+                                              sku=get_random_sku(),
+                                              cost=get_random_cost(),
+                                              created_by=self.user)
+                        for name in ['Moon', 'Sun']]
+
+    def tearDown(self):
+        self.user = None
+        self.stores = None
+        self.widgets = None
+
+    def _create(self, store, widget, quantity):
+        return Inventory.objects.create(store=store,
+                                        widget=widget,
+                                        quantity=quantity,
+                                        created_by=self.user)
+
+    def _totals(self, store):
+        totals = StoreInventoryTotals.objects.get(pk=store.pk)
+        return (totals.quantity, totals.widgets)
+
+    def test_01_create(self):
+        self._create(self.stores[0], self.widgets[0], 3)
+        self._create(self.stores[0], self.widgets[0], 4)
+        self._create(self.stores[0], self.widgets[1], 5)
+        self.assertEqual((12, 2), self._totals(self.stores[0]))
+        self.assertIsNotNone(StoreInventoryTotals.objects.get(
+                                 pk=self.stores[0].pk).updated)
+
+    def test_02_update_and_move(self):
+        inv = self._create(self.stores[0], self.widgets[0], 3)
+        self._create(self.stores[1], self.widgets[1], 5)
+        inv = Inventory.objects.get(pk=inv.pk)
+        inv.quantity = 7
+        inv.save()
+        self.assertEqual((7, 1), self._totals(self.stores[0]))
+        inv.store = self.stores[1]
+        inv.save()
+        self.assertEqual((0, 0), self._totals(self.stores[0]))
+        self.assertEqual((12, 2), self._totals(self.stores[1]))
+
+    def test_03_soft_and_hard_delete(self):
+        inv = self._create(self.stores[0], self.widgets[0], 3)
+        other = self._create(self.stores[0], self.widgets[1], 5)
+        inv.deleted = True
+        inv.save()
+        self.assertEqual((5, 1), self._totals(self.stores[0]))
+        other.delete()
+        self.assertEqual((0, 0), self._totals(self.stores[0]))
+
+    def test_07_cascade_and_queryset_delete(self):
+        self.widgets[0].cost = Decimal('2.00')
+        self.widgets[0].save()
+        self._create(self.stores[0], self.widgets[0], 3)
+        self._create(self.stores[0], self.widgets[0], 4)
+        self._create(self.stores[0], self.widgets[1], 5)
+        self._create(self.stores[1], self.widgets[0], 1)
+        Inventory.objects.filter(store=self.stores[0],
+                                 widget=self.widgets[1]).delete()
+        self.assertEqual((7, 1), self._totals(self.stores[0]))
+        Widget.objects.get(pk=self.widgets[0].pk).delete()
+        self.assertEqual((0, 0), self._totals(self.stores[0]))
+        self.assertEqual((0, 0), self._totals(self.stores[1]))
+        self.assertEqual(Decimal('0.00'), StoreInventoryTotals.objects.get(
+                                              pk=self.stores[1].pk).value)
+        self.stores[1].delete()
+        self.assertFalse(StoreInventoryTotals.objects.filter(
+                             pk=self.stores[1].pk).exists())
+
+    def test_04_rebuild_command(self):
+        self._create(self.stores[0], self.widgets[0], 3)
+        self._create(self.stores[0], self.widgets[1], 5)
+        Inventory.objects.filter(store=self.stores[0]).update(quantity=1)
+        StoreInventoryTotals.objects.filter(pk=self.stores[1].pk).delete()
+        out = StringIO()
+        call_command('rebuild_store_totals', stdout=out)
+        self.assertIn('rebuilt inventory totals for', out.getvalue())
+        self.assertEqual((2, 2), self._totals(self.stores[0]))
+        self.assertEqual((0, 0), self._totals(self.stores[1]))
+
+    def test_05_value_delta(self):
+        self.widgets[0].cost = Decimal('2.50')
+        self.widgets[0].save()
+        self.widgets[1].cost = Decimal('10.00')
+        self.widgets[1].save()
+        inv = self._create(self.stores[0], self.widgets[0], 4)
+        self._create(self.stores[0], self.widgets[1], 1)
+        totals = StoreInventoryTotals.objects.get(pk=self.stores[0].pk)
+        self.assertEqual(Decimal('20.00'), totals.value)
+        inv.quantity = 10
+        inv.widget = self.widgets[1]
+        inv.save()
+        totals = StoreInventoryTotals.objects.get(pk=self.stores[0].pk)
+        self.assertEqual((11, 1), (totals.quantity, totals.widgets))
+        self.assertEqual(Decimal('110.00'), totals.value)
+
+    def test_06_reprice_affected_stores(self):
+        self.widgets[0].cost = Decimal('1.00')
+        self.widgets[0].save()
+        self._create(self.stores[0], self.widgets[0], 3)
+        self._create(self.stores[0], self.widgets[0], 2)
+        self._create(self.stores[1], self.widgets[1], 1)
+        untouched = StoreInventoryTotals.objects.get(pk=self.stores[1].pk)
+        widget = Widget.objects.get(pk=self.widgets[0].pk)
+        widget.cost = Decimal('3.00')
+        widget.save()
+        totals = StoreInventoryTotals.objects.get(pk=self.stores[0].pk)
+        self.assertEqual(Decimal('15.00'), totals.value)
+        other = StoreInventoryTotals.objects.get(pk=self.stores[1].pk)
+        self.assertEqual(untouched.updated, other.updated)
+        self.assertEqual(untouched.value, other.value)
+        totals = StoreInventoryTotals.objects.filter(
+                     store__in=self.stores).valuation()
+        self.assertEqual(Decimal('15.00') + untouched.value, totals)
+        StoreInventoryTotals.objects.all().delete()
+        call_command('rebuild_store_totals', stdout=StringIO())
+        self.assertEqual(Decimal('15.00'),
+                         StoreInventoryTotals.objects.get(
+                             pk=self.stores[0].pk).value)
+
+    def test_08_save_locks_row_last(self):
+        inv = self._create(self.stores[0], self.widgets[0], 3)
+        stale = Inventory.objects.get(pk=inv.pk)
+        inv.store = self.stores[1]
+        inv.widget = self.widgets[1]
+        inv.save()
+        stale.quantity = 4
+        with CaptureQueriesContext(connection) as queries:
+            stale.save()
+        self.assertEqual((4, 1), self._totals(self.stores[0]))
+        self.assertEqual((0, 0), self._totals(self.stores[1]))
+        sql = [q['sql'] for q in queries]
+        def first(*fragments):
+            return min(idx for idx, q in enumerate(sql)
+                       if all(f in q for f in fragments))
+        self.assertLess(first('FROM "simple_widget"'),
+                        first('FROM "simple_storeinventorytotals"'))
+        self.assertLess(first('FROM "simple_storeinventorytotals"'),
+                        first('"simple_inventory"."created_by_id"',
+                              'FROM "simple_inventory"'))
@@ -6,19 +6,21 @@ from random import randint, random
 from django.contrib import admin
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
 from django.core.management import call_command
 from django.core.management import execute_from_command_line
 from django.core.urlresolvers import reverse
-from django.http import HttpRequest
+from django.http import Http404, HttpRequest
 from django.shortcuts import get_object_or_404
 from django.test import Client, RequestFactory, TestCase
 
-from simple.models import Inventory, Store, Widget
+from simple.models import Inventory, Store, StoreInventoryTotals, Widget
 from simple.forms import WidgetForm
 from simple.tests.utils import get_random_cost, get_random_sku
 from simple.views import created, deleted, home, updated, inventory_aggr
 from simple.views import inventory_create, inventory_delete, inventory_detail
-from simple.views import inventory_list, inventory_update, store_create
+from simple.views import inventory_list, inventory_update, inventory_valuation
+from simple.views import store_create
 from simple.views import store_delete, store_detail, store_list, store_update
 from simple.views import widget_aggr, widget_create, widget_delete
 from simple.views import widget_detail, widget_list, widget_update
@@ -409,6 +411,40 @@ class TestInventoryView(TestCase):
         self.assertEqual('Found', response.reason_phrase)
         self.assertEqual('/login/?next={}'.format(url), response.url)
 
+    def test_11_list_reads_one_page(self):
+        # cache_page would answer a path an earlier test rendered
+        cache.clear()
+        self._set_user(self.kwargs['qa'])
+        url = reverse('simple:inventory-list', kwargs={'page': 0})
+        self.request = self.factory.get(path=url,
+                                        content_type=self.format)
+        self.request.user = self.user
+        with self.assertNumQueries(1):
+            response = inventory_list(request=self.request, page=0)
+        self.assertEqual(200, response.status_code)
+        soup = BeautifulSoup(response.content, 'html.parser')
+        rows = soup.findAll('table')[0].findAll('tbody')[0].findAll('tr')
+        self.assertEqual(5, len(rows))
+        total = Inventory.objects.filter(created_by=self.user,
+                                         deleted=False).count()
+        last = (total - 1) // 5
+        url = reverse('simple:inventory-list', kwargs={'page': last})
+        self.request = self.factory.get(path=url,
+                                        content_type=self.format)
+        self.request.user = self.user
+        response = inventory_list(request=self.request, page=last)
+        soup = BeautifulSoup(response.content, 'html.parser')
+        self.assertNotIn(url.replace('/{}/'.format(last),
+                                     '/{}/'.format(last + 1)),
+                         [a.get('href') for a in soup.findAll('a')])
+        url = reverse('simple:inventory-list', kwargs={'page': last + 1})
+        self.request = self.factory.get(path=url,
+                                        content_type=self.format)
+        self.request.user = self.user
+        with self.assertNumQueries(2):
+            response = inventory_list(request=self.request, page=last + 1)
+        self.assertEqual(200, response.status_code)
+
 class TestStoreView(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -757,6 +793,25 @@ class TestStoreView(TestCase):
         self.assertEqual('Found', response.reason_phrase)
         self.assertEqual('/login/?next={}'.format(url), response.url)
 
+    def test_11_valuation(self):
+        self._set_user(self.kwargs['qa'])
+        stores = Store.objects.filter(created_by=self.user,
+                                      deleted=False).order_by('pk')
+        call_command('rebuild_store_totals', verbosity=0)
+        expected = StoreInventoryTotals.objects.for_user(self.user).valuation()
+        url = reverse('simple:inventory-valuation')
+        self.request = self.factory.get(path=url,
+                                        content_type=self.format)
+        self.request.user = self.user
+        response = inventory_valuation(request=self.request)
+        self.assertEqual(200, response.status_code)
+        soup = BeautifulSoup(response.content, 'html.parser')
+        self.assertEqual('Simple: Inventory Valuation', soup.title.string)
+        row = soup.find(attrs={'id': 'detail'}).findAll('tr')[-1]
+        self.assertEqual(str(expected), row.findAll('td')[0].string)
+        rows = soup.findAll('table')[1].findAll('tbody')[0].findAll('tr')
+        self.assertEqual(min(5, len(stores)), len(rows))
+
 class TestWidgetView(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -1124,3 +1179,15 @@ class TestWidgetView(TestCase):
         soup = BeautifulSoup(response.content, 'html.parser')
         self.assertEqual('Simple App', soup.title.string)
         self.assertEqual('Django: Simple App', soup.find('h2').string)
+
+    def test_12_list_empty_set_404(self):
+        cache.clear()
+        self._set_user(self.kwargs['view'])
+        Widget.objects.filter(created_by=self.user).update(deleted=True)
+        url = reverse('simple:widget-list')
+        self.request = self.factory.get(path=url,
+                                        content_type=self.format)
+        self.request.user = self.user
+        with self.assertNumQueries(2):
+            with self.assertRaises(Http404):
+                widget_list(request=self.request)
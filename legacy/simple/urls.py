@@ -3,8 +3,10 @@ from django.contrib import admin
 
 from simple.views import created, deleted, eperm, home
 from simple.views import non_existent, updated
-from simple.views import inventory_aggr, inventory_create, inventory_delete
+from simple.views import inventory_adjust, inventory_aggr, inventory_create
+from simple.views import inventory_delete
 from simple.views import inventory_detail, inventory_list, inventory_update
+from simple.views import inventory_valuation
 from simple.views import store_create, store_delete, store_detail
 from simple.views import store_list, store_update
 from simple.views import widget_aggr, widget_create, widget_delete
@@ -26,6 +28,9 @@ urlpatterns = [
     url(r'^eperm/(?P<pk>\d+)/$',
         eperm,
         name='eperm'),
+    url(r'^inventory/adjust/$',
+        inventory_adjust,
+        name='inventory-adjust'),
     url(r'^inventory/aggr/$',
         inventory_aggr,
         name='inventory-aggr'),
@@ -50,6 +55,12 @@ urlpatterns = [
     url(r'^inventory/update/(?P<pk>\d+)/$',
         inventory_update,
         name='inventory-update'),
+    url(r'^inventory/valuation/$',
+        inventory_valuation,
+        name='inventory-valuation'),
+    url(r'^inventory/valuation/page/(?P<page>\d+)/$',
+        inventory_valuation,
+        name='inventory-valuation'),
     url(r'^nonexistent/(?P<pk>\d+)/$',
         non_existent,
         name='non-existent'),
@@ -1,16 +1,21 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from json import loads
+
 from django.conf import settings
 from django.core.urlresolvers import reverse_lazy
 from django.contrib.auth.decorators import login_required, permission_required
-from django.db import IntegrityError, models
-from django.http import Http404, HttpResponseRedirect
-from django.shortcuts import get_list_or_404, get_object_or_404, render
+from django.db import IntegrityError
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from django.shortcuts import get_object_or_404, render
 from django.views.decorators.cache import cache_page
 
+from simple.adjustments import InsufficientStock, apply_adjustments
+from simple.adjustments import validate_adjustments
+from simple.aggregates import page_sums
 from simple.forms import InventoryForm, StoreForm, WidgetForm
-from simple.models import Inventory, Store, Widget
+from simple.models import Inventory, Store, StoreInventoryTotals, Widget
 
 class Http405(Http404):
     status_code = 405
@@ -35,6 +40,25 @@ def _duplicate_key(form={}):
             form.errors[key].append(err_msg.format(key.capitalize()))
     return form
 
+def _get_page(queryset, page, per_page):
+    """
+    queryset: unevaluated QuerySet of the rows to list
+    page: int, zero based page number
+    per_page: int, rows per page
+    return: (rows, has_next) where rows holds at most per_page instances
+            read with LIMIT per_page + 1 OFFSET page * per_page
+    raise: Http404 when the queryset matches no rows at all
+
+    Only the requested page is loaded; an empty page costs one more
+    LIMIT 1 query to tell an empty set from a page past the end.
+    """
+    offset = page * per_page
+    rows = list(queryset.order_by('pk')[offset:offset + per_page + 1])
+    if not rows and not queryset.exists():
+        raise Http404('No {} matches the given query.'.format(
+                          queryset.model._meta.object_name))
+    return (rows[:per_page], len(rows) > per_page)
+
 def created(request, pk=None):
     context = _get_context()
     context['title'] = 'Data Submission'
@@ -61,25 +85,51 @@ def home(request):
     return render(request, 'simple/home.html', context)
 
 @login_required
-@cache_page(60 * 5)
-def inventory_aggr(request, page):
+@permission_required(['simple.add_inventory', 'simple.change_inventory'])
+def inventory_adjust(request):
+    """
+    POST a JSON list of {"store": <pk>, "widget": <pk>, "delta": <n>}
+    adjustments; all are applied in one transaction or none are, and the
+    response lists the resulting quantity of every (store, widget)
+    """
+    if request.method not in ['POST']:
+        return Http405()
+    try:
+        rows = loads(request.body.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError) as e:
+        rows = None
+    if not isinstance(rows, list):
+        return JsonResponse({'error': 'body must be a UTF-8 encoded JSON list'},
+                            status=400)
+    if len(rows) > settings.INVENTORY_ADJUST_MAX_ROWS:
+        error = 'batch exceeds {} rows'.format(settings.INVENTORY_ADJUST_MAX_ROWS)
+        return JsonResponse({'error': error}, status=413)
+    deltas, errors = validate_adjustments(rows, request.user)
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+    try:
+        results = apply_adjustments(deltas, request.user)
+    except InsufficientStock as e:
+        return JsonResponse({'errors': e.errors}, status=409)
+    return JsonResponse({'results': results})
+
+@login_required
+def inventory_aggr(request, page=0):
     if request.method not in ['GET']:
         return Http405()
     context = _get_context()
     context['title'] = 'Simple: Total Inventory Quantities'
     template = 'simple/inventory_aggregate.html'
-    limit = settings.INVENTORIES_PER_PAGE
-    offset = int(page) * limit
-    limit += offset
-    try:
-        inv = Inventory.objects.filter(created_by=request.user,
-                                       deleted=False)[offset:limit].aggregate(
-                                       models.Sum('quantity'))
-        context.update(inv)
-    except Inventory.DoesNotExist as e:
-        context['quantity_sum'] = 0
+    inventories = Inventory.objects.filter(created_by=request.user,
+                                           deleted=False)
+    (context['quantity__sum'],
+     context['quantity__total']) = page_sums(inventories,
+                                             'quantity',
+                                             request.user.pk,
+                                             int(page),
+                                             settings.INVENTORIES_PER_PAGE)
     return render(request, template, context)
-    
+
 @login_required
 @permission_required('simple.add_inventory')
 def inventory_create(request):
@@ -95,12 +145,6 @@ def inventory_create(request):
             try:
                 inv = Inventory(**form.cleaned_data)
                 inv.save()
-                inv.link = reverse_lazy('simple:inventory-detail',
-                                        kwargs={'pk': inv.pk})
-                inv.ulink = reverse_lazy('simple:inventory-update',
-                                         kwargs={'pk': inv.pk})
-                inv.dlink = reverse_lazy('simple:inventory-delete',
-                                         kwargs={'pk': inv.pk})
                 return HttpResponseRedirect(reverse_lazy('simple:created',
                                             kwargs={'pk': inv.pk}))
             except IntegrityError as e:
@@ -172,16 +216,15 @@ def inventory_detail(request, pk):
 def inventory_list(request, page=0):
     if request.method not in ['GET']:
         return Http405()
-    limit = settings.INVENTORIES_PER_PAGE
-    offset = int(page) * limit
-    limit += offset
     context = _get_context()
     context['title'] = 'Simple: Active Inventories'
     template = 'simple/inventory_list.html'
-    inventories = get_list_or_404(Inventory,
-                                  created_by=request.user,
-                                  deleted=False)
-    inventories = inventories[offset:limit]
+    inventories = Inventory.objects.filter(created_by=request.user,
+                                           deleted=False).select_related(
+                                           'store', 'widget')
+    inventories, has_next = _get_page(inventories,
+                                      int(page),
+                                      settings.INVENTORIES_PER_PAGE)
     context['inventories'] = inventories
     if len(inventories) > 0:
         context['aggr'] = reverse_lazy('simple:inventory-aggr',
@@ -189,11 +232,34 @@ def inventory_list(request, page=0):
     if int(page) > 0:
         context['prev'] = reverse_lazy('simple:inventory-list',
                                        kwargs={'page': int(page) - 1})
-    if int(page) >= 0 and len(inventories) == settings.INVENTORIES_PER_PAGE:
+    if has_next:
         context['next'] = reverse_lazy('simple:inventory-list',
                                        kwargs={'page': int(page) + 1})
     return render(request, template, context)
     
+@login_required
+def inventory_valuation(request, page=0):
+    if request.method not in ['GET']:
+        return Http405()
+    context = _get_context()
+    context['title'] = 'Simple: Inventory Valuation'
+    template = 'simple/inventory_valuation.html'
+    stores = Store.objects.filter(created_by=request.user,
+                                  deleted=False).select_related('totals')
+    stores, has_next = _get_page(stores,
+                                 int(page),
+                                 settings.STORES_PER_PAGE)
+    context['stores'] = stores
+    context['value_sum'] = StoreInventoryTotals.objects.for_user(
+                               request.user).valuation()
+    if int(page) > 0:
+        context['prev'] = reverse_lazy('simple:inventory-valuation',
+                                       kwargs={'page': int(page) - 1})
+    if has_next:
+        context['next'] = reverse_lazy('simple:inventory-valuation',
+                                       kwargs={'page': int(page) + 1})
+    return render(request, template, context)
+
 @login_required
 @cache_page(60 * 5)
 @permission_required('simple.change_inventory')
@@ -245,12 +311,6 @@ def store_create(request):
             try:
                 store = Store(**form.cleaned_data)
                 store.save()
-                store.link = reverse_lazy('simple:store-detail',
-                                          kwargs={'pk': store.pk})
-                store.ulink = reverse_lazy('simple:store-update',
-                                           kwargs={'pk': store.pk})
-                store.dlink = reverse_lazy('simple:store-delete',
-                                           kwargs={'pk': store.pk})
                 return HttpResponseRedirect(reverse_lazy('simple:created',
                                             kwargs={'pk': store.pk}))
             except IntegrityError as e:
@@ -302,7 +362,7 @@ def store_detail(request, pk):
     context = _get_context()
     context['title'] = 'Simple: Store Detail'
     template = 'simple/store_detail.html'
-    context['store'] = get_object_or_404(Store,
+    context['store'] = get_object_or_404(Store.objects.select_related('totals'),
                                          pk=pk,
                                          created_by=request.user,
                                          deleted=False)
@@ -313,21 +373,18 @@ def store_detail(request, pk):
 def store_list(request, page=0):
     if request.method not in ['GET']:
         return Http405()
-    limit = settings.STORES_PER_PAGE
-    offset = int(page) * limit
-    limit += offset
     context = _get_context()
     context['title'] = 'Simple: Active Stores'
     template = 'simple/store_list.html'
-    stores = get_list_or_404(Store,
-                             created_by=request.user,
-                             deleted=False)
-    stores = stores[offset:limit]
+    stores, has_next = _get_page(Store.objects.filter(created_by=request.user,
+                                                      deleted=False),
+                                 int(page),
+                                 settings.STORES_PER_PAGE)
     context['stores'] = stores
     if int(page) > 0:
         context['prev'] = reverse_lazy('simple:store-list',
                                        kwargs={'page': int(page) - 1})
-    if int(page) >= 0 and len(stores) == settings.STORES_PER_PAGE:
+    if has_next:
         context['next'] = reverse_lazy('simple:store-list',
                                        kwargs={'page': int(page) + 1})
     return render(request, template, context)
@@ -363,25 +420,22 @@ def store_update(request, pk):
         return render(request, template, context)
 
 @login_required
-@cache_page(60 * 5)
 def widget_aggr(request, page=0):
     if request.method not in ['GET']:
         return Http405()
     context = _get_context()
     context['title'] = 'Simple: Total Widget Cost'
     template = 'simple/widget_aggregate.html'
-    limit = settings.WIDGETS_PER_PAGE
-    offset = int(page) * limit
-    limit += offset
-    try:
-        widgets = Widget.objects.filter(created_by=request.user,
-                                        deleted=False)[offset:limit].aggregate(
-                                        models.Sum('cost'))
-        context.update(widgets)
-    except Widget.DoesNotExist as e:
-        context['cost_sum'] = 0.00
+    widgets = Widget.objects.filter(created_by=request.user,
+                                    deleted=False)
+    (context['cost__sum'],
+     context['cost__total']) = page_sums(widgets,
+                                         'cost',
+                                         request.user.pk,
+                                         int(page),
+                                         settings.WIDGETS_PER_PAGE)
     return render(request, template, context)
-    
+
 @login_required
 @permission_required('simple.add_widget')
 def widget_create(request):
@@ -397,12 +451,6 @@ def widget_create(request):
             try:
                 widget = Widget(**form.cleaned_data)
                 widget.save()
-                widget.link = reverse_lazy('simple:widget-detail',
-                                           kwargs={'pk': widget.pk})
-                widget.ulink = reverse_lazy('simple:widget-update',
-                                            kwargs={'pk': widget.pk})
-                widget.dlink = reverse_lazy('simple:widget-delete',
-                                            kwargs={'pk': widget.pk})
                 return HttpResponseRedirect(reverse_lazy('simple:created',
                                             kwargs={'pk': widget.pk}))
             except IntegrityError as e:
@@ -477,16 +525,13 @@ def widget_detail(request, pk):
 def widget_list(request, page=0):
     if request.method not in ['GET']:
         return Http405()
-    limit = settings.WIDGETS_PER_PAGE
-    offset = int(page) * limit
-    limit += offset
     context = _get_context()
     context['title'] = 'Simple: Active Widgets'
     template = 'simple/widget_list.html'
-    widgets = get_list_or_404(Widget,
-                              deleted=False,
-                              created_by=request.user)
-    widgets = widgets[offset:limit]
+    widgets, has_next = _get_page(Widget.objects.filter(deleted=False,
+                                                        created_by=request.user),
+                                  int(page),
+                                  settings.WIDGETS_PER_PAGE)
     context['widgets'] = widgets
     if len(widgets) > 0:
         context['aggr'] = reverse_lazy('simple:widget-aggr',
@@ -494,7 +539,7 @@ def widget_list(request, page=0):
     if int(page) > 0:
         context['prev'] = reverse_lazy('simple:widget-list',
                                        kwargs={'page': int(page) - 1})
-    if int(page) >= 0 and len(widgets) == settings.WIDGETS_PER_PAGE:
+    if has_next:
         context['next'] = reverse_lazy('simple:widget-list',
                                        kwargs={'page': int(page) + 1})
     return render(request, template, context)
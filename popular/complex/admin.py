@@ -3,7 +3,7 @@ from __future__ import unicode_literals
 
 from django.contrib import admin
 
-from complex.models import Event, Sensor 
+from complex.models import Event, Sensor, SensorAnomaly
 
 @admin.register(Sensor)
 class SensorAdmin(admin.ModelAdmin):
@@ -27,3 +27,12 @@ class EventAdmin(admin.ModelAdmin):
     fields = ('sensor', 'timestamp', 'location', 'status', 'camera',
               'avg_temp', 'avg_pressure', 'pct_humidity', 'altitude',
               'windspeed')
+
+@admin.register(SensorAnomaly)
+class SensorAnomalyAdmin(admin.ModelAdmin):
+    list_display = ('sensor', 'timestamp', 'measurement', 'value', 'mean',
+                    'std', 'zscore')
+    list_filter = ('measurement',)
+    search_fields = ('sensor__name', 'sensor__serial_no')
+    date_hierarchy = 'timestamp'
+    ordering = ('-timestamp',)
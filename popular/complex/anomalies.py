@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, unicode_literals
+
+from math import sqrt
+
+from django.conf import settings
+
+from complex.models import SensorAnomaly, SensorBaseline
+from complex.utils import MEASUREMENTS
+
+def observe(baseline, event, window=None):
+    """
+    baseline: SensorBaseline, updated in place
+    event: Event newer than baseline.timestamp
+    window: int, caps the sample count, default EVENT_ANOMALY_WINDOW
+    return: list of unsaved SensorAnomaly for the event's readings
+
+    Each reading is scored against the state before it and then folded
+    in with Welford's update written for the variance:
+        mean += (x - mean) / n
+        var += ((x - mean_old) * (x - mean) - var) / n
+    Once n reaches window it stops growing, which turns the update into
+    an exponentially weighted one, so the baseline follows the sensor's
+    recent behaviour in constant space and time per reading.
+    """
+    window = window or settings.EVENT_ANOMALY_WINDOW
+    anomalies = []
+    scored = baseline.count >= settings.EVENT_ANOMALY_MIN_COUNT
+    n = min(baseline.count + 1, window)
+    for name in MEASUREMENTS:
+        value = float(getattr(event, name))
+        mean = getattr(baseline, '{}_mean'.format(name))
+        var = getattr(baseline, '{}_var'.format(name))
+        std = sqrt(var)
+        if scored and std > 0:
+            zscore = (value - mean) / std
+            if abs(zscore) > settings.EVENT_ANOMALY_ZSCORE:
+                anomalies.append(SensorAnomaly(sensor_id=event.sensor_id,
+                                               timestamp=event.timestamp,
+                                               measurement=name,
+                                               value=value,
+                                               mean=mean,
+                                               std=std,
+                                               zscore=zscore))
+        delta = value - mean
+        mean += delta / n
+        var += (delta * (value - mean) - var) / n
+        setattr(baseline, '{}_mean'.format(name), mean)
+        setattr(baseline, '{}_var'.format(name), max(var, 0.0))
+    baseline.count += 1
+    baseline.timestamp = event.timestamp
+    return anomalies
+
+def detect_anomalies(events):
+    """
+    events: iterable of Event instances just written
+    return: list of SensorAnomaly rows saved
+
+    Baselines for the batch's sensors are read in one query and written
+    back once per sensor. Readings at or before a sensor's last observed
+    timestamp, i.e. replays, corrections and backfill, are neither
+    scored nor folded in, so the state never counts a reading twice.
+    """
+    by_sensor = {}
+    for event in events:
+        if not event.deleted:
+            by_sensor.setdefault(event.sensor_id, []).append(event)
+    if not by_sensor:
+        return []
+    baselines = SensorBaseline.objects.in_bulk(list(by_sensor))
+    anomalies = []
+    for sensor_id, group in by_sensor.items():
+        baseline = baselines.get(sensor_id)
+        created = baseline is None
+        if created:
+            baseline = SensorBaseline(sensor_id=sensor_id)
+        observed = False
+        for event in sorted(group, key=lambda e: e.timestamp):
+            if baseline.timestamp is None or event.timestamp > baseline.timestamp:
+                anomalies.extend(observe(baseline, event))
+                observed = True
+        if created:
+            baseline.save(force_insert=True)
+        elif observed:
+            baseline.save()
+    SensorAnomaly.objects.bulk_create(anomalies)
+    return anomalies
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import gzip
+from decimal import Decimal
+from io import TextIOWrapper, open
+from json import dumps, load, loads
+from os import fsync, makedirs, rename
+from os.path import dirname, exists, isdir, join
+
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_text
+from django.utils.timezone import utc
+
+from complex.faults import invalidate_faults
+from complex.ingest import UPSERT_FIELDS, UPSERT_LOOKUP_SIZE, save_events
+from complex.models import Event
+
+MANIFEST = 'manifest.json'
+ARCHIVE_FIELDS = UPSERT_FIELDS + ['deleted']
+DECIMAL_FIELDS = ['avg_temp', 'avg_pressure']
+
+def archive_path(sensor_id, day):
+    """
+    sensor_id: int
+    day: date, UTC day
+    return: str, archive file of the sensor's readings on day relative
+            to the archive directory
+    """
+    return '{0}/{1}.ndjson.gz'.format(sensor_id, day.isoformat())
+
+def read_manifest(dest):
+    """
+    dest: str, archive directory
+    return: dict with a 'files' mapping of archive_path -> {sensor, day,
+            rows}
+    """
+    path = join(dest, MANIFEST)
+    if not exists(path):
+        return {'files': {}}
+    with open(path, encoding='utf-8') as f:
+        return load(f)
+
+def _write_manifest(dest, manifest):
+    path = join(dest, MANIFEST)
+    tmp = '{}.tmp'.format(path)
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(force_text(dumps(manifest, indent=1, sort_keys=True)))
+        f.flush()
+        fsync(f.fileno())
+    rename(tmp, path)
+
+def _to_row(event):
+    row = {'sensor': event.sensor_id,
+           'timestamp': event.timestamp.isoformat()}
+    for name in ARCHIVE_FIELDS:
+        value = getattr(event, name)
+        row[name] = str(value) if name in DECIMAL_FIELDS else value
+    return row
+
+def _from_row(row):
+    values = dict((name, Decimal(row[name]) if name in DECIMAL_FIELDS
+                         else row[name])
+                  for name in ARCHIVE_FIELDS if name in row)
+    return Event(sensor_id=row['sensor'],
+                 timestamp=parse_datetime(row['timestamp']),
+                 **values)
+
+def read_archive(dest, name):
+    """
+    dest: str, archive directory
+    name: str, archive_path relative to dest
+    return: generator of row dicts
+    """
+    with gzip.open(join(dest, name), 'rb') as raw:
+        for line in TextIOWrapper(raw, encoding='utf-8'):
+            if line.strip():
+                yield loads(line)
+
+def _append(dest, name, rows):
+    path = join(dest, name)
+    directory = dirname(path)
+    if not isdir(directory):
+        makedirs(directory)
+    # every append adds a gzip member, gzip readers see one stream
+    with open(path, 'ab') as f:
+        with gzip.GzipFile(fileobj=f, mode='wb') as archive:
+            for row in rows:
+                archive.write((dumps(row, sort_keys=True) + '\n').encode('utf-8'))
+        f.flush()
+        fsync(f.fileno())
+
+def archive_events(cutoff, dest, chunk_size=5000, sensor_ids=None, log=None):
+    """
+    cutoff: aware datetime, events strictly older are archived
+    dest: str, archive directory
+    chunk_size: int, events read, written and deleted per step
+    sensor_ids: list of Sensor pks, None archives every sensor
+    log: callable taking a progress str, or None
+    return: number of events archived
+
+    Each sensor is walked in timestamp order. A chunk is appended to its
+    per-day gzip NDJSON files and fsynced, the manifest is replaced
+    atomically, and only then are the rows deleted, in batches of
+    UPSERT_LOOKUP_SIZE ids. A run interrupted between writing and
+    deleting leaves rows in both places. The next run skips timestamps a
+    day file already holds, and restoring is an upsert either way.
+    Hourly rollups and SensorLatest are left as they are, so dashboards
+    built on them keep covering archived history. The fault dashboard
+    counts stored events, so the cached buckets of the archived rows are
+    dropped and archived ranges read as fault free until restored.
+    """
+    if not isdir(dest):
+        makedirs(dest)
+    manifest = read_manifest(dest)
+    sensors = Event.objects.filter(timestamp__lt=cutoff).order_by(
+                  'sensor_id').values_list('sensor_id', flat=True).distinct()
+    if sensor_ids is not None:
+        sensors = sensors.filter(sensor_id__in=sensor_ids)
+    archived = 0
+    for sensor_id in list(sensors):
+        stored = {}
+        last = None
+        while True:
+            events = Event.objects.sensor_range(sensor_id, end=cutoff)
+            if last is not None:
+                events = events.filter(timestamp__gt=last)
+            events = list(events[:chunk_size])
+            if not events:
+                break
+            days = {}
+            for event in events:
+                day = event.timestamp.astimezone(utc).date()
+                days.setdefault(day, []).append(event)
+            for day, group in sorted(days.items()):
+                name = archive_path(sensor_id, day)
+                if name not in stored:
+                    stored[name] = set()
+                    if name in manifest['files'] and exists(join(dest, name)):
+                        stored[name] = set(row['timestamp']
+                                           for row in read_archive(dest, name))
+                rows = [_to_row(event) for event in group]
+                rows = [row for row in rows
+                        if row['timestamp'] not in stored[name]]
+                if rows:
+                    _append(dest, name, rows)
+                    stored[name].update(row['timestamp'] for row in rows)
+                entry = manifest['files'].setdefault(
+                            name, {'sensor': sensor_id,
+                                   'day': day.isoformat(),
+                                   'rows': 0})
+                entry['rows'] += len(rows)
+            _write_manifest(dest, manifest)
+            ids = [event.id for event in events]
+            with transaction.atomic():
+                for idx in range(0, len(ids), UPSERT_LOOKUP_SIZE):
+                    Event.objects.filter(
+                        id__in=ids[idx:idx + UPSERT_LOOKUP_SIZE]).delete()
+                invalidate_faults((event.sensor_id, event.timestamp)
+                                  for event in events)
+            archived += len(events)
+            last = events[-1].timestamp
+            if log is not None:
+                log('sensor {0}: archived through {1}'.format(
+                    sensor_id, last.isoformat()))
+    return archived
+
+def restore_events(dest, start, end, chunk_size=5000, sensor_ids=None,
+                   log=None):
+    """
+    dest: str, archive directory
+    start: date, first UTC day to restore
+    end: date, UTC day after the last one to restore
+    chunk_size: int, events upserted per transaction
+    sensor_ids: list of Sensor pks, None restores every sensor
+    log: callable taking a progress str, or None
+    return: dict with created, updated and unchanged counts
+
+    Only day files listed in the manifest are read. Rows go back through
+    save_events, so restoring twice changes nothing and rollups are
+    refreshed as for any ingest. The archive files are kept.
+    """
+    manifest = read_manifest(dest)
+    totals = {'created': 0, 'updated': 0, 'unchanged': 0}
+    names = sorted(name for name, entry in manifest['files'].items()
+                   if start.isoformat() <= entry['day'] < end.isoformat() and
+                   (sensor_ids is None or entry['sensor'] in sensor_ids))
+    events = []
+    def flush():
+        counts = save_events(events)
+        for key in totals:
+            totals[key] += counts[key]
+        del events[:]
+    for name in names:
+        for row in read_archive(dest, name):
+            events.append(_from_row(row))
+            if len(events) >= chunk_size:
+                flush()
+        if log is not None:
+            log('restored {}'.format(name))
+    if events:
+        flush()
+    return totals
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+
+from atexit import register
+from threading import Condition, Lock, Thread
+from time import time
+
+from django.conf import settings
+from django.db import DataError, DatabaseError, IntegrityError
+from django.db import close_old_connections
+
+from complex.ingest import save_events
+
+logger = logging.getLogger(__name__)
+
+# errors raised by the rows themselves; anything else from the database
+# is taken for an outage and the rows are kept
+ROW_ERRORS = (DataError, IntegrityError)
+
+class BufferFull(Exception):
+    pass
+
+class EventWriteBuffer(object):
+    """
+    In-process write-behind buffer for complex.Event.
+
+    Callers append validated, unsaved events and return immediately; a
+    daemon thread writes them as one bulk insert every flush_interval
+    seconds or as soon as flush_rows events are waiting, whichever comes
+    first. A batch rejected for its rows (ROW_ERRORS) is written row by
+    row so a single bad row cannot take the rest of the batch down; only
+    those rows are dropped. Any other DatabaseError, e.g. a lost
+    connection or a restarting server, puts the unwritten rows back at
+    the head of the queue and the next flush waits backoff seconds,
+    doubling up to max_backoff, until the database takes writes again.
+    Meanwhile append() keeps accepting up to max_rows. stop() drains
+    whatever is still queued.
+    """
+    def __init__(self, save=save_events, flush_interval=0.5, flush_rows=1000,
+                 max_rows=100000, backoff=0.1, max_backoff=30):
+        self.save = save
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.max_rows = max_rows
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.flushed = 0
+        self.failed = 0
+        self._delay = 0
+        self._retry_at = 0
+        self._events = []
+        self._lock = Lock()
+        self._cond = Condition(self._lock)
+        self._flush_lock = Lock()
+        self._running = False
+        self._thread = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._events)
+
+    def append(self, events):
+        """
+        events: list of unsaved Event instances
+        raise: BufferFull when accepting them would exceed max_rows
+        """
+        if not events:
+            return
+        with self._cond:
+            if len(self._events) + len(events) > self.max_rows:
+                raise BufferFull('{} events pending'.format(len(self._events)))
+            self._events.extend(events)
+            if len(self._events) >= self.flush_rows:
+                self._cond.notify()
+
+    def _save(self, events):
+        for event in events:
+            event.pk = None
+        self.save(events)
+
+    def _requeue(self, events, error):
+        with self._lock:
+            self._events[:0] = events
+        self._delay = min(max(self._delay * 2, self.backoff), self.max_backoff)
+        self._retry_at = time() + self._delay
+        logger.warning('event flush of %d rows failed, retrying in %.1fs: %s',
+                       len(events), self._delay, error)
+
+    def flush(self):
+        """
+        return: number of events written by this call
+        """
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+            if not events:
+                return 0
+            try:
+                self._save(events)
+            except ROW_ERRORS as e:
+                logger.warning('event flush of %d rows rejected, writing row by row: %s',
+                               len(events), e)
+            except DatabaseError as e:
+                self._requeue(events, e)
+                return 0
+            else:
+                self._delay = 0
+                self.flushed += len(events)
+                return len(events)
+            written = 0
+            for idx, event in enumerate(events):
+                try:
+                    self._save([event])
+                    written += 1
+                except ROW_ERRORS as e:
+                    self.failed += 1
+                    logger.error('dropped event for sensor %s at %s: %s',
+                                 event.sensor_id, event.timestamp, e)
+                except DatabaseError as e:
+                    self._requeue(events[idx:], e)
+                    break
+            else:
+                self._delay = 0
+            self.flushed += written
+            return written
+
+    def _run(self):
+        deadline = time() + self.flush_interval
+        while True:
+            with self._cond:
+                while (self._running and
+                       (len(self._events) < self.flush_rows or
+                        time() < self._retry_at) and
+                       time() < deadline):
+                    self._cond.wait(max(deadline - time(), 0))
+                running = self._running
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception('event flush thread error: %s', e)
+            finally:
+                close_old_connections()
+            deadline = max(time() + self.flush_interval, self._retry_at)
+            if not running:
+                return
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._thread = Thread(target=self._run, name='event-write-buffer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        stops the flush thread after a final drain of queued events
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        pending = len(self)
+        if pending:
+            logger.error('%d queued events not written at shutdown', pending)
+
+_buffer = None
+_buffer_lock = Lock()
+
+def get_event_buffer():
+    """
+    return: the process wide EventWriteBuffer, started on first use and
+            drained at interpreter exit
+    """
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = EventWriteBuffer(
+                flush_interval=settings.EVENT_BUFFER_FLUSH_MS / 1000.0,
+                flush_rows=settings.EVENT_BUFFER_FLUSH_ROWS,
+                max_rows=settings.EVENT_BUFFER_MAX_ROWS)
+            _buffer.start()
+            register(_buffer.stop)
+        return _buffer
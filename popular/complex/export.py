@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from csv import writer
+from os.path import join
+from shutil import copyfileobj, rmtree
+from tempfile import mkdtemp
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import numpy as np
+from django.conf import settings
+
+from complex.units import SensorUnits
+from complex.utils import EPOCH
+
+EXPORT_FIELDS = ['id', 'sensor', 'timestamp', 'location', 'status', 'camera',
+                 'avg_temp', 'avg_pressure', 'pct_humidity', 'altitude',
+                 'windspeed']
+NPZ_COLUMNS = [('id', 'id', np.int64),
+               ('sensor', 'sensor_id', np.int64),
+               ('timestamp', 'timestamp', np.int64),
+               ('location', 'location', np.int16),
+               ('status', 'status', np.int16),
+               ('camera', 'camera', np.int16),
+               ('avg_temp', 'avg_temp', np.float32),
+               ('avg_pressure', 'avg_pressure', np.float32),
+               ('pct_humidity', 'pct_humidity', np.float32),
+               ('altitude', 'altitude', np.float32),
+               ('windspeed', 'windspeed', np.float32)]
+
+class Echo(object):
+    """
+    file-like object whose write() hands the formatted line straight back,
+    so csv.writer can feed a streaming response
+    """
+    def write(self, value):
+        return value
+
+def iter_chunks(queryset, fields, chunk_size=None):
+    """
+    queryset: model queryset
+    fields: list of field names, the first must be 'id'
+    chunk_size: int, rows per query, default settings.EVENT_EXPORT_CHUNK_ROWS
+    return: generator of lists of value tuples in id order
+
+    Each chunk is a separate WHERE id > last LIMIT n query, so no cursor
+    or transaction stays open while a slow client drains the stream and
+    memory holds one chunk at a time.
+    """
+    chunk_size = chunk_size or settings.EVENT_EXPORT_CHUNK_ROWS
+    queryset = queryset.order_by('id').values_list(*fields)
+    last = None
+    while True:
+        chunk = queryset if last is None else queryset.filter(id__gt=last)
+        rows = list(chunk[:chunk_size])
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            break
+        last = rows[-1][0]
+
+def iter_values(queryset, fields, chunk_size=None):
+    """
+    queryset: model queryset
+    fields: list of field names, the first must be 'id'
+    chunk_size: int, rows per query
+    return: generator of value tuples in id order, see iter_chunks
+    """
+    for rows in iter_chunks(queryset, fields, chunk_size):
+        for row in rows:
+            yield row
+
+def iter_event_csv(queryset, chunk_size=None, sensor_units=False):
+    """
+    queryset: Event queryset
+    chunk_size: int, rows per query
+    sensor_units: bool, convert readings into each sensor's units instead
+                  of the stored ones
+    return: generator of CSV lines, header first, in the column layout
+            import_events reads back when sensor_units is False
+    """
+    csv = writer(Echo())
+    yield csv.writerow(EXPORT_FIELDS)
+    columns = ['sensor_id' if name == 'sensor' else name
+               for name in EXPORT_FIELDS]
+    units = SensorUnits(columns) if sensor_units else None
+    for rows in iter_chunks(queryset, columns, chunk_size):
+        if units is not None:
+            rows = units.convert_rows(rows)
+        for row in rows:
+            yield csv.writerow([value.isoformat() if hasattr(value, 'isoformat')
+                                else value for value in row])
+
+def _epoch_ns(value):
+    delta = value - EPOCH
+    return ((delta.days * 86400 + delta.seconds) * 1000000 +
+            delta.microseconds) * 1000
+
+def write_event_npz(queryset, fileobj, chunk_size=None, sensor_units=False):
+    """
+    queryset: Event queryset
+    fileobj: binary file object the .npz archive is written to
+    chunk_size: int, rows per query
+    sensor_units: bool, convert readings into each sensor's units
+    return: number of events written
+
+    Every NPZ_COLUMNS entry becomes one typed array in a deflated .npz:
+    timestamps as int64 epoch nanoseconds, choices as int16 and
+    measurements as float32, so numpy.load(fileobj)['avg_temp'] needs no
+    parsing. Each chunk is converted and appended to a per-column scratch
+    file, and the .npy headers are written once the row count is known,
+    so memory holds one chunk however many rows are exported.
+    """
+    tmpdir = mkdtemp()
+    scratch = []
+    try:
+        for name, field, dtype in NPZ_COLUMNS:
+            scratch.append(open(join(tmpdir, '{}.raw'.format(name)), 'w+b'))
+        count = 0
+        fields = [field for name, field, dtype in NPZ_COLUMNS]
+        units = SensorUnits(fields) if sensor_units else None
+        for rows in iter_chunks(queryset, fields, chunk_size):
+            if units is not None:
+                rows = units.convert_rows(rows)
+            columns = list(zip(*rows))
+            columns[2] = [_epoch_ns(value) for value in columns[2]]
+            for f, values, (name, field, dtype) in zip(scratch, columns,
+                                                       NPZ_COLUMNS):
+                f.write(np.array(values, dtype=dtype).tobytes())
+            count += len(rows)
+        with ZipFile(fileobj, 'w', ZIP_DEFLATED, allowZip64=True) as archive:
+            for f, (name, field, dtype) in zip(scratch, NPZ_COLUMNS):
+                path = join(tmpdir, '{}.npy'.format(name))
+                with open(path, 'wb') as npy:
+                    np.lib.format.write_array_header_1_0(npy, {
+                        'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                        'fortran_order': False,
+                        'shape': (count,)})
+                    f.seek(0)
+                    copyfileobj(f, npy)
+                f.close()
+                archive.write(path, '{}.npy'.format(name))
+    finally:
+        for f in scratch:
+            f.close()
+        rmtree(tmpdir)
+    return count
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Sum, When
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+from django.utils.timezone import now as tz_now, utc
+
+from complex.models import Event, Sensor
+from complex.utils import EPOCH
+
+FAULT_BUCKETS = OrderedDict([('5m', 300), ('1h', 3600), ('1d', 86400)])
+FAULT_COLUMNS = [('status', Event.CLIMATE_FAULT, 'climate_fault'),
+                 ('status', Event.CAMERA_FAULT, 'camera_fault'),
+                 ('status', Event.LOW_POWER, 'low_power'),
+                 ('camera', Event.LENS, 'lens'),
+                 ('camera', Event.GLARE, 'glare'),
+                 ('camera', Event.MEMORY_FULL, 'memory_full')]
+
+# finest database truncation that every bucket of the size is made of
+_TRUNCATE = {300: TruncMinute, 3600: TruncHour, 86400: TruncDay}
+
+def bucket_floor(value, size):
+    """
+    value: aware datetime
+    size: int, bucket length in seconds, one of FAULT_BUCKETS values
+    return: start of the UTC aligned bucket holding value
+    """
+    seconds = int((value - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=seconds - seconds % size)
+
+def fault_cache_prefix(user_id):
+    """
+    user_id: int, owner of the sensors counted
+    return: str, cache_prefix for fault_buckets over the user's events
+    """
+    return 'complex:faults:{}'.format(user_id)
+
+def _bucket_key(cache_prefix, size, start):
+    return '{}:{}:{}'.format(cache_prefix, size,
+                             int((start - EPOCH).total_seconds()))
+
+def invalidate_faults(keys):
+    """
+    keys: iterable of (sensor_id, timestamp) for events created, changed
+          or deleted
+
+    Drops the cached buckets of every size holding the keys, once now and
+    again when the surrounding transaction commits, so a dashboard read
+    racing the writer cannot re-cache counts without its rows.
+    """
+    timestamps = {}
+    for sensor_id, timestamp in keys:
+        timestamps.setdefault(sensor_id, set()).add(timestamp)
+    if not timestamps:
+        return
+    owners = dict(Sensor.objects.filter(pk__in=list(timestamps)).values_list(
+                      'id', 'created_by'))
+    stale = set()
+    for sensor_id, values in timestamps.items():
+        if sensor_id not in owners:
+            continue
+        prefix = fault_cache_prefix(owners[sensor_id])
+        for size in FAULT_BUCKETS.values():
+            for value in values:
+                stale.add(_bucket_key(prefix, size, bucket_floor(value, size)))
+    stale = list(stale)
+    cache.delete_many(stale)
+    transaction.on_commit(lambda: cache.delete_many(stale))
+
+def _get_aggregates():
+    aggregates = {}
+    for field, value, name in FAULT_COLUMNS:
+        aggregates[name] = Sum(Case(When(then=1, **{field: value}),
+                                    default=0,
+                                    output_field=IntegerField()))
+    return aggregates
+
+def count_faults(queryset, start, end, size):
+    """
+    queryset: Event queryset
+    start: aware datetime, bucket aligned, inclusive
+    end: aware datetime, bucket aligned, exclusive
+    size: int, bucket length in seconds
+    return: dict of bucket start -> {location: {column: count}} with only
+            the locations that reported a fault
+
+    Answered by one GROUP BY over (truncated timestamp, location) of the
+    faulty, non-deleted events in the window.
+    """
+    return _count_spans(queryset, [(start, end)], size)
+
+def _count_spans(queryset, spans, size):
+    """
+    spans: list of (start, end) bucket aligned windows, counted by one
+           GROUP BY whose WHERE ORs their ranges
+    return: like count_faults
+    """
+    faulty = Q(status__in=[v for f, v, n in FAULT_COLUMNS if f == 'status']) | \
+             Q(camera__in=[v for f, v, n in FAULT_COLUMNS if f == 'camera'])
+    window = reduce(or_, [Q(timestamp__gte=start, timestamp__lt=end)
+                          for start, end in spans])
+    rows = queryset.filter(faulty, window, deleted=False).annotate(
+               period=_TRUNCATE[size]('timestamp', tzinfo=utc)).order_by(
+               ).values('period', 'location').annotate(**_get_aggregates())
+    buckets = {}
+    for row in rows:
+        bucket = buckets.setdefault(bucket_floor(row['period'], size), {})
+        counts = bucket.setdefault(row['location'],
+                                   dict((n, 0) for f, v, n in FAULT_COLUMNS))
+        for field, value, name in FAULT_COLUMNS:
+            counts[name] += row[name]
+    return buckets
+
+def fault_buckets(queryset, start, end, size, cache_prefix, now=None):
+    """
+    queryset: Event queryset
+    start: aware datetime
+    end: aware datetime, exclusive
+    size: int, bucket length in seconds
+    cache_prefix: str, identifies queryset in cache keys
+    now: aware datetime, default timezone.now()
+    return: list of (bucket start, {location: {column: count}}) covering
+            [start, end) widened to whole buckets
+
+    Buckets ending settings.EVENT_FAULT_GRACE seconds before now are
+    closed: they are cached without expiry until invalidate_faults()
+    drops them for a late, corrected or deleted event, and are never
+    recounted while cached. Open buckets and cache misses are grouped into
+    runs of consecutive buckets and all runs are counted by one query.
+    """
+    now = now or tz_now()
+    grace = timedelta(seconds=settings.EVENT_FAULT_GRACE)
+    first = bucket_floor(start, size)
+    starts = []
+    bucket = first
+    while bucket < end:
+        starts.append(bucket)
+        bucket += timedelta(seconds=size)
+    keys = dict((b, _bucket_key(cache_prefix, size, b)) for b in starts)
+    closed = set(b for b in starts
+                 if b + timedelta(seconds=size) + grace <= now)
+    cached = cache.get_many([keys[b] for b in starts if b in closed])
+    missing = [b for b in starts if keys[b] not in cached]
+    computed = {}
+    if missing:
+        step = timedelta(seconds=size)
+        spans = []
+        for b in missing:
+            if spans and spans[-1][1] == b:
+                spans[-1][1] = b + step
+            else:
+                spans.append([b, b + step])
+        computed = _count_spans(queryset, spans, size)
+        cache.set_many(dict((keys[b], computed.get(b, {}))
+                            for b in missing if b in closed),
+                       timeout=None)
+    return [(b, cached[keys[b]] if keys[b] in cached else computed.get(b, {}))
+            for b in starts]
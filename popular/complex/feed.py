@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+
+from atexit import register
+from collections import deque
+from itertools import islice
+from json import dumps
+from threading import Condition, Lock, Thread
+from time import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models import Max
+
+from complex.models import Event
+
+logger = logging.getLogger(__name__)
+
+FEED_FIELDS = ['id', 'sensor', 'timestamp', 'location', 'status', 'camera',
+               'avg_temp', 'avg_pressure', 'pct_humidity', 'altitude',
+               'windspeed']
+
+def feed_entry(row):
+    """
+    row: dict of FEED_FIELDS plus sensor__created_by
+    return: (id, owner id, sensor id, location, JSON payload), the payload
+            is encoded once however many subscribers receive it
+    """
+    data = dict((name, row[name]) for name in FEED_FIELDS)
+    return (row['id'],
+            row['sensor__created_by'],
+            row['sensor'],
+            row['location'],
+            dumps(data, cls=DjangoJSONEncoder))
+
+def iter_feed_rows(queryset, after, chunk_size):
+    """
+    queryset: Event queryset
+    after: int, only rows with a larger id are read
+    chunk_size: int, rows per query
+    return: generator of feed_entry tuples in id order
+    """
+    queryset = queryset.filter(deleted=False).order_by('id').values(
+                   'sensor__created_by', *FEED_FIELDS)
+    while True:
+        rows = list(queryset.filter(id__gt=after)[:chunk_size])
+        for row in rows:
+            yield feed_entry(row)
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1]['id']
+
+class EventFeed(object):
+    """
+    In-process broadcast of newly stored complex.Event rows.
+
+    A daemon thread polls WHERE id > last published every poll_interval
+    seconds and appends what it finds to a ring of the last backlog
+    entries, then wakes every waiting subscriber, so the database sees one
+    poll however many streams are open. Subscribers resume from an event
+    id; an id older than the ring is reported as incomplete so the caller
+    can catch up from the database. Rows rewritten in place by an upsert
+    keep their id and are not re-sent.
+
+    Ids are handed out at INSERT but become visible at COMMIT, so a long
+    transaction can commit id N after N + k is already visible. Rows are
+    therefore published strictly in id order: a row above a missing id is
+    held back, and re-read on every poll, until the gap fills or the row
+    has been visible for settle seconds, after which the gap is taken for
+    a rolled back insert. Every event committed within settle seconds of
+    the next higher id is sent exactly once and in order, and resuming
+    from any Last-Event-ID misses nothing the feed published; an insert
+    committing later than that is not sent.
+    """
+    def __init__(self, poll_interval=1.0, backlog=1000, chunk_size=500,
+                 settle=5.0):
+        self.poll_interval = poll_interval
+        self.chunk_size = chunk_size
+        self.settle = settle
+        self.last_id = None
+        self._floor = 0
+        self._held = {}
+        self._entries = deque(maxlen=backlog)
+        self._lock = Lock()
+        self._cond = Condition(self._lock)
+        self._running = False
+        self._thread = None
+
+    def _read(self):
+        """
+        return: list of row dicts in id order up to the first gap younger
+                than settle, deleted rows included so they close gaps
+        """
+        queryset = Event.objects.order_by('id').values(
+                       'sensor__created_by', 'deleted', *FEED_FIELDS)
+        now = time()
+        held = {}
+        rows = []
+        expected = self.last_id + 1
+        while True:
+            chunk = list(queryset.filter(id__gt=expected - 1)[:self.chunk_size])
+            for row in chunk:
+                held[row['id']] = self._held.get(row['id'], now)
+            for row in chunk:
+                if row['id'] != expected and now - held[row['id']] < self.settle:
+                    self._held = dict((pk, seen) for pk, seen in held.items()
+                                      if pk >= expected)
+                    return rows
+                rows.append(row)
+                expected = row['id'] + 1
+            if len(chunk) < self.chunk_size:
+                self._held = {}
+                return rows
+
+    def poll(self):
+        """
+        return: number of new events; the first call only records the
+                current head so history is not replayed
+        """
+        if self.last_id is None:
+            head = Event.objects.aggregate(head=Max('id'))['head'] or 0
+            with self._cond:
+                self.last_id = head
+                self._floor = head
+            return 0
+        rows = self._read()
+        if rows:
+            entries = [feed_entry(row) for row in rows if not row['deleted']]
+            with self._cond:
+                overflow = (len(self._entries) + len(entries) -
+                            self._entries.maxlen)
+                if overflow > 0:
+                    self._floor = (list(self._entries) + entries)[overflow - 1][0]
+                self._entries.extend(entries)
+                self.last_id = rows[-1]['id']
+                self._cond.notify_all()
+            return len(entries)
+        return 0
+
+    def since(self, after):
+        """
+        after: int event id or None for the current head
+        return: (entries, complete, head) where entries are the buffered
+                feed_entry tuples past after, complete is False when
+                entries between after and the ring were already evicted
+                and head is the id to resume from next
+        """
+        with self._lock:
+            return self._since(after)
+
+    def _since(self, after):
+        head = self.last_id or 0
+        if after is None or after >= head:
+            return ([], True, max(head, after or 0))
+        entries = [entry for entry in self._entries if entry[0] > after]
+        return (entries, after >= self._floor, head)
+
+    def wait(self, after, timeout):
+        """
+        after: int event id or None
+        timeout: float seconds to block when nothing newer is buffered
+        return: like since()
+        """
+        with self._cond:
+            if after is not None and after >= (self.last_id or 0):
+                self._cond.wait(timeout)
+            return self._since(after)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                running = self._running
+            if not running:
+                return
+            close_old_connections()
+            try:
+                self.poll()
+            except Exception as e:
+                logger.exception('event feed poll error: %s', e)
+            finally:
+                close_old_connections()
+            with self._cond:
+                if self._running:
+                    self._cond.wait(self.poll_interval)
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._thread = Thread(target=self._run, name='event-feed')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+_feed = None
+_feed_lock = Lock()
+
+def get_event_feed():
+    """
+    return: the process wide EventFeed, started on first use
+    """
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = EventFeed(
+                poll_interval=settings.EVENT_FEED_POLL_MS / 1000.0,
+                backlog=settings.EVENT_FEED_BACKLOG,
+                settle=settings.EVENT_FEED_SETTLE_MS / 1000.0)
+            _feed.poll()
+            _feed.start()
+            register(_feed.stop)
+        return _feed
+
+def _matches(entry, user_id, sensors, locations):
+    return (entry[1] == user_id and
+            (not sensors or entry[2] in sensors) and
+            (not locations or entry[3] in locations))
+
+def iter_event_stream(feed, user, sensors=None, locations=None, after=None,
+                      duration=None, heartbeat=None):
+    """
+    feed: EventFeed
+    user: django.contrib.auth.models.User, only events of their sensors
+          are sent
+    sensors: list of sensor ids to keep, empty keeps all
+    locations: list of Event.LOCATIONS values to keep, empty keeps all
+    after: int, Last-Event-ID to resume after, None starts at the head
+    duration: float seconds before the stream ends and the client
+              reconnects, default settings.EVENT_FEED_MAX_SECONDS
+    heartbeat: float seconds between keepalive comments, default
+               settings.EVENT_FEED_HEARTBEAT
+    return: generator of text/event-stream chunks
+
+    Entries still in the ring are filtered in memory; a resume from an
+    id the ring has evicted reads the gap from the database in chunks of
+    settings.EVENT_FEED_BACKLOG rows before joining the broadcast.
+    """
+    sensors = set(sensors or [])
+    locations = set(locations or [])
+    duration = settings.EVENT_FEED_MAX_SECONDS if duration is None else duration
+    heartbeat = heartbeat or settings.EVENT_FEED_HEARTBEAT
+    chunk_size = settings.EVENT_FEED_BACKLOG
+    deadline = time() + duration
+    yield 'retry: {}\n\n'.format(settings.EVENT_FEED_RETRY_MS)
+    while True:
+        remaining = deadline - time()
+        if remaining <= 0:
+            return
+        entries, complete, head = feed.wait(after, min(heartbeat, remaining))
+        if not complete:
+            queryset = Event.objects.filter(sensor__created_by=user,
+                                            id__lte=head)
+            if sensors:
+                queryset = queryset.filter(sensor__in=sensors)
+            if locations:
+                queryset = queryset.filter(location__in=locations)
+            entries = list(islice(iter_feed_rows(queryset, after, chunk_size),
+                                  chunk_size))
+            head = entries[-1][0] if len(entries) == chunk_size else head
+        else:
+            entries = [entry for entry in entries
+                       if _matches(entry, user.id, sensors, locations)]
+        if entries:
+            yield ''.join('id: {}\nevent: reading\ndata: {}\n\n'.format(
+                              entry[0], entry[4])
+                          for entry in entries)
+        else:
+            yield ': keepalive\n\n'
+        after = head
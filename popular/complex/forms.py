@@ -1,10 +1,16 @@
 from decimal import Decimal
 from re import match
 
-from django.forms import CharField, ModelForm, ValidationError
+from django.conf import settings
+from django.forms import CharField, ChoiceField, DateTimeField, Form
+from django.forms import IntegerField, MultipleChoiceField
+from django.forms import TypedMultipleChoiceField
+from django.forms import ModelForm, ValidationError
+from django.utils.six import string_types
 from django.utils.timezone import datetime
 
 from complex.models import Event, Sensor
+from complex.utils import MEASUREMENTS, parse_iso_datetime
 
 class EventForm(ModelForm):
     class Meta:
@@ -13,6 +19,160 @@ class EventForm(ModelForm):
                   'avg_temp', 'avg_pressure', 'pct_humidity', 'altitude',
                   'windspeed']
 
+class IsoDateTimeField(DateTimeField):
+    """
+    DateTimeField that also accepts ISO 8601 strings as emitted by
+    json.dumps(datetime.isoformat()), including 'T' separator and offsets
+    """
+    def to_python(self, value):
+        if isinstance(value, string_types):
+            parsed = parse_iso_datetime(value)
+            if parsed is not None:
+                return parsed
+        return super(IsoDateTimeField, self).to_python(value)
+
+class EventExportForm(Form):
+    """
+    query string filters of an export; sensor, location and status may
+    repeat, start is inclusive and end exclusive
+    """
+    FORMATS = (
+        ('csv', 'CSV'),
+        ('npz', 'NumPy .npz')
+    )
+
+    UNITS = (
+        ('stored', 'Stored Units'),
+        ('sensor', 'Sensor Units')
+    )
+    format = ChoiceField(choices=FORMATS, required=False)
+    units = ChoiceField(choices=UNITS, required=False)
+    sensor = TypedMultipleChoiceField(coerce=int, required=False)
+    location = TypedMultipleChoiceField(choices=Event.LOCATIONS,
+                                        coerce=int,
+                                        required=False)
+    status = TypedMultipleChoiceField(choices=Event.STATUS,
+                                      coerce=int,
+                                      required=False)
+    start = IsoDateTimeField(required=False)
+    end = IsoDateTimeField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        """
+        user: django.contrib.auth.models.User whose sensors may be exported
+        """
+        user = kwargs.pop('user')
+        super(EventExportForm, self).__init__(*args, **kwargs)
+        sensors = Sensor.objects.filter(created_by=user).values_list('id', 'name')
+        self.fields['sensor'].choices = list(sensors)
+
+    def clean_format(self):
+        return self.cleaned_data['format'] or 'csv'
+
+    def clean_units(self):
+        return self.cleaned_data['units'] or 'stored'
+
+class EventFeedForm(Form):
+    """
+    query string of the live feed; sensor and location may repeat and
+    last_event_id stands in for the Last-Event-ID header on first connect
+    """
+    sensor = TypedMultipleChoiceField(coerce=int, required=False)
+    location = TypedMultipleChoiceField(choices=Event.LOCATIONS,
+                                        coerce=int,
+                                        required=False)
+    last_event_id = IntegerField(required=False, min_value=0)
+
+    def __init__(self, *args, **kwargs):
+        """
+        user: django.contrib.auth.models.User whose sensors may be watched
+        """
+        user = kwargs.pop('user')
+        super(EventFeedForm, self).__init__(*args, **kwargs)
+        sensors = Sensor.objects.filter(created_by=user).values_list('id', 'name')
+        self.fields['sensor'].choices = list(sensors)
+
+class EventIngestForm(ModelForm):
+    """
+    validates one row of a bulk ingest batch; sensor is resolved by the
+    caller from a single prefetch so validation issues no queries
+    """
+    timestamp = IsoDateTimeField()
+
+    class Meta:
+        model = Event
+        fields = ['timestamp', 'location', 'status', 'camera',
+                  'avg_temp', 'avg_pressure', 'pct_humidity', 'altitude',
+                  'windspeed']
+
+class EventRangeForm(Form):
+    """
+    query string of a time window: start inclusive, end exclusive, after
+    exclusive for resuming a truncated window
+    """
+    start = IsoDateTimeField(required=False)
+    end = IsoDateTimeField(required=False)
+    after = IsoDateTimeField(required=False)
+    limit = IntegerField(required=False, min_value=1)
+
+class EventSeriesForm(Form):
+    """
+    query string of a downsampled chart series over [start, end)
+    """
+    MEASUREMENTS = tuple((name, name) for name in MEASUREMENTS)
+
+    METHODS = (
+        ('lttb', 'Largest Triangle Three Buckets'),
+        ('minmax', 'Min/Max per Bucket')
+    )
+    measurement = ChoiceField(choices=MEASUREMENTS)
+    start = IsoDateTimeField(required=False)
+    end = IsoDateTimeField(required=False)
+    points = IntegerField(required=False, min_value=3)
+    method = ChoiceField(choices=METHODS, required=False)
+
+    def clean_points(self):
+        points = self.cleaned_data['points'] or settings.EVENT_SERIES_POINTS
+        return min(points, settings.EVENT_SERIES_MAX_POINTS)
+
+    def clean_method(self):
+        return self.cleaned_data['method'] or 'lttb'
+
+class EventStatsForm(Form):
+    """
+    query string of grouped statistics over [start, end); measurement may
+    repeat and defaults to all of them
+    """
+    GROUPS = (
+        ('sensor', 'Sensor'),
+        ('location', 'Location')
+    )
+    group_by = ChoiceField(choices=GROUPS, required=False)
+    measurement = MultipleChoiceField(choices=EventSeriesForm.MEASUREMENTS,
+                                      required=False)
+    start = IsoDateTimeField(required=False)
+    end = IsoDateTimeField(required=False)
+
+    def clean_group_by(self):
+        return self.cleaned_data['group_by'] or 'sensor'
+
+class FaultDashboardForm(Form):
+    """
+    query string of the fault dashboard: bucket length and an optional
+    [start, end) window
+    """
+    BUCKETS = (
+        ('5m', '5 Minutes'),
+        ('1h', 'Hour'),
+        ('1d', 'Day')
+    )
+    bucket = ChoiceField(choices=BUCKETS, required=False)
+    start = IsoDateTimeField(required=False)
+    end = IsoDateTimeField(required=False)
+
+    def clean_bucket(self):
+        return self.cleaned_data['bucket'] or '1h'
+
 class SensorForm(ModelForm):
     class Meta:
         model = Sensor
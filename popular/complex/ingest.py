@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from csv import DictReader
+from json import loads
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.utils.encoding import force_text
+
+from complex.anomalies import detect_anomalies
+from complex.faults import invalidate_faults
+from complex.forms import EventIngestForm
+from complex.latest import update_latest
+from complex.models import Event, Sensor
+from complex.rollups import refresh_rollups
+
+INVALID_SENSOR_MSG = 'Select a valid choice. That choice is not one of the available choices.'
+
+UPSERT_FIELDS = ['location', 'status', 'camera', 'avg_temp', 'avg_pressure',
+                 'pct_humidity', 'altitude', 'windspeed']
+UPSERT_LOOKUP_SIZE = 500
+
+def _to_pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _form_errors(form):
+    errors = {}
+    for field, error_list in form.errors.as_data().items():
+        errors[field] = [force_text(msg)
+                         for error in error_list
+                         for msg in error.messages]
+    return errors
+
+def get_field_defaults():
+    """
+    return: dict of model defaults for every optional ingest field so a
+            row only has to carry sensor, timestamp and what it measured
+    """
+    defaults = {}
+    for name in EventIngestForm._meta.fields:
+        field = Event._meta.get_field(name)
+        if field.has_default():
+            defaults[name] = field.get_default()
+    return defaults
+
+def parse_ndjson(lines, skip=0):
+    """
+    lines: iterable of str, one JSON object per line
+    skip: int, leading lines passed over without being decoded
+    return: generator of (line_no, row, errors); row is None when the
+            line could not be decoded, blank lines are skipped
+    """
+    for line_no, line in enumerate(lines, 1):
+        if line_no <= skip:
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = loads(line)
+        except ValueError as e:
+            yield (line_no, None, {'__all__': ['invalid JSON: {}'.format(e)]})
+            continue
+        if not isinstance(row, dict):
+            yield (line_no, None, {'__all__': ['expected a JSON object']})
+            continue
+        yield (line_no, row, None)
+
+def parse_csv(lines, skip=0):
+    """
+    lines: iterable of str, first line holds the column names
+    skip: int, leading records passed over without being converted
+    return: generator of (record_no, row, errors) like parse_ndjson;
+            empty cells are dropped so model defaults apply
+    """
+    for record_no, row in enumerate(DictReader(lines), 1):
+        if record_no <= skip:
+            continue
+        row = dict((key.strip(), value.strip())
+                   for key, value in row.items()
+                   if key and value not in (None, ''))
+        yield (record_no, row, None)
+
+def validate_events(rows, user=None):
+    """
+    rows: list of (line_no, row, errors) from parse_ndjson or parse_csv
+    user: django.contrib.auth.models.User owning the reporting sensors,
+          None accepts any sensor
+    return: (events, results) where events are unsaved Event instances
+            and results holds one accept/reject dict per row
+
+    Sensors for the whole batch are fetched in a single query, so
+    validation cost does not grow with round-trips per row.
+    """
+    sensor_ids = set()
+    for (line_no, row, errors) in rows:
+        if row is not None:
+            pk = _to_pk(row.get('sensor'))
+            if pk is not None:
+                sensor_ids.add(pk)
+    sensors = Sensor.objects.all()
+    if user is not None:
+        sensors = sensors.filter(created_by=user)
+    sensors = sensors.in_bulk(list(sensor_ids))
+    defaults = get_field_defaults()
+    events = []
+    results = []
+    for (line_no, row, errors) in rows:
+        if row is None:
+            results.append({'line': line_no,
+                            'accepted': False,
+                            'errors': errors})
+            continue
+        data = defaults.copy()
+        data.update(row)
+        form = EventIngestForm(data=data)
+        errors = {} if form.is_valid() else _form_errors(form)
+        sensor = sensors.get(_to_pk(row.get('sensor')))
+        if sensor is None:
+            errors['sensor'] = [INVALID_SENSOR_MSG]
+        if errors:
+            results.append({'line': line_no,
+                            'accepted': False,
+                            'errors': errors})
+            continue
+        event = form.save(commit=False)
+        event.sensor = sensor
+        events.append(event)
+        results.append({'line': line_no,
+                        'accepted': True})
+    return (events, results)
+
+def _get_existing(events):
+    """
+    events: list of Event instances
+    return: dict of (sensor_id, timestamp) -> (pk, deleted, UPSERT_FIELDS
+            values) for keys already stored, looked up through the unique
+            index
+    """
+    timestamps = {}
+    for event in events:
+        timestamps.setdefault(event.sensor_id, []).append(event.timestamp)
+    existing = {}
+    for sensor_id, values in timestamps.items():
+        for idx in range(0, len(values), UPSERT_LOOKUP_SIZE):
+            rows = Event.objects.filter(
+                       sensor_id=sensor_id,
+                       timestamp__in=values[idx:idx + UPSERT_LOOKUP_SIZE]
+                   ).order_by().values_list('id', 'timestamp', 'deleted',
+                                            *UPSERT_FIELDS)
+            for row in rows:
+                existing[(sensor_id, row[1])] = (row[0], row[2], tuple(row[3:]))
+    return existing
+
+def _update_changed(changes):
+    """
+    changes: list of (pk, dict of field name -> new value)
+
+    Writes one UPDATE ... SET field = CASE WHEN id = ... per
+    UPSERT_LOOKUP_SIZE rows, each field only moving on the rows where it
+    changed.
+    """
+    for idx in range(0, len(changes), UPSERT_LOOKUP_SIZE):
+        chunk = changes[idx:idx + UPSERT_LOOKUP_SIZE]
+        columns = {}
+        for pk, changed in chunk:
+            for name, value in changed.items():
+                columns.setdefault(name, []).append((pk, value))
+        updates = {}
+        for name, values in columns.items():
+            field = Event._meta.get_field(name)
+            updates[name] = Case(*[When(pk=pk,
+                                        then=Value(value, output_field=field))
+                                   for pk, value in values],
+                                 default=F(name),
+                                 output_field=field)
+        Event.objects.filter(pk__in=[pk for pk, changed in chunk]).update(
+            **updates)
+
+def _upsert(events):
+    latest = OrderedDict()
+    for event in events:
+        latest[(event.sensor_id, event.timestamp)] = event
+    existing = _get_existing(list(latest.values()))
+    created = []
+    changes = []
+    touched = []
+    for key, event in latest.items():
+        if key not in existing:
+            created.append(event)
+            touched.append(key)
+            continue
+        pk, deleted, stored = existing[key]
+        event.pk = pk
+        event.deleted = deleted
+        values = tuple(getattr(event, name) for name in UPSERT_FIELDS)
+        if values != stored:
+            changes.append((pk, dict((name, value)
+                                     for name, value, old in zip(UPSERT_FIELDS,
+                                                                 values,
+                                                                 stored)
+                                     if value != old)))
+            touched.append(key)
+    _update_changed(changes)
+    Event.objects.bulk_create(created,
+                              batch_size=settings.EVENT_INGEST_BATCH_SIZE)
+    refresh_rollups(touched)
+    invalidate_faults(touched)
+    update_latest([latest[key] for key in touched])
+    detect_anomalies([latest[key] for key in touched])
+    return {'created': len(created),
+            'updated': len(changes),
+            'unchanged': len(latest) - len(created) - len(changes)}
+
+def save_events(events):
+    """
+    events: list of unsaved Event instances
+    return: dict with created, updated and unchanged counts
+
+    Rows are keyed on (sensor, timestamp) inside one transaction: new keys
+    are bulk inserted and stored keys are only written when a value
+    differs, by one CASE update per UPSERT_LOOKUP_SIZE changed rows, so
+    replaying a batch costs one lookup per UPSERT_LOOKUP_SIZE keys and no
+    writes. A stored row's deleted flag is never touched, so a replay
+    does not undelete it. Hourly rollups, SensorLatest and the anomaly
+    baselines for the created and updated keys are refreshed in the same
+    transaction and their cached fault buckets are dropped. Within a
+    batch the last row for a key wins. A concurrent writer inserting the
+    same key makes the first attempt fail on the unique constraint; the
+    retry then sees its row.
+    """
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                return _upsert(events)
+        except IntegrityError:
+            if attempt:
+                raise
+            for event in events:
+                event.pk = None
+
+def ingest_rows(rows, user=None, buffer=None):
+    """
+    rows: list of (line_no, row, errors) from parse_ndjson or parse_csv
+    user: django.contrib.auth.models.User owning the reporting sensors
+    buffer: complex.buffer.EventWriteBuffer, when given accepted rows are
+            queued for a background flush instead of written inline
+    return: list of per-row accept/reject results
+
+    Rejected rows never reach the database.
+    """
+    events, results = validate_events(rows, user)
+    if buffer is not None:
+        buffer.append(events)
+    else:
+        save_events(events)
+    return results
+
+def ingest_events(lines, user, buffer=None):
+    """
+    lines: iterable of NDJSON encoded events
+    user: django.contrib.auth.models.User owning the reporting sensors
+    buffer: complex.buffer.EventWriteBuffer or None
+    return: list of per-row accept/reject results
+    """
+    return ingest_rows(list(parse_ndjson(lines)), user, buffer)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from complex.models import Event, SensorLatest
+
+LATEST_FIELDS = ['timestamp', 'location', 'status', 'camera', 'avg_temp',
+                 'avg_pressure', 'pct_humidity', 'altitude', 'windspeed']
+
+def _get_values(event):
+    return dict((name, getattr(event, name)) for name in LATEST_FIELDS)
+
+def update_latest(events):
+    """
+    events: iterable of Event instances just written
+    return: number of SensorLatest rows created or moved forward
+
+    The newest event per sensor is written over the stored row only when
+    it is at least as recent, so out of order batches never move a sensor
+    back in time. A sensor whose batch carries a soft deleted event may
+    have lost its latest reading and is refreshed from history instead.
+    """
+    newest = {}
+    stale = set()
+    for event in events:
+        if event.deleted:
+            stale.add(event.sensor_id)
+        elif event.sensor_id not in newest or \
+             event.timestamp >= newest[event.sensor_id].timestamp:
+            newest[event.sensor_id] = event
+    stored = dict(SensorLatest.objects.filter(
+                      sensor_id__in=list(newest)).values_list(
+                      'sensor_id', 'timestamp'))
+    created = []
+    changed = 0
+    for sensor_id, event in newest.items():
+        if sensor_id in stale:
+            continue
+        if sensor_id not in stored:
+            created.append(SensorLatest(sensor_id=sensor_id,
+                                        **_get_values(event)))
+        elif stored[sensor_id] <= event.timestamp:
+            changed += SensorLatest.objects.filter(
+                           sensor_id=sensor_id,
+                           timestamp__lte=event.timestamp).update(
+                           **_get_values(event))
+    SensorLatest.objects.bulk_create(created)
+    return len(created) + changed + refresh_latest(stale)
+
+def refresh_latest(sensor_ids):
+    """
+    sensor_ids: iterable of Sensor pks
+    return: number of SensorLatest rows written
+
+    Each sensor's newest non-deleted event is read with a backwards scan
+    of the (sensor, timestamp) index; a sensor without one loses its row.
+    """
+    written = 0
+    for sensor_id in set(sensor_ids):
+        event = Event.objects.filter(sensor_id=sensor_id,
+                                     deleted=False).order_by(
+                                     '-timestamp').first()
+        if event is None:
+            SensorLatest.objects.filter(sensor_id=sensor_id).delete()
+            continue
+        SensorLatest.objects.update_or_create(sensor_id=sensor_id,
+                                              defaults=_get_values(event))
+        written += 1
+    return written
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+
+from complex.archive import archive_events
+
+class Command(BaseCommand):
+    help = ('Move complex.Event rows older than a number of days into '
+            'per-sensor, per-day gzip NDJSON files and delete them')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than',
+                            type=int,
+                            default=None,
+                            metavar='DAYS',
+                            help='archive events older than this many days')
+        parser.add_argument('--dest',
+                            default=None,
+                            help='archive directory, default: '
+                                 'settings.EVENT_ARCHIVE_DIR')
+        parser.add_argument('--sensor',
+                            type=int,
+                            action='append',
+                            default=None,
+                            help='sensor pk, may be repeated, default: all')
+        parser.add_argument('--chunk-size',
+                            type=int,
+                            default=5000,
+                            help='events archived and deleted per step')
+
+    def handle(self, *args, **options):
+        if options['older_than'] is None:
+            raise CommandError('--older-than is required')
+        if options['older_than'] < 1:
+            raise CommandError('--older-than must be positive')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        dest = options['dest'] or settings.EVENT_ARCHIVE_DIR
+        cutoff = now() - timedelta(days=options['older_than'])
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        count = archive_events(cutoff, dest, options['chunk_size'],
+                               options['sensor'], log)
+        self.stdout.write(self.style.SUCCESS(
+            'archived {0} events older than {1} to {2}'.format(
+            count, cutoff.isoformat(), dest)))
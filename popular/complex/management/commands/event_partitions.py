@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.timezone import now
+
+from complex.partitions import PartitioningUnsupported, drop_partition
+from complex.partitions import ensure_partitions, list_partitions
+from complex.partitions import month_start, parse_month, partition_name
+
+class Command(BaseCommand):
+    help = ('Create upcoming monthly complex.Event partitions, drop old '
+            'ones or list them; PostgreSQL 11 or later only')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ensure',
+                            type=int,
+                            default=None,
+                            metavar='MONTHS',
+                            help='create partitions for this month and the '
+                                 'next MONTHS - 1')
+        parser.add_argument('--drop',
+                            action='append',
+                            default=None,
+                            metavar='YYYY-MM',
+                            help='detach and drop a month, may be repeated')
+        parser.add_argument('--list',
+                            action='store_true',
+                            help='print the attached monthly partitions')
+
+    def handle(self, *args, **options):
+        drops = []
+        for value in options['drop'] or []:
+            try:
+                drops.append(parse_month(value))
+            except ValueError as e:
+                raise CommandError(str(e))
+        if options['ensure'] is not None and options['ensure'] < 1:
+            raise CommandError('--ensure must be positive')
+        if options['ensure'] is None and not drops and not options['list']:
+            raise CommandError('nothing to do, pass --ensure, --drop or --list')
+        try:
+            with transaction.atomic():
+                if options['ensure']:
+                    for month in ensure_partitions(month_start(now()),
+                                                   options['ensure']):
+                        self.stdout.write('ensured {}'.format(
+                                          partition_name(month)))
+                for month in drops:
+                    drop_partition(month)
+                    self.stdout.write('dropped {}'.format(partition_name(month)))
+            if options['list']:
+                for month, name in list_partitions():
+                    self.stdout.write('{0}\t{1}'.format(month.strftime('%Y-%m'),
+                                                        name))
+        except PartitioningUnsupported as e:
+            raise CommandError(str(e))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from complex.models import Event
+from complex.stats import STATS_GROUPS, STATS_PERCENTILES, event_stats
+from complex.utils import MEASUREMENTS, datetime_option
+
+class Command(BaseCommand):
+    help = ('Print count, mean, std, min, max and percentiles of event '
+            'measurements per sensor or location as tab separated rows')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group-by',
+                            choices=sorted(STATS_GROUPS),
+                            default='sensor')
+        parser.add_argument('--measurement',
+                            choices=MEASUREMENTS,
+                            action='append',
+                            default=None,
+                            help='may be repeated, default: all measurements')
+        parser.add_argument('--percentile',
+                            type=float,
+                            action='append',
+                            default=None,
+                            help='may be repeated, default: {}'.format(
+                                 ' '.join(str(p) for p in STATS_PERCENTILES)))
+        parser.add_argument('--sensor',
+                            type=int,
+                            action='append',
+                            default=None,
+                            help='sensor pk, may be repeated, default: all')
+        parser.add_argument('--start',
+                            default=None,
+                            help='ISO 8601 datetime, inclusive')
+        parser.add_argument('--end',
+                            default=None,
+                            help='ISO 8601 datetime, exclusive')
+        parser.add_argument('--chunk-size',
+                            type=int,
+                            default=None,
+                            help='rows per query, default: '
+                                 'settings.EVENT_STATS_CHUNK_ROWS')
+
+    def handle(self, *args, **options):
+        percentiles = options['percentile'] or STATS_PERCENTILES
+        for percentile in percentiles:
+            if not 0 <= percentile <= 100:
+                raise CommandError('--percentile must be within 0 and 100')
+        percentiles = [int(p) if p == int(p) else p for p in percentiles]
+        if options['chunk_size'] is not None and options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        queryset = Event.objects.filter(deleted=False)
+        if options['sensor']:
+            queryset = queryset.filter(sensor__in=options['sensor'])
+        start = datetime_option('start', options['start'])
+        if start is not None:
+            queryset = queryset.filter(timestamp__gte=start)
+        end = datetime_option('end', options['end'])
+        if end is not None:
+            queryset = queryset.filter(timestamp__lt=end)
+        measurements = options['measurement'] or MEASUREMENTS
+        stats = event_stats(queryset,
+                            options['group_by'],
+                            measurements,
+                            percentiles,
+                            options['chunk_size'])
+        names = ['count', 'mean', 'std', 'min', 'max'] + \
+                ['p{}'.format(p) for p in percentiles]
+        self.stdout.write('\t'.join([options['group_by'], 'measurement'] + names))
+        for key, measurements in stats.items():
+            for measurement, values in measurements.items():
+                row = [str(key), measurement, str(values['count'])]
+                row.extend('{:.4f}'.format(values[name]) for name in names[1:])
+                self.stdout.write('\t'.join(row))
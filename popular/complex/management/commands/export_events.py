@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from io import open
+
+from django.core.management.base import BaseCommand, CommandError
+
+from complex.export import iter_event_csv, write_event_npz
+from complex.models import Event
+from complex.utils import datetime_option
+
+class Command(BaseCommand):
+    help = ('Write non-deleted complex.Event rows to a CSV file or to a .npz '
+            'of typed column arrays, reading one chunk at a time')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path',
+                            help='output file')
+        parser.add_argument('--format',
+                            choices=['csv', 'npz'],
+                            default=None,
+                            help='output format, default: from file extension')
+        parser.add_argument('--sensor',
+                            type=int,
+                            action='append',
+                            default=None,
+                            help='sensor pk, may be repeated, default: all')
+        parser.add_argument('--location',
+                            type=int,
+                            choices=[value for value, label in Event.LOCATIONS],
+                            action='append',
+                            default=None,
+                            help='may be repeated, default: all')
+        parser.add_argument('--status',
+                            type=int,
+                            choices=[value for value, label in Event.STATUS],
+                            action='append',
+                            default=None,
+                            help='may be repeated, default: all')
+        parser.add_argument('--start',
+                            default=None,
+                            help='ISO 8601 datetime, inclusive')
+        parser.add_argument('--end',
+                            default=None,
+                            help='ISO 8601 datetime, exclusive')
+        parser.add_argument('--sensor-units',
+                            action='store_true',
+                            help="convert readings into each sensor's units")
+        parser.add_argument('--chunk-size',
+                            type=int,
+                            default=None,
+                            help='rows per query, default: '
+                                 'settings.EVENT_EXPORT_CHUNK_ROWS')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            fmt = 'npz' if path.lower().endswith('.npz') else 'csv'
+        if options['chunk_size'] is not None and options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        queryset = Event.objects.filter(deleted=False)
+        for name in ['sensor', 'location', 'status']:
+            if options[name]:
+                queryset = queryset.filter(**{'{}__in'.format(name):
+                                              options[name]})
+        start = datetime_option('start', options['start'])
+        if start is not None:
+            queryset = queryset.filter(timestamp__gte=start)
+        end = datetime_option('end', options['end'])
+        if end is not None:
+            queryset = queryset.filter(timestamp__lt=end)
+        if fmt == 'npz':
+            with open(path, 'wb') as f:
+                count = write_event_npz(queryset, f, options['chunk_size'],
+                                        options['sensor_units'])
+        else:
+            count = -1
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                for line in iter_event_csv(queryset, options['chunk_size'],
+                                           options['sensor_units']):
+                    f.write(line)
+                    count += 1
+        self.stdout.write(self.style.SUCCESS(
+            'exported {} events to {}'.format(count, path)))
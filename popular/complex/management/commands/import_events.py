@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from io import open
+from itertools import islice
+from json import dumps, load
+from os import remove, rename
+from os.path import exists
+from time import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.encoding import force_text
+
+from complex.ingest import ingest_rows, parse_csv, parse_ndjson
+
+class Command(BaseCommand):
+    help = ('Stream historical events from a CSV or NDJSON file into '
+            'complex.Event, committing one chunk per transaction')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path',
+                            help='CSV (with header row) or NDJSON file')
+        parser.add_argument('--format',
+                            choices=['csv', 'ndjson'],
+                            default=None,
+                            help='input format, default: from file extension')
+        parser.add_argument('--chunk-size',
+                            type=int,
+                            default=5000,
+                            help='rows committed per transaction')
+        parser.add_argument('--user',
+                            default=None,
+                            help='only accept sensors created by this username')
+        parser.add_argument('--checkpoint',
+                            default=None,
+                            help='checkpoint file, default: <path>.checkpoint')
+        parser.add_argument('--restart',
+                            action='store_true',
+                            help='ignore an existing checkpoint')
+
+    def _read_checkpoint(self, checkpoint, path):
+        if not exists(checkpoint):
+            return {'path': path, 'position': 0, 'accepted': 0, 'rejected': 0}
+        with open(checkpoint, encoding='utf-8') as f:
+            state = load(f)
+        if state.get('path') != path:
+            raise CommandError('checkpoint {} belongs to {}'.format(
+                               checkpoint, state.get('path')))
+        return state
+
+    def _write_checkpoint(self, checkpoint, state):
+        tmp = '{}.tmp'.format(checkpoint)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(force_text(dumps(state)))
+        rename(tmp, checkpoint)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not exists(path):
+            raise CommandError('no such file: {}'.format(path))
+        fmt = options['format']
+        if fmt is None:
+            fmt = 'csv' if path.lower().endswith('.csv') else 'ndjson'
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive')
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist as e:
+                raise CommandError('no such user: {}'.format(options['user']))
+        checkpoint = options['checkpoint'] or '{}.checkpoint'.format(path)
+        if options['restart'] and exists(checkpoint):
+            remove(checkpoint)
+        state = self._read_checkpoint(checkpoint, path)
+        if state['position']:
+            self.stdout.write('resuming after row {}'.format(state['position']))
+        parse = parse_csv if fmt == 'csv' else parse_ndjson
+        started = time()
+        processed = 0
+        with open(path, encoding='utf-8', newline='') as f:
+            rows = parse(f, skip=state['position'])
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                results = ingest_rows(chunk, user)
+                for result in results:
+                    if result['accepted']:
+                        state['accepted'] += 1
+                    else:
+                        state['rejected'] += 1
+                        if options['verbosity'] > 1:
+                            self.stderr.write('row {}: {}'.format(
+                                              result['line'], result['errors']))
+                state['position'] = chunk[-1][0]
+                self._write_checkpoint(checkpoint, state)
+                processed += len(chunk)
+                elapsed = max(time() - started, 1e-6)
+                self.stdout.write('{0} rows ({1} accepted, {2} rejected), '
+                                  '{3:.0f} rows/sec'.format(
+                                  state['position'], state['accepted'],
+                                  state['rejected'], processed / elapsed))
+        if exists(checkpoint):
+            remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            'imported {0} events, rejected {1}'.format(state['accepted'],
+                                                      state['rejected'])))
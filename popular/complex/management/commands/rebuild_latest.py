@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from complex.latest import refresh_latest
+from complex.models import Sensor
+
+class Command(BaseCommand):
+    help = 'Recompute complex.SensorLatest from stored events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensor',
+                            type=int,
+                            action='append',
+                            default=None,
+                            help='sensor pk to rebuild, may be repeated, '
+                                 'default: all sensors')
+
+    def handle(self, *args, **options):
+        sensors = Sensor.objects.order_by('id')
+        if options['sensor']:
+            sensors = sensors.filter(pk__in=options['sensor'])
+        with transaction.atomic():
+            written = refresh_latest(sensors.values_list('id', flat=True))
+        self.stdout.write(self.style.SUCCESS(
+            'rebuilt latest state for {} sensors'.format(written)))
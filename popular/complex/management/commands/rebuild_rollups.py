@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from time import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from complex.models import Event, Sensor, SensorHourlyRollup
+from complex.rollups import ONE_HOUR, aggregate_hours, hour_floor
+from complex.utils import datetime_option
+
+class Command(BaseCommand):
+    help = ('Recompute complex.SensorHourlyRollup from stored events, one '
+            'sensor per transaction')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensor',
+                            type=int,
+                            action='append',
+                            default=None,
+                            help='sensor pk to rebuild, may be repeated, '
+                                 'default: all sensors')
+        parser.add_argument('--start',
+                            default=None,
+                            help='ISO 8601 datetime, rebuild from the hour holding it')
+        parser.add_argument('--end',
+                            default=None,
+                            help='ISO 8601 datetime, rebuild through the hour holding it')
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=500,
+                            help='rollup rows per INSERT')
+
+    def handle(self, *args, **options):
+        # widen the window to whole hours so no bucket is half rebuilt
+        start = datetime_option('start', options['start'])
+        if start is not None:
+            start = hour_floor(start)
+        end = datetime_option('end', options['end'])
+        if end is not None and hour_floor(end) != end:
+            end = hour_floor(end) + ONE_HOUR
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        sensors = Sensor.objects.order_by('id')
+        if options['sensor']:
+            sensors = sensors.filter(pk__in=options['sensor'])
+        started = time()
+        total = 0
+        for sensor_id in sensors.values_list('id', flat=True):
+            events = Event.objects.sensor_range(sensor_id, start, end)
+            stored = SensorHourlyRollup.objects.sensor_range(sensor_id,
+                                                             start, end)
+            with transaction.atomic():
+                rollups = aggregate_hours(events)
+                stored.delete()
+                SensorHourlyRollup.objects.bulk_create(
+                    rollups, batch_size=options['batch_size'])
+            total += len(rollups)
+            self.stdout.write('sensor {0}: {1} hours, {2:.1f}s'.format(
+                              sensor_id, len(rollups), time() - started))
+        self.stdout.write(self.style.SUCCESS(
+            'rebuilt {} hourly rollups'.format(total)))
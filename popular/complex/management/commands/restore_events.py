@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from complex.archive import restore_events
+from complex.utils import date_option
+
+class Command(BaseCommand):
+    help = ('Upsert archived complex.Event rows for a range of UTC days '
+            'back into the database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('start',
+                            help='first day to restore, YYYY-MM-DD')
+        parser.add_argument('end',
+                            nargs='?',
+                            default=None,
+                            help='last day to restore, YYYY-MM-DD, '
+                                 'default: start')
+        parser.add_argument('--dest',
+                            default=None,
+                            help='archive directory, default: '
+                                 'settings.EVENT_ARCHIVE_DIR')
+        parser.add_argument('--sensor',
+                            type=int,
+                            action='append',
+                            default=None,
+                            help='sensor pk, may be repeated, default: all')
+        parser.add_argument('--chunk-size',
+                            type=int,
+                            default=5000,
+                            help='events upserted per transaction')
+
+    def handle(self, *args, **options):
+        start = date_option(options['start'])
+        end = date_option(options['end']) if options['end'] else start
+        if end < start:
+            raise CommandError('end precedes start')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        dest = options['dest'] or settings.EVENT_ARCHIVE_DIR
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        counts = restore_events(dest, start, end + timedelta(days=1),
+                                options['chunk_size'], options['sensor'], log)
+        self.stdout.write(self.style.SUCCESS(
+            'restored {created} events, updated {updated}, '
+            '{unchanged} already present'.format(**counts)))
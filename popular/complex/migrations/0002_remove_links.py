@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 06:48
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complex', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='event',
+            name='dlink',
+        ),
+        migrations.RemoveField(
+            model_name='event',
+            name='link',
+        ),
+        migrations.RemoveField(
+            model_name='event',
+            name='ulink',
+        ),
+        migrations.RemoveField(
+            model_name='sensor',
+            name='dlink',
+        ),
+        migrations.RemoveField(
+            model_name='sensor',
+            name='link',
+        ),
+        migrations.RemoveField(
+            model_name='sensor',
+            name='ulink',
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 06:51
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def delete_duplicate_events(apps, schema_editor):
+    """
+    keeps the first stored event for every (sensor, timestamp) pair so the
+    unique constraint can be created over existing data
+    """
+    Event = apps.get_model('complex', 'Event')
+    duplicates = Event.objects.values('sensor_id', 'timestamp').annotate(
+                     keep=models.Min('id'),
+                     count=models.Count('id')).filter(count__gt=1).order_by()
+    for duplicate in duplicates:
+        Event.objects.filter(sensor_id=duplicate['sensor_id'],
+                             timestamp=duplicate['timestamp']).exclude(
+                             id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complex', '0002_remove_links'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_events,
+                             migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='event',
+            unique_together=set([('sensor', 'timestamp')]),
+        ),
+    ]
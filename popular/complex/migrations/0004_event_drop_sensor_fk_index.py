@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 06:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complex', '0003_event_unique_sensor_timestamp'),
+    ]
+
+    # the (sensor, timestamp) unique index from 0003 leads with sensor_id,
+    # so the single column foreign key index only costs writes
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='sensor',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='complex.Sensor'),
+        ),
+    ]
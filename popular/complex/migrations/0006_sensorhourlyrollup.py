@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 06:56
+from __future__ import unicode_literals
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complex', '0005_event_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorHourlyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('avg_temp_sum', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('avg_temp_min', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('avg_temp_max', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('avg_pressure_sum', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('avg_pressure_min', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('avg_pressure_max', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('pct_humidity_sum', models.BigIntegerField(default=0)),
+                ('pct_humidity_min', models.PositiveIntegerField(null=True)),
+                ('pct_humidity_max', models.PositiveIntegerField(null=True)),
+                ('altitude_sum', models.BigIntegerField(default=0)),
+                ('altitude_min', models.PositiveIntegerField(null=True)),
+                ('altitude_max', models.PositiveIntegerField(null=True)),
+                ('windspeed_sum', models.BigIntegerField(default=0)),
+                ('windspeed_min', models.PositiveIntegerField(null=True)),
+                ('windspeed_max', models.PositiveIntegerField(null=True)),
+                ('online', models.PositiveIntegerField(default=0)),
+                ('climate_fault', models.PositiveIntegerField(default=0)),
+                ('camera_fault', models.PositiveIntegerField(default=0)),
+                ('low_power', models.PositiveIntegerField(default=0)),
+                ('sensor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='complex.Sensor')),
+            ],
+            options={
+                'ordering': ['sensor', 'hour'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='sensorhourlyrollup',
+            unique_together=set([('sensor', 'hour')]),
+        ),
+    ]
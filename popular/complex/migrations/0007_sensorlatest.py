@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 06:57
+from __future__ import unicode_literals
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complex', '0006_sensorhourlyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorLatest',
+            fields=[
+                ('sensor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='latest', serialize=False, to='complex.Sensor')),
+                ('timestamp', models.DateTimeField()),
+                ('location', models.SmallIntegerField(choices=[(0, 'Nose'), (1, 'Cockpit'), (2, 'Fore Exit Door'), (3, 'Port Wing Tip'), (4, 'Port Wing'), (5, 'Starboard Wing Tip'), (6, 'Starboard Wing'), (7, 'Aft Exit Door'), (8, 'Tail')], default=1)),
+                ('status', models.SmallIntegerField(choices=[(100, 'Online'), (101, 'Climate Fault'), (102, 'Camera Fault'), (103, 'Low Power')], default=100)),
+                ('camera', models.SmallIntegerField(choices=[(200, 'N/A'), (201, 'Lens Obscured'), (202, 'Contrast Too High'), (203, 'Memory Full')], default=200)),
+                ('avg_temp', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5)),
+                ('avg_pressure', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5)),
+                ('pct_humidity', models.PositiveIntegerField(default=0)),
+                ('altitude', models.PositiveIntegerField(default=0)),
+                ('windspeed', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['sensor'],
+            },
+        ),
+    ]
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# PostgreSQL 11+ only: complex_event becomes a table partitioned by UTC
+# month of timestamp, with a default partition for rows outside every
+# month, so range queries scan only the matching partitions and a month
+# is removed by detaching it. The partition key has to be part of every
+# unique index, hence the (id, timestamp) primary key. The CHECK
+# constraints are copied and the unique, index and foreign key names are
+# the ones Django 1.11 generated for them in earlier migrations.
+#
+# Scope: this is PostgreSQL 11+ only. On SQLite, the configured default,
+# and on older PostgreSQL the migration is a no-op and complex_event stays
+# one table; there is no per-month routing fallback, and the
+# event_partitions command refuses to run there with a CommandError.
+
+def partition_events(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or connection.pg_version < 110000:
+        return
+    execute = schema_editor.execute
+    execute('ALTER TABLE complex_event RENAME TO complex_event_unpartitioned')
+    execute('CREATE TABLE complex_event '
+            '(LIKE complex_event_unpartitioned INCLUDING DEFAULTS '
+            'INCLUDING CONSTRAINTS) PARTITION BY RANGE ("timestamp")')
+    execute('ALTER SEQUENCE complex_event_id_seq OWNED BY complex_event.id')
+    execute('CREATE TABLE complex_event_default PARTITION OF complex_event DEFAULT')
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT DISTINCT to_char(\"timestamp\" AT TIME ZONE 'UTC', "
+                       "'YYYY-MM') FROM complex_event_unpartitioned "
+                       "UNION SELECT to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM')")
+        months = sorted(row[0] for row in cursor.fetchall())
+    for month in months:
+        year, number = [int(part) for part in month.split('-')]
+        upper = '{0:04d}-{1:02d}'.format(year + number // 12, number % 12 + 1)
+        execute("CREATE TABLE complex_event_y{0:04d}m{1:02d} PARTITION OF "
+                "complex_event FOR VALUES FROM ('{2}-01T00:00:00+00:00') "
+                "TO ('{3}-01T00:00:00+00:00')".format(year, number, month,
+                                                      upper))
+    execute('INSERT INTO complex_event SELECT * FROM complex_event_unpartitioned')
+    execute('DROP TABLE complex_event_unpartitioned')
+    execute('ALTER TABLE complex_event ADD CONSTRAINT complex_event_pkey '
+            'PRIMARY KEY (id, "timestamp")')
+    execute('ALTER TABLE complex_event ADD CONSTRAINT '
+            'complex_event_sensor_id_timestamp_77ebd699_uniq UNIQUE (sensor_id, "timestamp")')
+    execute('CREATE INDEX complex_eve_timesta_f434dc_idx ON complex_event ("timestamp")')
+    execute('ALTER TABLE complex_event ADD CONSTRAINT '
+            'complex_event_sensor_id_2b4e7fc4_fk_complex_sensor_id FOREIGN KEY (sensor_id) '
+            'REFERENCES complex_sensor (id) DEFERRABLE INITIALLY DEFERRED')
+
+def unpartition_events(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or connection.pg_version < 110000:
+        return
+    execute = schema_editor.execute
+    execute('CREATE TABLE complex_event_unpartitioned '
+            '(LIKE complex_event INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    execute('INSERT INTO complex_event_unpartitioned SELECT * FROM complex_event')
+    execute('ALTER SEQUENCE complex_event_id_seq OWNED BY '
+            'complex_event_unpartitioned.id')
+    execute('DROP TABLE complex_event CASCADE')
+    execute('ALTER TABLE complex_event_unpartitioned RENAME TO complex_event')
+    execute('ALTER TABLE complex_event ADD CONSTRAINT complex_event_pkey '
+            'PRIMARY KEY (id)')
+    execute('ALTER TABLE complex_event ADD CONSTRAINT '
+            'complex_event_sensor_id_timestamp_77ebd699_uniq UNIQUE (sensor_id, "timestamp")')
+    execute('CREATE INDEX complex_eve_timesta_f434dc_idx ON complex_event ("timestamp")')
+    execute('ALTER TABLE complex_event ADD CONSTRAINT '
+            'complex_event_sensor_id_2b4e7fc4_fk_complex_sensor_id FOREIGN KEY (sensor_id) '
+            'REFERENCES complex_sensor (id) DEFERRABLE INITIALLY DEFERRED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complex', '0007_sensorlatest'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_events, unpartition_events),
+    ]
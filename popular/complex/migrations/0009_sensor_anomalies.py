@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 07:06
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complex', '0008_event_partitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorAnomaly',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('measurement', models.CharField(choices=[('avg_temp', 'Average Temperature'), ('avg_pressure', 'Average Pressure'), ('pct_humidity', 'Percentage Humidity'), ('altitude', 'Altitude'), ('windspeed', 'Windspeed')], max_length=20)),
+                ('value', models.FloatField()),
+                ('mean', models.FloatField()),
+                ('std', models.FloatField()),
+                ('zscore', models.FloatField()),
+            ],
+            options={
+                'ordering': ['sensor', 'timestamp'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SensorBaseline',
+            fields=[
+                ('sensor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='baseline', serialize=False, to='complex.Sensor')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('timestamp', models.DateTimeField(null=True)),
+                ('avg_temp_mean', models.FloatField(default=0.0)),
+                ('avg_temp_var', models.FloatField(default=0.0)),
+                ('avg_pressure_mean', models.FloatField(default=0.0)),
+                ('avg_pressure_var', models.FloatField(default=0.0)),
+                ('pct_humidity_mean', models.FloatField(default=0.0)),
+                ('pct_humidity_var', models.FloatField(default=0.0)),
+                ('altitude_mean', models.FloatField(default=0.0)),
+                ('altitude_var', models.FloatField(default=0.0)),
+                ('windspeed_mean', models.FloatField(default=0.0)),
+                ('windspeed_var', models.FloatField(default=0.0)),
+            ],
+            options={
+                'ordering': ['sensor'],
+            },
+        ),
+        migrations.AddField(
+            model_name='sensoranomaly',
+            name='sensor',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='complex.Sensor'),
+        ),
+        migrations.AlterIndexTogether(
+            name='sensoranomaly',
+            index_together=set([('sensor', 'timestamp')]),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 07:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complex', '0009_sensor_anomalies'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='sensoranomaly',
+            index_together=set([]),
+        ),
+        migrations.AddIndex(
+            model_name='sensoranomaly',
+            index=models.Index(fields=['sensor', 'timestamp'], name='complex_sen_sensor__1e544f_idx'),
+        ),
+    ]
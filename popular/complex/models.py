@@ -7,7 +7,48 @@ from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from django.db import models
 
-class Sensor(models.Model):
+from complex.utils import MEASUREMENT_CHOICES
+
+URL_PK_SENTINEL = 987654321
+
+_url_templates = {}
+
+def get_object_url(viewname, pk):
+    """
+    viewname: str, namespaced url name taking a single pk kwarg
+    pk: int or None
+    return: str, same as reverse(viewname, kwargs={'pk': pk}) but built
+            from a prefix/suffix resolved once per viewname
+    """
+    if pk is None:
+        return None
+    if viewname not in _url_templates:
+        url = reverse(viewname, kwargs={'pk': URL_PK_SENTINEL})
+        _url_templates[viewname] = url.split(str(URL_PK_SENTINEL), 1)
+    prefix, suffix = _url_templates[viewname]
+    return '{0}{1}{2}'.format(prefix, pk, suffix)
+
+class LinkMixin(object):
+    """
+    derives detail/update/delete urls from the primary key instead of
+    storing them, so a create is a single INSERT
+    link_views: tuple of (detail, update, delete) url names
+    """
+    link_views = (None, None, None)
+
+    @property
+    def link(self):
+        return get_object_url(self.link_views[0], self.pk)
+
+    @property
+    def ulink(self):
+        return get_object_url(self.link_views[1], self.pk)
+
+    @property
+    def dlink(self):
+        return get_object_url(self.link_views[2], self.pk)
+
+class Sensor(LinkMixin, models.Model):
     FAHRENHEIT = 0
     CELSIUS = 1
 
@@ -64,15 +105,10 @@ class Sensor(models.Model):
     installed = models.DateField(auto_now_add=True)
     climate = models.BooleanField(default=True)
     camera = models.BooleanField(default=False)
-    link = models.URLField(max_length=30,
-                           null=True,
-                           blank=False)
-    ulink = models.URLField(max_length=30,
-                            null=True,
-                            blank=False)
-    dlink = models.URLField(max_length=30,
-                            null=True,
-                            blank=False)
+
+    link_views = ('complex:sensor-detail',
+                  'complex:sensor-update',
+                  'complex:sensor-delete')
 
     def __str__(self):
         return '{0}:{1}'.format(self.name, self.serial_no)
@@ -83,20 +119,26 @@ class Sensor(models.Model):
         else:
             return '%r' % (self.__class__)
 
-    def save(self, *args, **kwargs):
-        super(Sensor, self).save(*args, **kwargs)
-        kwargs = {'link': reverse('complex:sensor-detail',
-                                  kwargs = {'pk': self.pk}),
-                  'ulink': reverse('complex:sensor-update',
-                                   kwargs = {'pk': self.pk}),
-                  'dlink': reverse('complex:sensor-delete',
-                                   kwargs = {'pk': self.pk})}
-        Sensor.objects.filter(pk=self.pk).update(**kwargs)
-
     class Meta:
         ordering = ['id']
 
-class Event(models.Model):
+class EventQuerySet(models.QuerySet):
+    def sensor_range(self, sensor, start=None, end=None):
+        """
+        sensor: Sensor or pk
+        start: aware datetime, inclusive lower bound or None
+        end: aware datetime, exclusive upper bound or None
+        return: the sensor's events in timestamp order, answered by a range
+                scan of the (sensor, timestamp) unique index
+        """
+        queryset = self.filter(sensor=sensor)
+        if start is not None:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end is not None:
+            queryset = queryset.filter(timestamp__lt=end)
+        return queryset.order_by('timestamp')
+
+class Event(LinkMixin, models.Model):
     NOSE = 0
     COCKPIT = 1
     FORE_DOOR = 2
@@ -142,7 +184,8 @@ class Event(models.Model):
         (GLARE, 'Contrast Too High'),
         (MEMORY_FULL, 'Memory Full')
     )
-    sensor = models.ForeignKey(Sensor)
+    sensor = models.ForeignKey(Sensor,
+                               db_index=False)
     timestamp = models.DateTimeField() 
     location = models.SmallIntegerField(choices=LOCATIONS,
                                         default=COCKPIT)
@@ -160,15 +203,12 @@ class Event(models.Model):
     altitude = models.PositiveIntegerField(default=0)
     windspeed = models.PositiveIntegerField(default=0)
     deleted = models.BooleanField(default=False)
-    link = models.URLField(max_length=30,
-                           null=True,
-                           blank=False)
-    ulink = models.URLField(max_length=30,
-                            null=True,
-                            blank=False)
-    dlink = models.URLField(max_length=30,
-                            null=True,
-                            blank=False)
+
+    objects = EventQuerySet.as_manager()
+
+    link_views = ('complex:event-detail',
+                  'complex:event-update',
+                  'complex:event-delete')
 
     def __str__(self):
         return '{}:{}'.format(self.sensor, self.id)
@@ -179,15 +219,171 @@ class Event(models.Model):
         else:
             return '%r' % (self.__class__)
 
-    def save(self, *args, **kwargs):
-        super(Event, self).save(*args, **kwargs)
-        kwargs = {'link': reverse('complex:event-detail',
-                                  kwargs = {'pk': self.pk}),
-                  'ulink': reverse('complex:event-update',
-                                   kwargs = {'pk': self.pk}),
-                  'dlink': reverse('complex:event-delete',
-                                   kwargs = {'pk': self.pk})}
-        Event.objects.filter(pk=self.pk).update(**kwargs)
-
     class Meta:
+        indexes = [models.Index(fields=['timestamp'])]
         ordering = ['id']
+        unique_together = (('sensor', 'timestamp'),)
+
+class SensorHourlyRollupQuerySet(models.QuerySet):
+    def sensor_range(self, sensor, start=None, end=None):
+        """
+        sensor: Sensor or pk
+        start: aware datetime, inclusive lower bound or None
+        end: aware datetime, exclusive upper bound or None
+        return: the sensor's hourly buckets in hour order
+        """
+        queryset = self.filter(sensor=sensor)
+        if start is not None:
+            queryset = queryset.filter(hour__gte=start)
+        if end is not None:
+            queryset = queryset.filter(hour__lt=end)
+        return queryset.order_by('hour')
+
+class SensorHourlyRollup(models.Model):
+    """
+    per sensor, per UTC hour aggregates of non-deleted events, kept in
+    step with Event by complex.rollups
+    """
+    sensor = models.ForeignKey(Sensor,
+                               db_index=False,
+                               on_delete=models.CASCADE)
+    hour = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    avg_temp_sum = models.DecimalField(max_digits=15,
+                                       decimal_places=2,
+                                       default=Decimal('0.00'))
+    avg_temp_min = models.DecimalField(max_digits=5,
+                                       decimal_places=2,
+                                       null=True)
+    avg_temp_max = models.DecimalField(max_digits=5,
+                                       decimal_places=2,
+                                       null=True)
+    avg_pressure_sum = models.DecimalField(max_digits=15,
+                                           decimal_places=2,
+                                           default=Decimal('0.00'))
+    avg_pressure_min = models.DecimalField(max_digits=5,
+                                           decimal_places=2,
+                                           null=True)
+    avg_pressure_max = models.DecimalField(max_digits=5,
+                                           decimal_places=2,
+                                           null=True)
+    pct_humidity_sum = models.BigIntegerField(default=0)
+    pct_humidity_min = models.PositiveIntegerField(null=True)
+    pct_humidity_max = models.PositiveIntegerField(null=True)
+    altitude_sum = models.BigIntegerField(default=0)
+    altitude_min = models.PositiveIntegerField(null=True)
+    altitude_max = models.PositiveIntegerField(null=True)
+    windspeed_sum = models.BigIntegerField(default=0)
+    windspeed_min = models.PositiveIntegerField(null=True)
+    windspeed_max = models.PositiveIntegerField(null=True)
+    online = models.PositiveIntegerField(default=0)
+    climate_fault = models.PositiveIntegerField(default=0)
+    camera_fault = models.PositiveIntegerField(default=0)
+    low_power = models.PositiveIntegerField(default=0)
+
+    objects = SensorHourlyRollupQuerySet.as_manager()
+
+    def __str__(self):
+        return '{}:{}'.format(self.sensor_id, self.hour.isoformat())
+
+    def mean(self, measurement):
+        """
+        measurement: str, one of the Event measurement field names
+        return: Decimal mean over the hour, None for an empty bucket
+        """
+        if not self.count:
+            return None
+        return Decimal(getattr(self, '{}_sum'.format(measurement))) / self.count
+
+    @property
+    def faults(self):
+        return self.climate_fault + self.camera_fault + self.low_power
+
+    class Meta:
+        ordering = ['sensor', 'hour']
+        unique_together = (('sensor', 'hour'),)
+
+class SensorLatest(models.Model):
+    """
+    copy of the most recent non-deleted event per sensor, kept current by
+    complex.latest so fleet status reads one row per sensor
+    """
+    sensor = models.OneToOneField(Sensor,
+                                  primary_key=True,
+                                  on_delete=models.CASCADE,
+                                  related_name='latest')
+    timestamp = models.DateTimeField()
+    location = models.SmallIntegerField(choices=Event.LOCATIONS,
+                                        default=Event.COCKPIT)
+    status = models.SmallIntegerField(choices=Event.STATUS,
+                                      default=Event.ONLINE)
+    camera = models.SmallIntegerField(choices=Event.CAMERA,
+                                      default=Event.NA)
+    avg_temp = models.DecimalField(max_digits=5,
+                                   decimal_places=2,
+                                   default=Decimal('0.00'))
+    avg_pressure = models.DecimalField(max_digits=5,
+                                       decimal_places=2,
+                                       default=Decimal('0.00'))
+    pct_humidity = models.PositiveIntegerField(default=0)
+    altitude = models.PositiveIntegerField(default=0)
+    windspeed = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return '{}:{}'.format(self.sensor_id, self.timestamp.isoformat())
+
+    class Meta:
+        ordering = ['sensor']
+
+class SensorBaseline(models.Model):
+    """
+    running mean and population variance of each measurement per sensor,
+    updated one reading at a time by complex.anomalies
+    """
+    sensor = models.OneToOneField(Sensor,
+                                  primary_key=True,
+                                  on_delete=models.CASCADE,
+                                  related_name='baseline')
+    count = models.PositiveIntegerField(default=0)
+    timestamp = models.DateTimeField(null=True)
+    avg_temp_mean = models.FloatField(default=0.0)
+    avg_temp_var = models.FloatField(default=0.0)
+    avg_pressure_mean = models.FloatField(default=0.0)
+    avg_pressure_var = models.FloatField(default=0.0)
+    pct_humidity_mean = models.FloatField(default=0.0)
+    pct_humidity_var = models.FloatField(default=0.0)
+    altitude_mean = models.FloatField(default=0.0)
+    altitude_var = models.FloatField(default=0.0)
+    windspeed_mean = models.FloatField(default=0.0)
+    windspeed_var = models.FloatField(default=0.0)
+
+    def __str__(self):
+        return '{}:{}'.format(self.sensor_id, self.count)
+
+    class Meta:
+        ordering = ['sensor']
+
+class SensorAnomaly(models.Model):
+    """
+    a reading whose z-score against its sensor's baseline exceeded
+    settings.EVENT_ANOMALY_ZSCORE when it was ingested
+    """
+    MEASUREMENTS = MEASUREMENT_CHOICES
+    sensor = models.ForeignKey(Sensor,
+                               db_index=False,
+                               on_delete=models.CASCADE)
+    timestamp = models.DateTimeField()
+    measurement = models.CharField(max_length=20,
+                                   choices=MEASUREMENTS)
+    value = models.FloatField()
+    mean = models.FloatField()
+    std = models.FloatField()
+    zscore = models.FloatField()
+
+    def __str__(self):
+        return '{}:{}:{}'.format(self.sensor_id, self.timestamp.isoformat(),
+                                 self.measurement)
+
+    class Meta:
+        indexes = [models.Index(fields=['sensor', 'timestamp'])]
+        ordering = ['sensor', 'timestamp']
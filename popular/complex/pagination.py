@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from json import dumps, loads
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+class KeysetPaginationMixin(object):
+    """
+    Seek pagination for a MultipleObjectMixin view.
+
+    Rows are ordered by keyset_fields, which must end in a unique field,
+    and a page is fetched with WHERE (keyset) > (last row) LIMIT n+1, so
+    page N costs the same as page 1 and no COUNT(*) is issued. Cursors
+    are opaque urlsafe tokens passed as ?cursor=. Requests carrying
+    ?page= keep the offset Paginator for existing links.
+    """
+    keyset_fields = ('id',)
+    cursor_kwarg = 'cursor'
+
+    def _encode_cursor(self, obj, direction):
+        values = [getattr(obj, name) for name in self.keyset_fields]
+        values = [v.isoformat() if hasattr(v, 'isoformat') else v
+                  for v in values]
+        token = dumps({'d': direction, 'k': values})
+        return urlsafe_b64encode(token.encode('utf-8')).decode('ascii')
+
+    def _decode_cursor(self, model, cursor):
+        try:
+            token = loads(urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            direction = token['d']
+            values = [model._meta.get_field(name).to_python(value)
+                      for name, value in zip(self.keyset_fields, token['k'])]
+        except (BinasciiError, KeyError, TypeError, UnicodeError,
+                ValueError, ValidationError) as e:
+            raise Http404('Invalid cursor')
+        if direction not in ('next', 'prev') or \
+           len(values) != len(self.keyset_fields):
+            raise Http404('Invalid cursor')
+        return (direction, values)
+
+    def _seek(self, values, lookup):
+        """
+        return: Q matching rows whose keyset compares past values, i.e.
+                a >= x AND ((a > x) OR (a = x AND b > y)) for keyset (a, b)
+
+        The leading a >= x (a <= x seeking backwards) is implied by the OR
+        but is what lets the planner start a range scan of the index at x
+        rather than walk it from the first row and filter.
+        """
+        condition = Q()
+        for idx, name in enumerate(self.keyset_fields):
+            term = Q(**{'{}__{}'.format(name, lookup): values[idx]})
+            for prior, value in zip(self.keyset_fields[:idx], values[:idx]):
+                term &= Q(**{prior: value})
+            condition |= term
+        if len(self.keyset_fields) > 1:
+            bound = '{}__{}e'.format(self.keyset_fields[0], lookup)
+            condition = Q(**{bound: values[0]}) & condition
+        return condition
+
+    def _get_url(self, obj, direction):
+        params = self.request.GET.copy()
+        params[self.cursor_kwarg] = self._encode_cursor(obj, direction)
+        return '{}?{}'.format(self.request.path, params.urlencode())
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.page_kwarg in self.kwargs or self.page_kwarg in self.request.GET:
+            return super(KeysetPaginationMixin, self).paginate_queryset(
+                       queryset, page_size)
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        ascending = queryset.order_by(*self.keyset_fields)
+        self.next_url = None
+        self.prev_url = None
+        if not cursor:
+            rows = list(ascending[:page_size + 1])
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+            if has_more:
+                self.next_url = self._get_url(rows[-1], 'next')
+            return (None, None, rows, False)
+        direction, values = self._decode_cursor(queryset.model, cursor)
+        if direction == 'next':
+            rows = list(ascending.filter(self._seek(values, 'gt'))[:page_size + 1])
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+            if rows:
+                self.prev_url = self._get_url(rows[0], 'prev')
+                if has_more:
+                    self.next_url = self._get_url(rows[-1], 'next')
+        else:
+            descending = queryset.order_by(*['-{}'.format(name)
+                                             for name in self.keyset_fields])
+            rows = list(descending.filter(self._seek(values, 'lt'))[:page_size + 1])
+            has_more = len(rows) > page_size
+            rows = list(reversed(rows[:page_size]))
+            if rows:
+                self.next_url = self._get_url(rows[-1], 'next')
+                if has_more:
+                    self.prev_url = self._get_url(rows[0], 'prev')
+        return (None, None, rows, False)
+
+    def get_context_data(self, **kwargs):
+        context = super(KeysetPaginationMixin, self).get_context_data(**kwargs)
+        context['next_url'] = getattr(self, 'next_url', None)
+        context['prev_url'] = getattr(self, 'prev_url', None)
+        return context
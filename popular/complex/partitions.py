@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import date
+
+from django.db import connection as default_connection
+
+from complex.models import Event
+
+EVENT_TABLE = Event._meta.db_table
+DEFAULT_PARTITION = '{}_default'.format(EVENT_TABLE)
+
+class PartitioningUnsupported(Exception):
+    pass
+
+def month_start(value):
+    """
+    value: date or aware datetime, datetimes are taken in UTC
+    return: date of the first day of value's month
+    """
+    if hasattr(value, 'utcoffset') and value.utcoffset() is not None:
+        value = value - value.utcoffset()
+    return date(value.year, value.month, 1)
+
+def next_month(month):
+    """
+    month: date, first day of a month
+    return: date of the first day of the following month
+    """
+    if month.month == 12:
+        return date(month.year + 1, 1, 1)
+    return date(month.year, month.month + 1, 1)
+
+def parse_month(value):
+    """
+    value: str, YYYY-MM
+    return: date of the first day of that month
+    """
+    try:
+        year, month = value.split('-')
+        return date(int(year), int(month), 1)
+    except ValueError as e:
+        raise ValueError('expected YYYY-MM, got {}'.format(value))
+
+def partition_name(month):
+    """
+    month: date, first day of a month
+    return: str, name of the Event partition holding that UTC month
+    """
+    return '{0}_y{1:04d}m{2:02d}'.format(EVENT_TABLE, month.year, month.month)
+
+def check_supported(connection=None):
+    """
+    raise: PartitioningUnsupported unless connection is PostgreSQL 11 or
+           later, the first release with default partitions and unique
+           indexes on partitioned tables, and the Event table is
+           partitioned, which migration 0008 only does on such a server
+    """
+    connection = connection or default_connection
+    if connection.vendor != 'postgresql':
+        raise PartitioningUnsupported(
+            'event partitions need PostgreSQL, {} keeps one table'.format(
+            connection.vendor))
+    if connection.pg_version < 110000:
+        raise PartitioningUnsupported(
+            'event partitions need PostgreSQL 11 or later')
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE relname = %s '
+                       'AND pg_table_is_visible(oid)', [EVENT_TABLE])
+        row = cursor.fetchone()
+    if row is None or row[0] != 'p':
+        raise PartitioningUnsupported(
+            '{} is not partitioned, migration 0008 only partitions it when '
+            'applied on PostgreSQL 11 or later'.format(EVENT_TABLE))
+
+def create_partition_sql(month, connection=None):
+    """
+    month: date, first day of a month
+    return: str, CREATE TABLE attaching the month's partition
+    """
+    connection = connection or default_connection
+    quote = connection.ops.quote_name
+    return ("CREATE TABLE IF NOT EXISTS {0} PARTITION OF {1} "
+            "FOR VALUES FROM ('{2}T00:00:00+00:00') TO ('{3}T00:00:00+00:00')"
+            ).format(quote(partition_name(month)), quote(EVENT_TABLE),
+                     month.isoformat(), next_month(month).isoformat())
+
+def drop_partition_sql(month, connection=None):
+    """
+    month: date, first day of a month
+    return: list of str, detaching then dropping the month's partition
+    """
+    connection = connection or default_connection
+    quote = connection.ops.quote_name
+    return ['ALTER TABLE {0} DETACH PARTITION {1}'.format(
+                quote(EVENT_TABLE), quote(partition_name(month))),
+            'DROP TABLE {0}'.format(quote(partition_name(month)))]
+
+def list_partitions(connection=None):
+    """
+    return: list of (month, name) for the attached monthly partitions in
+            month order, the default partition is left out
+    """
+    connection = connection or default_connection
+    check_supported(connection)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT child.relname FROM pg_inherits '
+                       'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+                       'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+                       'WHERE parent.relname = %s', [EVENT_TABLE])
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = '{}_y'.format(EVENT_TABLE)
+    partitions = []
+    for name in names:
+        if name.startswith(prefix):
+            year, month = name[len(prefix):].split('m')
+            partitions.append((date(int(year), int(month), 1), name))
+    return sorted(partitions)
+
+def ensure_partitions(first, count, connection=None):
+    """
+    first: date, first day of the earliest month to cover
+    count: int, number of consecutive months
+    return: list of month dates whose partitions now exist
+
+    Rows for a month without a partition land in the default partition,
+    which then has to be emptied before that month can be attached, so
+    run this ahead of time, e.g. daily from cron.
+    """
+    connection = connection or default_connection
+    check_supported(connection)
+    months = []
+    month = first
+    with connection.cursor() as cursor:
+        for idx in range(count):
+            cursor.execute(create_partition_sql(month, connection))
+            months.append(month)
+            month = next_month(month)
+    return months
+
+def drop_partition(month, connection=None):
+    """
+    month: date, first day of a month
+    return: None
+
+    Detaching and dropping a partition is a catalog change, so removing a
+    month costs the same however many rows it held. Hourly rollups of the
+    month are kept.
+    """
+    connection = connection or default_connection
+    check_supported(connection)
+    with connection.cursor() as cursor:
+        for sql in drop_partition_sql(month, connection):
+            cursor.execute(sql)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.db.models import Case, Count, IntegerField, Max, Min, Q, Sum
+from django.db.models import When
+from django.db.models.functions import TruncHour
+from django.utils.timezone import utc
+
+from complex.models import Event, SensorHourlyRollup
+from complex.utils import MEASUREMENTS
+
+ROLLUP_STATUS = [(Event.ONLINE, 'online'),
+                 (Event.CLIMATE_FAULT, 'climate_fault'),
+                 (Event.CAMERA_FAULT, 'camera_fault'),
+                 (Event.LOW_POWER, 'low_power')]
+ONE_HOUR = timedelta(hours=1)
+ROLLUP_RUNS_PER_QUERY = 200
+
+def hour_floor(value):
+    """
+    value: aware datetime
+    return: start of the UTC hour containing value
+    """
+    return value.astimezone(utc).replace(minute=0, second=0, microsecond=0)
+
+def _get_aggregates():
+    aggregates = {'count': Count('id')}
+    for name in MEASUREMENTS:
+        aggregates['{}_sum'.format(name)] = Sum(name)
+        aggregates['{}_min'.format(name)] = Min(name)
+        aggregates['{}_max'.format(name)] = Max(name)
+    for status, name in ROLLUP_STATUS:
+        aggregates[name] = Sum(Case(When(status=status, then=1),
+                                    default=0,
+                                    output_field=IntegerField()))
+    return aggregates
+
+def _get_runs(hours):
+    """
+    hours: iterable of hour_floor datetimes
+    return: list of (start, end) covering consecutive hours
+    """
+    runs = []
+    for hour in sorted(set(hours)):
+        if runs and runs[-1][1] == hour:
+            runs[-1][1] = hour + ONE_HOUR
+        else:
+            runs.append([hour, hour + ONE_HOUR])
+    return runs
+
+def aggregate_hours(events):
+    """
+    events: Event queryset
+    return: list of unsaved SensorHourlyRollup, one per (sensor, hour)
+            with at least one non-deleted event
+    """
+    rows = events.filter(deleted=False).annotate(
+               hour=TruncHour('timestamp', tzinfo=utc)).order_by().values(
+               'sensor_id', 'hour').annotate(**_get_aggregates())
+    rollups = []
+    for row in rows:
+        row['hour'] = hour_floor(row['hour'])
+        for name in MEASUREMENTS:
+            if row['{}_sum'.format(name)] is None:
+                row['{}_sum'.format(name)] = 0
+        rollups.append(SensorHourlyRollup(**row))
+    return rollups
+
+def refresh_rollups(keys):
+    """
+    keys: iterable of (sensor_id, timestamp) for events created, changed
+          or deleted since their buckets were last computed
+    return: number of buckets recomputed
+
+    Every touched bucket is recomputed from its events with one range
+    scan of the (sensor, timestamp) index per sensor, so the cost follows
+    the batch rather than the table, and updated or deleted readings,
+    which a running sum/min/max cannot take back, stay exact. Callers
+    should hold the transaction that wrote the events.
+    """
+    hours = {}
+    for sensor_id, timestamp in keys:
+        hours.setdefault(sensor_id, set()).add(hour_floor(timestamp))
+    refreshed = 0
+    for sensor_id, buckets in hours.items():
+        runs = _get_runs(buckets)
+        for idx in range(0, len(runs), ROLLUP_RUNS_PER_QUERY):
+            chunk = runs[idx:idx + ROLLUP_RUNS_PER_QUERY]
+            spans = reduce(or_, [Q(timestamp__gte=start, timestamp__lt=end)
+                                 for start, end in chunk])
+            stored = reduce(or_, [Q(hour__gte=start, hour__lt=end)
+                                  for start, end in chunk])
+            rollups = aggregate_hours(Event.objects.filter(spans,
+                                                           sensor_id=sensor_id))
+            SensorHourlyRollup.objects.filter(stored,
+                                              sensor_id=sensor_id).delete()
+            SensorHourlyRollup.objects.bulk_create(rollups)
+        refreshed += len(buckets)
+    return refreshed
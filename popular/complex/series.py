@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, unicode_literals
+
+import numpy as np
+from django.conf import settings
+
+from complex.models import Event, SensorHourlyRollup
+from complex.rollups import hour_floor
+from complex.utils import EPOCH
+
+class SeriesTooLarge(Exception):
+    pass
+
+def load_series(sensor, measurement, start=None, end=None, max_rows=None):
+    """
+    sensor: Sensor or pk
+    measurement: str, one of complex.utils.MEASUREMENTS
+    start: aware datetime, inclusive lower bound or None
+    end: aware datetime, exclusive upper bound or None
+    max_rows: int, most readings loaded, default
+              settings.EVENT_SERIES_MAX_ROWS
+    return: (x, y) float64 arrays of epoch seconds and readings for the
+            sensor's non-deleted events in timestamp order
+    raise: SeriesTooLarge with the row count when it exceeds max_rows, a
+           window that size is read from load_hourly_series() instead
+
+    The range is counted first and both arrays are allocated at that
+    size, then filled from a flat cursor, so memory is 16 bytes per
+    reading and never more than max_rows of them.
+    """
+    max_rows = max_rows or settings.EVENT_SERIES_MAX_ROWS
+    queryset = Event.objects.sensor_range(sensor, start, end).filter(
+                   deleted=False)
+    count = queryset.count()
+    if count > max_rows:
+        raise SeriesTooLarge(count)
+    x = np.empty(count, dtype=np.float64)
+    y = np.empty(count, dtype=np.float64)
+    n = 0
+    rows = queryset.values_list('timestamp', measurement)[:count]
+    for n, (timestamp, value) in enumerate(rows.iterator(), 1):
+        x[n - 1] = (timestamp - EPOCH).total_seconds()
+        y[n - 1] = value
+    return (x[:n], y[:n])
+
+def load_hourly_series(sensor, measurement, start=None, end=None,
+                       extremes=False):
+    """
+    sensor: Sensor or pk
+    measurement: str, one of complex.utils.MEASUREMENTS
+    start: aware datetime, the hour holding it is the first read, or None
+    end: aware datetime, exclusive upper bound or None
+    extremes: bool, each hour gives its min and max instead of its mean
+    return: (x, y) float64 arrays of epoch seconds at the middle of each
+            hour and the hour's mean, or min then max, in hour order
+
+    Reads the sensor's SensorHourlyRollup rows, one per hour with
+    readings, so a window too large to load raw costs 720 rows a month
+    however often the sensor reports. Hours are whole, so readings of
+    the first hour before start are included.
+    """
+    if start is not None:
+        start = hour_floor(start)
+    rows = SensorHourlyRollup.objects.sensor_range(sensor, start, end).filter(
+               count__gt=0).values_list('hour', 'count',
+                                        '{}_sum'.format(measurement),
+                                        '{}_min'.format(measurement),
+                                        '{}_max'.format(measurement))
+    width = 2 if extremes else 1
+    count = rows.count()
+    x = np.empty(count * width, dtype=np.float64)
+    y = np.empty(count * width, dtype=np.float64)
+    n = 0
+    for hour, readings, total, low, high in rows[:count].iterator():
+        x[n:n + width] = (hour - EPOCH).total_seconds() + 1800
+        if extremes:
+            y[n:n + 2] = (low, high)
+        else:
+            y[n] = float(total) / readings
+        n += width
+    return (x[:n], y[:n])
+
+def lttb(x, y, threshold):
+    """
+    x: float64 array, ascending
+    y: float64 array, same length as x
+    threshold: int, number of points to keep, at least 3
+    return: int array of the kept indices, first and last always included
+
+    Largest-triangle-three-buckets: the interior is cut into threshold - 2
+    buckets and each keeps the point spanning the largest triangle with
+    the previous pick and the mean of the next bucket. Bucket bounds and
+    means come from one cumulative sum, and each bucket's triangle areas
+    are computed as one array operation.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    bounds = (np.arange(threshold - 1) * every).astype(np.int64) + 1
+    bounds[-1] = n - 1
+    # mean of bucket i + 1 for every bucket i, the last one uses the
+    # final point
+    csx = np.concatenate(([0.0], np.cumsum(x)))
+    csy = np.concatenate(([0.0], np.cumsum(y)))
+    lo = np.append(bounds[1:-1], n - 1)
+    hi = np.append(bounds[2:], n)
+    width = hi - lo
+    avg_x = (csx[hi] - csx[lo]) / width
+    avg_y = (csy[hi] - csy[lo]) / width
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        rs, re = bounds[i], bounds[i + 1]
+        area = np.abs((x[a] - avg_x[i]) * (y[rs:re] - y[a]) -
+                      (x[a] - x[rs:re]) * (avg_y[i] - y[a]))
+        a = rs + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+def minmax(x, y, threshold):
+    """
+    x: float64 array, ascending
+    y: float64 array, same length as x
+    threshold: int, number of points to keep, at least 2
+    return: int array of the kept indices in time order
+
+    Cuts the series into threshold // 2 equal count buckets and keeps the
+    lowest and highest reading of each, so spikes are never averaged away.
+    """
+    n = len(x)
+    buckets = threshold // 2
+    if threshold >= n or buckets < 1:
+        return np.arange(n)
+    bucket = (np.arange(n) * buckets) // n
+    order = np.lexsort((y, bucket))
+    ordered = bucket[order]
+    starts = np.flatnonzero(np.concatenate(([True],
+                                            ordered[1:] != ordered[:-1])))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate((order[starts], order[ends])))
+
+DOWNSAMPLERS = {'lttb': lttb, 'minmax': minmax}
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, unicode_literals
+
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from complex.models import Event
+from complex.utils import MEASUREMENTS
+
+STATS_GROUPS = {'sensor': 'sensor_id', 'location': 'location'}
+STATS_PERCENTILES = (5, 25, 50, 75, 95, 99)
+
+def iter_columns(queryset, group_by, measurements, chunk_size=None):
+    """
+    queryset: Event queryset to read
+    group_by: str, key of STATS_GROUPS
+    measurements: list of Event measurement field names
+    chunk_size: int, rows per query, default settings.EVENT_STATS_CHUNK_ROWS
+    return: generator of (keys, values) per chunk where keys is an int64
+            array of group keys and values a float64 array with one
+            column per measurement
+
+    Rows are read in id order one chunk at a time and each chunk becomes
+    a float64 block straight away; nothing is kept between chunks.
+    """
+    chunk_size = chunk_size or settings.EVENT_STATS_CHUNK_ROWS
+    columns = ['id', STATS_GROUPS[group_by]] + list(measurements)
+    queryset = queryset.order_by('id').values_list(*columns)
+    last = None
+    while True:
+        chunk = queryset if last is None else queryset.filter(id__gt=last)
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            return
+        data = np.array(rows, dtype=np.float64)
+        last = rows[-1][0]
+        yield (data[:, 1].astype(np.int64), data[:, 2:])
+        if len(rows) < chunk_size:
+            return
+
+def merge_moments(moments, keys, values):
+    """
+    moments: dict of group key -> [count, mean, m2, min, max], the last
+             four float64 arrays with one entry per measurement; updated
+             in place
+    keys: int64 array of group keys
+    values: float64 array with one column per measurement
+
+    The chunk's per-group count, mean, sum of squared deviations, min and
+    max come from reduceat over the groups and are merged into the
+    running ones with Chan's parallel update:
+        delta = mean_b - mean_a
+        mean = mean_a + delta * n_b / n
+        m2 = m2_a + m2_b + delta ** 2 * n_a * n_b / n
+    so memory stays one row per group however many chunks are read.
+    """
+    if not len(keys):
+        return
+    order = np.argsort(keys, kind='mergesort')
+    values = values[order]
+    groups, starts, counts = np.unique(keys[order],
+                                       return_index=True,
+                                       return_counts=True)
+    mean = np.add.reduceat(values, starts) / counts[:, np.newaxis]
+    deviation = values - np.repeat(mean, counts, axis=0)
+    m2 = np.add.reduceat(deviation * deviation, starts)
+    low = np.minimum.reduceat(values, starts)
+    high = np.maximum.reduceat(values, starts)
+    for idx, key in enumerate(groups.tolist()):
+        n_b = counts[idx]
+        if key not in moments:
+            moments[key] = [n_b, mean[idx], m2[idx], low[idx], high[idx]]
+            continue
+        n_a, mean_a, m2_a, low_a, high_a = moments[key]
+        n = n_a + n_b
+        delta = mean[idx] - mean_a
+        moments[key] = [n,
+                        mean_a + delta * n_b / n,
+                        m2_a + m2[idx] + delta * delta * n_a * n_b / n,
+                        np.minimum(low_a, low[idx]),
+                        np.maximum(high_a, high[idx])]
+
+def merge_sample(sample, keys, values, size, random):
+    """
+    sample: (keys, priorities, values) arrays kept so far
+    keys: int64 array of the chunk's group keys
+    values: float64 array, the chunk's readings
+    size: int, readings kept per group
+    random: numpy.random.RandomState
+    return: the new (keys, priorities, values)
+
+    Every reading draws a uniform priority and each group keeps the size
+    lowest, which is a uniform sample without replacement of everything
+    read so far, and all of it while a group has at most size readings.
+    """
+    keys = np.concatenate((sample[0], keys))
+    priorities = np.concatenate((sample[1], random.random_sample(len(values))))
+    values = np.concatenate((sample[2], values))
+    order = np.lexsort((priorities, keys))
+    groups, starts, counts = np.unique(keys[order],
+                                       return_index=True,
+                                       return_counts=True)
+    rank = np.arange(len(order)) - np.repeat(starts, counts)
+    kept = order[rank < size]
+    return (keys[kept], priorities[kept], values[kept])
+
+def grouped_stats(keys, values, percentiles=STATS_PERCENTILES):
+    """
+    keys: int64 array of group keys
+    values: float64 array, one reading per key
+    percentiles: sequence of numbers in [0, 100]
+    return: OrderedDict of key -> dict with count, mean, std, min, max
+            and one 'p<n>' entry per percentile
+
+    One lexsort orders the readings by (key, value); counts, means and
+    population standard deviations then come from reduceat over the group
+    boundaries and percentiles are interpolated at computed offsets, the
+    same linear rule as numpy.percentile, for every group at once.
+    """
+    result = OrderedDict()
+    if not len(keys):
+        return result
+    order = np.lexsort((values, keys))
+    ordered = values[order]
+    groups, starts, counts = np.unique(keys[order],
+                                       return_index=True,
+                                       return_counts=True)
+    mean = np.add.reduceat(ordered, starts) / counts
+    deviation = ordered - np.repeat(mean, counts)
+    std = np.sqrt(np.add.reduceat(deviation * deviation, starts) / counts)
+    columns = OrderedDict([('count', counts),
+                           ('mean', mean),
+                           ('std', std),
+                           ('min', ordered[starts]),
+                           ('max', ordered[starts + counts - 1])])
+    for percentile in percentiles:
+        rank = (counts - 1) * (percentile / 100)
+        lo = np.floor(rank).astype(np.int64)
+        hi = np.ceil(rank).astype(np.int64)
+        lower = ordered[starts + lo]
+        upper = ordered[starts + hi]
+        columns['p{}'.format(percentile)] = lower + (upper - lower) * (rank - lo)
+    for idx, key in enumerate(groups.tolist()):
+        result[key] = dict((name, column[idx].item())
+                           for name, column in columns.items())
+    return result
+
+def event_stats(queryset=None, group_by='sensor', measurements=None,
+                percentiles=STATS_PERCENTILES, chunk_size=None,
+                sample_size=None):
+    """
+    queryset: Event queryset, default every non-deleted event
+    group_by: 'sensor' or 'location'
+    measurements: list of field names, default MEASUREMENTS
+    percentiles: sequence of numbers in [0, 100]
+    chunk_size: int, rows per query
+    sample_size: int, readings per group kept for percentiles, default
+                 settings.EVENT_STATS_SAMPLE_ROWS
+    return: OrderedDict of group key -> {measurement: grouped_stats dict}
+
+    Memory is bounded by one chunk plus sample_size readings per group:
+    count, mean, std, min and max are exact and merged chunk by chunk,
+    percentiles are exact for groups of up to sample_size readings and
+    interpolated from a uniform sample of that many above it.
+    """
+    if queryset is None:
+        queryset = Event.objects.filter(deleted=False)
+    measurements = list(measurements or MEASUREMENTS)
+    sample_size = sample_size or settings.EVENT_STATS_SAMPLE_ROWS
+    random = np.random.RandomState()
+    moments = {}
+    sample = (np.empty(0, dtype=np.int64),
+              np.empty(0, dtype=np.float64),
+              np.empty((0, len(measurements)), dtype=np.float64))
+    for keys, values in iter_columns(queryset, group_by, measurements,
+                                     chunk_size):
+        merge_moments(moments, keys, values)
+        sample = merge_sample(sample, keys, values, sample_size, random)
+    result = OrderedDict()
+    for idx, measurement in enumerate(measurements):
+        for key, stats in grouped_stats(sample[0], sample[2][:, idx],
+                                        percentiles).items():
+            count, mean, m2, low, high = moments[key]
+            stats.update({'count': int(count),
+                          'mean': mean[idx].item(),
+                          'std': np.sqrt(m2[idx] / count).item(),
+                          'min': low[idx].item(),
+                          'max': high[idx].item()})
+            result.setdefault(key, OrderedDict())[measurement] = stats
+    return result
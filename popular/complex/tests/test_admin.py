@@ -99,7 +99,7 @@ class TestEventAdmin(TestCase):
         ma = ModelAdmin(Event, self.site)
         base_fields = ['sensor', 'timestamp', 'location', 'status', 'camera',
                        'avg_temp', 'avg_pressure', 'pct_humidity', 'altitude',
-                       'windspeed', 'deleted', 'link', 'ulink', 'dlink']
+                       'windspeed', 'deleted']
         self.assertListEqual(base_fields,
                              list(ma.get_form(self.request).base_fields))
 
@@ -114,7 +114,7 @@ class TestEventAdmin(TestCase):
         ma = ModelAdmin(Event, self.site)
         fields = ['sensor', 'timestamp', 'location', 'status', 'camera',
                   'avg_temp', 'avg_pressure', 'pct_humidity', 'altitude',
-                  'windspeed', 'deleted', 'link', 'ulink', 'dlink']
+                  'windspeed', 'deleted']
         self.assertListEqual(fields,
                              list(ma.get_fields(self.request)))
 
@@ -188,7 +188,7 @@ class TestSensorAdmin(TestCase):
         ma = ModelAdmin(Sensor, self.site)
         base_fields = ['created_by', 'name', 'sku', 'serial_no', 'temp_units',
                        'pressure_units', 'alt_units', 'ws_units', 'climate',
-                       'camera', 'link', 'ulink', 'dlink']
+                       'camera']
         self.assertListEqual(base_fields,
                              list(ma.get_form(self.request).base_fields))
 
@@ -203,7 +203,7 @@ class TestSensorAdmin(TestCase):
         ma = ModelAdmin(Sensor, self.site)
         fields = ['created_by', 'name', 'sku', 'serial_no', 'temp_units',
                   'pressure_units', 'alt_units', 'ws_units', 'climate',
-                  'camera', 'link', 'ulink', 'dlink']
+                  'camera']
         self.assertListEqual(fields,
                              list(ma.get_fields(self.request)))
 
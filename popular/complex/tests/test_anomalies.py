@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+from random import Random
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.timezone import utc
+
+from complex.anomalies import detect_anomalies, observe
+from complex.ingest import save_events
+from complex.models import Event, Sensor, SensorAnomaly, SensorBaseline
+from complex.views import EventCreateView
+
+START = datetime(2017, 11, 1, tzinfo=utc)
+
+@override_settings(EVENT_ANOMALY_ZSCORE=4.0, EVENT_ANOMALY_MIN_COUNT=30,
+                   EVENT_ANOMALY_WINDOW=1000)
+class TestAnomalyDetection(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+        self.random = Random(7)
+
+    def tearDown(self):
+        self.user = None
+        self.sensor = None
+        self.random = None
+
+    def _get_events(self, start, count, **kwargs):
+        events = []
+        for i in range(start, start + count):
+            values = {'avg_temp': Decimal('{:.2f}'.format(
+                                      20 + self.random.gauss(0, 0.5))),
+                      'windspeed': 50 + self.random.randint(-5, 5)}
+            values.update(kwargs)
+            events.append(Event(sensor=self.sensor,
+                                timestamp=START + timedelta(minutes=i),
+                                **values))
+        return events
+
+    def test_01_observe_matches_numpy(self):
+        baseline = SensorBaseline(sensor=self.sensor)
+        events = self._get_events(0, 200)
+        for event in events:
+            observe(baseline, event)
+        temps = np.array([float(e.avg_temp) for e in events])
+        self.assertEqual(200, baseline.count)
+        self.assertAlmostEqual(temps.mean(), baseline.avg_temp_mean)
+        self.assertAlmostEqual(temps.var(), baseline.avg_temp_var)
+
+    def test_02_window_forgets(self):
+        baseline = SensorBaseline(sensor=self.sensor)
+        for event in self._get_events(0, 100, windspeed=10):
+            observe(baseline, event, window=20)
+        for event in self._get_events(100, 100, windspeed=90):
+            observe(baseline, event, window=20)
+        self.assertTrue(89 < baseline.windspeed_mean <= 90)
+
+    def test_03_spike_is_flagged_on_ingest(self):
+        save_events(self._get_events(0, 100))
+        self.assertFalse(SensorAnomaly.objects.filter(sensor=self.sensor).exists())
+        save_events(self._get_events(100, 1, windspeed=400))
+        anomaly = SensorAnomaly.objects.get(sensor=self.sensor)
+        self.assertEqual('windspeed', anomaly.measurement)
+        self.assertEqual(400, anomaly.value)
+        self.assertTrue(anomaly.zscore > 4)
+        self.assertEqual(START + timedelta(minutes=100), anomaly.timestamp)
+
+    def test_04_warm_up(self):
+        save_events(self._get_events(0, 10) + self._get_events(10, 1, windspeed=400))
+        self.assertFalse(SensorAnomaly.objects.exists())
+
+    def test_05_replays_are_ignored(self):
+        events = self._get_events(0, 50)
+        save_events(events)
+        baseline = SensorBaseline.objects.get(sensor=self.sensor)
+        with self.assertNumQueries(1):
+            detect_anomalies(self._get_events(0, 50, windspeed=999))
+        self.assertEqual(baseline.count,
+                         SensorBaseline.objects.get(sensor=self.sensor).count)
+        self.assertFalse(SensorAnomaly.objects.exists())
+
+    def test_06_cost_does_not_grow(self):
+        save_events(self._get_events(0, 500))
+        # one baseline read and one write, whatever the history length
+        with self.assertNumQueries(2):
+            detect_anomalies(self._get_events(500, 5))
+
+    def test_07_create_view_scores_reading(self):
+        save_events(self._get_events(0, 100))
+        count = SensorBaseline.objects.get(sensor=self.sensor).count
+        data = {'sensor': self.sensor.pk,
+                'timestamp': (START + timedelta(minutes=100)).strftime(
+                                 '%Y-%m-%d %H:%M:%S'),
+                'location': Event.COCKPIT,
+                'status': Event.ONLINE,
+                'camera': Event.NA,
+                'avg_temp': '20.00',
+                'avg_pressure': '0.00',
+                'pct_humidity': 0,
+                'altitude': 0,
+                'windspeed': 400}
+        request = RequestFactory().post(reverse('complex:event-create'), data)
+        request.user = self.user
+        response = EventCreateView.as_view()(request)
+        self.assertEqual(302, response.status_code)
+        self.assertEqual(count + 1,
+                         SensorBaseline.objects.get(sensor=self.sensor).count)
+        anomaly = SensorAnomaly.objects.get(sensor=self.sensor)
+        self.assertEqual('windspeed', anomaly.measurement)
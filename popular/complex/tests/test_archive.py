@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from os.path import exists, join
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.utils.six import StringIO
+from django.utils.timezone import utc
+
+from complex.archive import archive_events, archive_path, read_archive
+from complex.archive import read_manifest, restore_events
+from complex.faults import fault_buckets, fault_cache_prefix
+from complex.ingest import save_events
+from complex.models import Event, Sensor, SensorHourlyRollup
+
+START = datetime(2017, 11, 1, 22, tzinfo=utc)
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+class TestEventArchive(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+        self.dest = mkdtemp()
+        # 12 readings every 20 minutes, spanning 1 and 2 November
+        save_events([Event(sensor=self.sensor,
+                           timestamp=START + timedelta(minutes=20 * i),
+                           avg_temp=Decimal('20.05'),
+                           windspeed=i)
+                     for i in range(12)])
+        self.cutoff = START + timedelta(hours=3)
+
+    def tearDown(self):
+        rmtree(self.dest)
+        self.user = None
+        self.sensor = None
+
+    def _events(self):
+        return Event.objects.filter(sensor=self.sensor, timestamp__gte=START)
+
+    def test_01_archive_in_chunks(self):
+        rollups = SensorHourlyRollup.objects.filter(sensor=self.sensor).count()
+        older = Event.objects.filter(sensor=self.sensor,
+                                     timestamp__lt=self.cutoff).count()
+        count = archive_events(self.cutoff, self.dest, chunk_size=5,
+                               sensor_ids=[self.sensor.pk])
+        self.assertEqual(older, count)
+        self.assertEqual(3, self._events().count())
+        self.assertFalse(Event.objects.filter(sensor=self.sensor,
+                                              timestamp__lt=self.cutoff).exists())
+        manifest = read_manifest(self.dest)
+        first = archive_path(self.sensor.pk, date(2017, 11, 1))
+        second = archive_path(self.sensor.pk, date(2017, 11, 2))
+        self.assertEqual(6, manifest['files'][first]['rows'])
+        self.assertEqual(3, manifest['files'][second]['rows'])
+        rows = list(read_archive(self.dest, first))
+        self.assertEqual(6, len(rows))
+        self.assertEqual('20.05', rows[0]['avg_temp'])
+        self.assertEqual(rollups,
+                         SensorHourlyRollup.objects.filter(sensor=self.sensor).count())
+
+    def test_02_restore_range(self):
+        archive_events(self.cutoff, self.dest, sensor_ids=[self.sensor.pk])
+        counts = restore_events(self.dest, date(2017, 11, 1), date(2017, 11, 2))
+        self.assertEqual(6, counts['created'])
+        self.assertEqual(9, self._events().count())
+        restored = self._events().order_by('timestamp')[0]
+        self.assertEqual(Decimal('20.05'), restored.avg_temp)
+        self.assertEqual(0, restored.windspeed)
+        counts = restore_events(self.dest, date(2017, 11, 1), date(2017, 11, 3))
+        self.assertEqual(3, counts['created'])
+        self.assertEqual(6, counts['unchanged'])
+
+    def test_03_rearchive_after_restore(self):
+        archive_events(self.cutoff, self.dest, sensor_ids=[self.sensor.pk])
+        restore_events(self.dest, date(2017, 11, 1), date(2017, 11, 3))
+        self.assertEqual(9, archive_events(self.cutoff, self.dest,
+                                           sensor_ids=[self.sensor.pk]))
+        name = archive_path(self.sensor.pk, date(2017, 11, 1))
+        self.assertEqual(6, len(list(read_archive(self.dest, name))))
+        self.assertEqual(6, read_manifest(self.dest)['files'][name]['rows'])
+
+    def test_04_commands(self):
+        out = StringIO()
+        total = Event.objects.count()
+        call_command('archive_events', older_than=1, dest=self.dest, stdout=out)
+        self.assertIn('archived {} events'.format(total), out.getvalue())
+        self.assertEqual(0, Event.objects.count())
+        self.assertTrue(exists(join(self.dest, 'manifest.json')))
+        call_command('restore_events', '2017-11-02', dest=self.dest,
+                     sensor=[self.sensor.pk], stdout=out)
+        self.assertIn('restored 6 events', out.getvalue())
+        self.assertEqual(6, Event.objects.count())
+
+    def test_05_command_arguments(self):
+        with self.assertRaises(CommandError):
+            call_command('archive_events', older_than=0, dest=self.dest)
+        with self.assertRaises(CommandError):
+            call_command('restore_events', '2017-11-02', '2017-11-01',
+                         dest=self.dest)
+
+    @override_settings(CACHES=LOCMEM)
+    def test_06_archive_drops_cached_fault_buckets(self):
+        cache.clear()
+        Event.objects.filter(sensor=self.sensor,
+                             timestamp=START).update(status=Event.LOW_POWER)
+        queryset = Event.objects.filter(sensor=self.sensor)
+        prefix = fault_cache_prefix(self.user.pk)
+        now = START + timedelta(days=2)
+        args = (queryset, START, START + timedelta(hours=1), 3600, prefix, now)
+        counts = fault_buckets(*args)[0][1]
+        self.assertEqual(1, sum(c['low_power'] for c in counts.values()))
+        archive_events(self.cutoff, self.dest, sensor_ids=[self.sensor.pk])
+        with self.assertNumQueries(1):
+            self.assertEqual({}, fault_buckets(*args)[0][1])
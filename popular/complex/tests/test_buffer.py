@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from json import dumps, loads
+from threading import Event as ThreadEvent
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import IntegrityError, OperationalError
+from django.test import RequestFactory, TestCase
+
+import complex.buffer
+from complex.buffer import BufferFull, EventWriteBuffer
+from complex.ingest import save_events
+from complex.models import Event, Sensor
+from complex.views import EventIngestView
+from complex.tests.utils import get_timestamp
+
+class TestEventWriteBuffer(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+        self.batches = []
+
+    def tearDown(self):
+        self.user = None
+        self.sensor = None
+        self.batches = None
+
+    def _get_events(self, count):
+        return [Event(sensor=self.sensor, timestamp=get_timestamp())
+                for i in range(count)]
+
+    def _record(self, events):
+        self.batches.append(list(events))
+
+    def test_01_flush_writes_one_batch(self):
+        count = Event.objects.count()
+        buffer = EventWriteBuffer(save=save_events)
+        buffer.append(self._get_events(12))
+        self.assertEqual(12, len(buffer))
+        self.assertEqual(count, Event.objects.count())
+        self.assertEqual(12, buffer.flush())
+        self.assertEqual(0, len(buffer))
+        self.assertEqual(count + 12, Event.objects.count())
+        self.assertEqual(0, buffer.flush())
+
+    def test_02_buffer_full(self):
+        buffer = EventWriteBuffer(save=self._record, max_rows=5)
+        buffer.append(self._get_events(4))
+        with self.assertRaises(BufferFull):
+            buffer.append(self._get_events(2))
+        self.assertEqual(4, len(buffer))
+
+    def test_03_failed_batch_isolates_bad_rows(self):
+        events = self._get_events(4)
+        poison = events[2]
+        def save(batch):
+            if poison in batch:
+                raise IntegrityError('constraint failed')
+            self._record(batch)
+        buffer = EventWriteBuffer(save=save, backoff=0)
+        buffer.append(events)
+        self.assertEqual(3, buffer.flush())
+        self.assertEqual(3, buffer.flushed)
+        self.assertEqual(1, buffer.failed)
+        self.assertEqual(3, len(self.batches))
+        self.assertEqual(0, len(buffer))
+
+    def test_04_outage_requeues_batch(self):
+        events = self._get_events(4)
+        outage = [True]
+        def save(batch):
+            if outage[0]:
+                raise OperationalError('server closed the connection')
+            self._record(batch)
+        buffer = EventWriteBuffer(save=save, backoff=0.5)
+        buffer.append(events[:3])
+        self.assertEqual(0, buffer.flush())
+        self.assertEqual(0, buffer.flush())
+        self.assertEqual(1.0, buffer._delay)
+        buffer.append(events[3:])
+        self.assertEqual(4, len(buffer))
+        self.assertEqual(0, buffer.failed)
+        outage[0] = False
+        self.assertEqual(4, buffer.flush())
+        self.assertEqual(events, self.batches[0])
+        self.assertEqual(0, buffer._delay)
+
+    def test_05_outage_while_isolating_rows(self):
+        events = self._get_events(4)
+        def save(batch):
+            if len(batch) > 1:
+                raise IntegrityError('constraint failed')
+            if batch[0] is events[2]:
+                raise OperationalError('server closed the connection')
+            self._record(batch)
+        buffer = EventWriteBuffer(save=save, backoff=0)
+        buffer.append(events)
+        self.assertEqual(2, buffer.flush())
+        self.assertEqual(0, buffer.failed)
+        self.assertEqual(2, len(buffer))
+
+    def test_06_thread_flushes_on_row_threshold(self):
+        done = ThreadEvent()
+        def save(batch):
+            self._record(batch)
+            done.set()
+        buffer = EventWriteBuffer(save=save, flush_interval=60, flush_rows=3)
+        buffer.start()
+        try:
+            buffer.append(self._get_events(3))
+            self.assertTrue(done.wait(5))
+        finally:
+            buffer.stop(timeout=5)
+        self.assertEqual(3, len(self.batches[0]))
+
+    def test_07_thread_flushes_on_interval(self):
+        done = ThreadEvent()
+        def save(batch):
+            self._record(batch)
+            done.set()
+        buffer = EventWriteBuffer(save=save, flush_interval=0.05,
+                                  flush_rows=1000)
+        buffer.start()
+        try:
+            buffer.append(self._get_events(2))
+            self.assertTrue(done.wait(5))
+        finally:
+            buffer.stop(timeout=5)
+        self.assertEqual(2, len(self.batches[0]))
+
+    def test_08_stop_drains(self):
+        buffer = EventWriteBuffer(save=self._record, flush_interval=60,
+                                  flush_rows=1000)
+        buffer.start()
+        buffer.append(self._get_events(5))
+        buffer.stop(timeout=5)
+        self.assertEqual(5, sum(len(batch) for batch in self.batches))
+        self.assertEqual(0, len(buffer))
+
+    def test_09_view_write_behind(self):
+        buffer = EventWriteBuffer(save=save_events)
+        complex.buffer._buffer = buffer
+        try:
+            count = Event.objects.count()
+            row = {'sensor': self.sensor.id,
+                   'timestamp': get_timestamp().isoformat()}
+            request = RequestFactory().post(path=reverse('complex:event-ingest'),
+                                            data=dumps(row),
+                                            content_type='application/x-ndjson')
+            request.user = self.user
+            with self.settings(EVENT_WRITE_BEHIND=True):
+                response = EventIngestView.as_view()(request)
+            self.assertEqual(202, response.status_code)
+            self.assertEqual(1, loads(response.content.decode('utf-8'))['accepted'])
+            self.assertEqual(count, Event.objects.count())
+            buffer.flush()
+            self.assertEqual(count + 1, Event.objects.count())
+        finally:
+            complex.buffer._buffer = None
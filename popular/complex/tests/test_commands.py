@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from io import open
+from json import dumps
+from os.path import exists, join
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from complex.models import Event, Sensor
+from complex.tests.utils import get_avg_temp, get_random_location
+from complex.tests.utils import get_timestamp
+
+class TestImportEvents(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+        self.tmpdir = mkdtemp()
+        self.out = StringIO()
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+        self.user = None
+        self.sensor = None
+        self.out = None
+
+    def _write(self, name, lines):
+        path = join(self.tmpdir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def _get_row(self):
+        return {'sensor': self.sensor.id,
+                'timestamp': get_timestamp().isoformat(),
+                'location': get_random_location(),
+                'avg_temp': get_avg_temp()}
+
+    def test_01_import_csv(self):
+        count = Event.objects.count()
+        lines = ['sensor,timestamp,location,avg_temp,windspeed']
+        for i in range(7):
+            row = self._get_row()
+            lines.append('{sensor},{timestamp},{location},{avg_temp},'.format(**row))
+        lines.append('999,2017-11-01T00:00:00Z,1,1.00,3')
+        path = self._write('events.csv', lines)
+        call_command('import_events', path, chunk_size=3, stdout=self.out)
+        self.assertEqual(count + 7, Event.objects.count())
+        self.assertIn('imported 7 events, rejected 1', self.out.getvalue())
+        self.assertIn('rows/sec', self.out.getvalue())
+        self.assertFalse(exists('{}.checkpoint'.format(path)))
+
+    def test_02_import_ndjson(self):
+        count = Event.objects.count()
+        lines = [dumps(self._get_row()) for i in range(10)]
+        path = self._write('events.ndjson', lines)
+        call_command('import_events', path, chunk_size=4, user='qa',
+                     stdout=self.out)
+        self.assertEqual(count + 10, Event.objects.count())
+
+    def test_03_resume_from_checkpoint(self):
+        count = Event.objects.count()
+        lines = [dumps(self._get_row()) for i in range(10)]
+        path = self._write('events.ndjson', lines)
+        checkpoint = '{}.checkpoint'.format(path)
+        with open(checkpoint, 'w', encoding='utf-8') as f:
+            f.write(dumps({'path': path,
+                           'position': 6,
+                           'accepted': 6,
+                           'rejected': 0}))
+        call_command('import_events', path, chunk_size=3, stdout=self.out)
+        self.assertEqual(count + 4, Event.objects.count())
+        self.assertIn('resuming after row 6', self.out.getvalue())
+        self.assertIn('imported 10 events', self.out.getvalue())
+
+    def test_04_restart_ignores_checkpoint(self):
+        count = Event.objects.count()
+        lines = [dumps(self._get_row()) for i in range(5)]
+        path = self._write('events.ndjson', lines)
+        with open('{}.checkpoint'.format(path), 'w', encoding='utf-8') as f:
+            f.write(dumps({'path': path,
+                           'position': 5,
+                           'accepted': 5,
+                           'rejected': 0}))
+        call_command('import_events', path, restart=True, stdout=self.out)
+        self.assertEqual(count + 5, Event.objects.count())
+
+    def test_05_missing_file(self):
+        with self.assertRaises(CommandError):
+            call_command('import_events', join(self.tmpdir, 'missing.csv'),
+                         stdout=self.out)
+
+    def test_06_unknown_user(self):
+        path = self._write('events.ndjson', [dumps(self._get_row())])
+        with self.assertRaises(CommandError):
+            call_command('import_events', path, user='nobody',
+                         stdout=self.out)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from csv import reader
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, open
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import RequestFactory, TestCase
+from django.utils.six import StringIO
+from django.utils.timezone import utc
+
+from complex.export import EXPORT_FIELDS, NPZ_COLUMNS, iter_event_csv
+from complex.export import iter_values, write_event_npz
+from complex.ingest import save_events
+from complex.models import Event, Sensor
+from complex.views import EventExportView
+
+START = datetime(2017, 11, 1, tzinfo=utc)
+
+class TestEventExport(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.user = None
+        self.sensor = None
+        self.factory = None
+
+    def _get(self, **params):
+        request = self.factory.get(reverse('complex:event-export'), params)
+        request.user = self.user
+        return EventExportView.as_view()(request)
+
+    def _read(self, response):
+        content = b''.join(response.streaming_content).decode('utf-8')
+        return list(reader(StringIO(content)))
+
+    def test_01_iter_values_chunks(self):
+        queryset = Event.objects.all()
+        with self.assertNumQueries(queryset.count() // 3 + 1):
+            rows = list(iter_values(queryset, ['id', 'sensor_id'], chunk_size=3))
+        self.assertEqual(list(queryset.order_by('id').values_list('id', 'sensor_id')),
+                         rows)
+
+    def test_02_stream_is_lazy(self):
+        lines = iter_event_csv(Event.objects.all(), chunk_size=2)
+        with self.assertNumQueries(0):
+            header = next(lines)
+        self.assertEqual(','.join(EXPORT_FIELDS), header.strip())
+        with self.assertNumQueries(1):
+            next(lines)
+
+    def test_03_export_user_events(self):
+        response = self._get()
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('text/csv', response['Content-Type'])
+        self.assertIn('attachment', response['Content-Disposition'])
+        rows = self._read(response)
+        self.assertEqual(EXPORT_FIELDS, rows[0])
+        expected = Event.objects.filter(sensor__created_by=self.user,
+                                        deleted=False).order_by('id')
+        self.assertEqual([str(pk) for pk in expected.values_list('id', flat=True)],
+                         [row[0] for row in rows[1:]])
+
+    def test_04_filters(self):
+        save_events([Event(sensor=self.sensor,
+                           timestamp=START + timedelta(minutes=i),
+                           location=Event.TAIL if i % 2 else Event.NOSE,
+                           status=Event.LOW_POWER)
+                     for i in range(6)])
+        rows = self._read(self._get(sensor=self.sensor.pk,
+                                    location=Event.TAIL,
+                                    status=[Event.LOW_POWER, Event.CAMERA_FAULT],
+                                    start=START.isoformat(),
+                                    end=(START + timedelta(minutes=5)).isoformat()))
+        self.assertEqual(2, len(rows) - 1)
+        for row in rows[1:]:
+            self.assertEqual(str(Event.TAIL), row[3])
+
+    def test_05_foreign_sensor_rejected(self):
+        other = Sensor.objects.create(created_by=User.objects.get(username='add'),
+                                      name='Foreign',
+                                      sku='111-11111-111',
+                                      serial_no='FOREIGN04')
+        response = self._get(sensor=other.pk)
+        self.assertEqual(400, response.status_code)
+
+    def test_06_round_trip(self):
+        save_events([Event(sensor=self.sensor,
+                           timestamp=START + timedelta(minutes=i),
+                           windspeed=i)
+                     for i in range(4)])
+        response = self._get(sensor=self.sensor.pk, start=START.isoformat())
+        content = b''.join(response.streaming_content).decode('utf-8')
+        Event.objects.filter(sensor=self.sensor, timestamp__gte=START).delete()
+        tmpdir = mkdtemp()
+        try:
+            path = join(tmpdir, 'events.csv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            call_command('import_events', path, stdout=StringIO())
+        finally:
+            rmtree(tmpdir)
+        self.assertEqual([0, 1, 2, 3],
+                         list(Event.objects.filter(sensor=self.sensor,
+                                                   timestamp__gte=START)
+                                           .order_by('timestamp')
+                                           .values_list('windspeed', flat=True)))
+
+class TestEventNpzExport(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+        self.tmpdir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tmpdir)
+        self.user = None
+        self.sensor = None
+
+    def test_01_typed_columns(self):
+        save_events([Event(sensor=self.sensor,
+                           timestamp=START + timedelta(seconds=i,
+                                                       microseconds=7),
+                           location=Event.TAIL,
+                           avg_temp=Decimal('21.25'),
+                           altitude=30000 + i)
+                     for i in range(5)])
+        queryset = Event.objects.filter(sensor=self.sensor,
+                                        timestamp__gte=START)
+        path = join(self.tmpdir, 'events.npz')
+        with open(path, 'wb') as f:
+            self.assertEqual(5, write_event_npz(queryset, f, chunk_size=2))
+        data = np.load(path)
+        self.assertEqual(sorted(name for name, field, dtype in NPZ_COLUMNS),
+                         sorted(data.files))
+        self.assertEqual(np.int64, data['timestamp'].dtype)
+        self.assertEqual(np.int16, data['location'].dtype)
+        self.assertEqual(np.float32, data['avg_temp'].dtype)
+        self.assertEqual(1509494400000007000, data['timestamp'][0])
+        self.assertEqual([1000000000] * 4, np.diff(data['timestamp']).tolist())
+        self.assertEqual([30000, 30001, 30002, 30003, 30004],
+                         data['altitude'].tolist())
+        self.assertEqual([Event.TAIL] * 5, data['location'].tolist())
+        self.assertAlmostEqual(21.25, float(data['avg_temp'][0]), places=4)
+        self.assertEqual(list(queryset.order_by('id').values_list('id', flat=True)),
+                         data['id'].tolist())
+
+    def test_02_empty(self):
+        path = join(self.tmpdir, 'empty.npz')
+        with open(path, 'wb') as f:
+            self.assertEqual(0, write_event_npz(Event.objects.none(), f))
+        self.assertEqual((0,), np.load(path)['windspeed'].shape)
+
+    def test_03_view(self):
+        request = RequestFactory().get(reverse('complex:event-export'),
+                                       {'format': 'npz'})
+        request.user = self.user
+        response = EventExportView.as_view()(request)
+        self.assertEqual(200, response.status_code)
+        self.assertIn('events.npz', response['Content-Disposition'])
+        data = np.load(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(Event.objects.filter(sensor__created_by=self.user,
+                                              deleted=False).count(),
+                         len(data['id']))
+
+    def test_04_command(self):
+        path = join(self.tmpdir, 'events.npz')
+        out = StringIO()
+        call_command('export_events', path, sensor=[self.sensor.pk], stdout=out)
+        count = Event.objects.filter(sensor=self.sensor, deleted=False).count()
+        self.assertEqual(count, len(np.load(path)['id']))
+        self.assertIn('exported {} events'.format(count), out.getvalue())
+        path = join(self.tmpdir, 'events.csv')
+        call_command('export_events', path, sensor=[self.sensor.pk],
+                     chunk_size=2, stdout=out)
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(count + 1, len(f.read().splitlines()))
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+from json import loads
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import utc
+
+from complex.faults import bucket_floor, count_faults, fault_buckets
+from complex.faults import fault_cache_prefix
+from complex.ingest import save_events
+from complex.models import Event, Sensor
+from complex.views import FaultDashboardView
+
+START = datetime(2017, 11, 1, tzinfo=utc)
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+class TestFaultDashboard(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+        save_events([self._get_event(1, status=Event.CLIMATE_FAULT),
+                     self._get_event(2, status=Event.CLIMATE_FAULT,
+                                     camera=Event.GLARE),
+                     self._get_event(3, status=Event.ONLINE),
+                     self._get_event(7, status=Event.LOW_POWER,
+                                     location=Event.TAIL),
+                     self._get_event(64, camera=Event.LENS)])
+
+    def tearDown(self):
+        self.user = None
+        self.sensor = None
+
+    def _get_event(self, minutes, **kwargs):
+        return Event(sensor=self.sensor,
+                     timestamp=START + timedelta(minutes=minutes),
+                     **kwargs)
+
+    def _queryset(self):
+        return Event.objects.filter(sensor=self.sensor)
+
+    def test_01_bucket_floor(self):
+        value = START + timedelta(minutes=14, seconds=59)
+        self.assertEqual(START + timedelta(minutes=10), bucket_floor(value, 300))
+        self.assertEqual(START, bucket_floor(value, 3600))
+        self.assertEqual(START, bucket_floor(value, 86400))
+
+    def test_02_count_faults_five_minutes(self):
+        buckets = count_faults(self._queryset(), START,
+                               START + timedelta(hours=2), 300)
+        self.assertEqual([START, START + timedelta(minutes=5),
+                          START + timedelta(minutes=60)], sorted(buckets))
+        cockpit = buckets[START][Event.COCKPIT]
+        self.assertEqual(2, cockpit['climate_fault'])
+        self.assertEqual(1, cockpit['glare'])
+        self.assertEqual(0, cockpit['low_power'])
+        tail = buckets[START + timedelta(minutes=5)][Event.TAIL]
+        self.assertEqual(1, tail['low_power'])
+        self.assertEqual(1, buckets[START + timedelta(minutes=60)]
+                                   [Event.COCKPIT]['lens'])
+
+    def test_03_count_faults_hour(self):
+        buckets = count_faults(self._queryset(), START,
+                               START + timedelta(hours=2), 3600)
+        self.assertEqual(2, buckets[START][Event.COCKPIT]['climate_fault'])
+        self.assertEqual(1, buckets[START][Event.TAIL]['low_power'])
+
+    @override_settings(CACHES=LOCMEM)
+    def test_04_closed_buckets_are_cached(self):
+        cache.clear()
+        prefix = fault_cache_prefix(self.user.pk)
+        now = START + timedelta(minutes=90)
+        end = START + timedelta(hours=2)
+        first = fault_buckets(self._queryset(), START, end, 3600, prefix, now)
+        self.assertEqual(2, len(first))
+        with self.assertNumQueries(1):
+            second = fault_buckets(self._queryset(), START, end, 3600,
+                                   prefix, now)
+        self.assertEqual(first, second)
+        with self.assertNumQueries(0):
+            fault_buckets(self._queryset(), START, START + timedelta(hours=1),
+                          3600, prefix, now)
+
+    @override_settings(CACHES=LOCMEM)
+    def test_05_late_events_invalidate_closed_buckets(self):
+        cache.clear()
+        prefix = fault_cache_prefix(self.user.pk)
+        now = START + timedelta(days=2)
+        end = START + timedelta(hours=2)
+        fault_buckets(self._queryset(), START, end, 3600, prefix, now)
+        save_events([self._get_event(10, status=Event.CAMERA_FAULT)])
+        with self.assertNumQueries(1):
+            buckets = fault_buckets(self._queryset(), START, end, 3600,
+                                    prefix, now)
+        self.assertEqual(1, buckets[0][1][Event.COCKPIT]['camera_fault'])
+        with self.assertNumQueries(0):
+            fault_buckets(self._queryset(), START, end, 3600, prefix, now)
+
+    @override_settings(CACHES=LOCMEM, EVENT_FAULT_GRACE=3600)
+    def test_06_grace_keeps_recent_buckets_open(self):
+        cache.clear()
+        now = START + timedelta(minutes=90)
+        end = START + timedelta(hours=1)
+        fault_buckets(self._queryset(), START, end, 3600, 'test', now)
+        with self.assertNumQueries(1):
+            fault_buckets(self._queryset(), START, end, 3600, 'test', now)
+
+    def test_07_view(self):
+        request = RequestFactory().get(reverse('complex:fault-dashboard'),
+                                       {'bucket': '1d',
+                                        'start': START.isoformat(),
+                                        'end': (START + timedelta(days=2)).isoformat()})
+        request.user = self.user
+        response = FaultDashboardView.as_view()(request)
+        self.assertEqual(200, response.status_code)
+        content = loads(response.content.decode('utf-8'))
+        self.assertEqual(2, len(content['buckets']))
+        counts = content['buckets'][0]['counts']
+        self.assertEqual(2, counts[str(Event.COCKPIT)]['climate_fault'])
+        self.assertEqual('Tail', content['locations'][str(Event.TAIL)])
+
+    def test_08_view_too_many_buckets(self):
+        request = RequestFactory().get(reverse('complex:fault-dashboard'),
+                                       {'bucket': '5m',
+                                        'start': START.isoformat(),
+                                        'end': (START + timedelta(days=30)).isoformat()})
+        request.user = self.user
+        response = FaultDashboardView.as_view()(request)
+        self.assertEqual(400, response.status_code)
+
+    @override_settings(CACHES=LOCMEM)
+    def test_09_only_missing_runs_are_counted(self):
+        cache.clear()
+        prefix = fault_cache_prefix(self.user.pk)
+        now = START + timedelta(days=2)
+        end = START + timedelta(hours=4)
+        fault_buckets(self._queryset(), START, end, 3600, prefix, now)
+        save_events([self._get_event(10, status=Event.CAMERA_FAULT),
+                     self._get_event(190, status=Event.CAMERA_FAULT)])
+        with CaptureQueriesContext(connection) as queries:
+            buckets = fault_buckets(self._queryset(), START, end, 3600,
+                                    prefix, now)
+        self.assertEqual(1, len(queries))
+        self.assertEqual(2, queries[0]['sql'].count(
+                                '"complex_event"."timestamp" >= '))
+        self.assertEqual(1, buckets[0][1][Event.COCKPIT]['camera_fault'])
+        self.assertEqual(1, buckets[1][1][Event.COCKPIT]['lens'])
+        self.assertEqual(1, buckets[3][1][Event.COCKPIT]['camera_fault'])
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from json import loads
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import RequestFactory, TestCase
+from django.utils.timezone import timedelta
+
+import complex.feed
+from complex.feed import EventFeed, iter_event_stream
+from complex.ingest import save_events
+from complex.models import Event, Sensor
+from complex.views import EventFeedView
+from complex.tests.utils import get_timestamp
+
+class TestEventFeed(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+        self.feed = EventFeed(backlog=5)
+        self.feed.poll()
+
+    def tearDown(self):
+        self.user = None
+        self.sensor = None
+        self.feed = None
+
+    def _save(self, count, location=Event.COCKPIT):
+        start = get_timestamp()
+        events = [Event(sensor=self.sensor,
+                        timestamp=start + timedelta(seconds=i),
+                        location=location)
+                  for i in range(count)]
+        save_events(events)
+        return list(Event.objects.filter(sensor=self.sensor,
+                                         timestamp__gte=start).order_by('id'))
+
+    def _read(self, after=None, **kwargs):
+        return list(iter_event_stream(self.feed, self.user, after=after,
+                                      duration=0.05, heartbeat=0.01,
+                                      **kwargs))
+
+    def _ids(self, chunks):
+        return [int(line[4:])
+                for chunk in chunks
+                for line in chunk.splitlines()
+                if line.startswith('id: ')]
+
+    def test_01_first_poll_skips_history(self):
+        head = Event.objects.order_by('-id')[0].id
+        self.assertEqual(head, self.feed.last_id)
+        self.assertEqual(([], True, head), self.feed.since(None))
+
+    def test_02_poll_broadcasts_new_events(self):
+        head = self.feed.last_id
+        events = self._save(3)
+        self.assertEqual(3, self.feed.poll())
+        self.assertEqual(0, self.feed.poll())
+        entries, complete, last = self.feed.since(head)
+        self.assertTrue(complete)
+        self.assertEqual([e.id for e in events], [entry[0] for entry in entries])
+        self.assertEqual(events[-1].id, last)
+        data = loads(entries[0][4])
+        self.assertEqual(self.sensor.id, data['sensor'])
+
+    def test_03_stream_resumes_after_last_event_id(self):
+        events = self._save(3)
+        self.feed.poll()
+        chunks = self._read(after=events[0].id)
+        self.assertTrue(chunks[0].startswith('retry: '))
+        self.assertEqual([e.id for e in events[1:]], self._ids(chunks))
+        self.assertIn('event: reading', chunks[1])
+        self.assertIn(': keepalive\n\n', chunks)
+
+    def test_04_evicted_ids_catch_up_from_database(self):
+        head = self.feed.last_id
+        events = self._save(8)
+        self.feed.poll()
+        entries, complete, last = self.feed.since(head)
+        self.assertFalse(complete)
+        self.assertEqual(5, len(entries))
+        with self.settings(EVENT_FEED_BACKLOG=3):
+            chunks = self._read(after=head)
+        self.assertEqual([e.id for e in events], self._ids(chunks))
+
+    def test_05_filters(self):
+        head = self.feed.last_id
+        events = self._save(2, location=Event.TAIL) + self._save(2)
+        self.feed.poll()
+        chunks = self._read(after=head, locations=[Event.TAIL])
+        self.assertEqual([e.id for e in events[:2]], self._ids(chunks))
+        chunks = self._read(after=head, sensors=[self.sensor.id + 1000])
+        self.assertEqual([], self._ids(chunks))
+        other = User.objects.exclude(pk=self.user.pk)[0]
+        chunks = list(iter_event_stream(self.feed, other, after=head,
+                                        duration=0.05, heartbeat=0.01))
+        self.assertEqual([], self._ids(chunks))
+
+    def test_06_view_streams_from_header(self):
+        complex.feed._feed = self.feed
+        try:
+            events = self._save(2)
+            self.feed.poll()
+            request = RequestFactory().get(reverse('complex:event-feed'),
+                                           HTTP_LAST_EVENT_ID=str(events[0].id))
+            request.user = self.user
+            with self.settings(EVENT_FEED_MAX_SECONDS=0.05,
+                               EVENT_FEED_HEARTBEAT=0.01):
+                response = EventFeedView.as_view()(request)
+                chunks = [chunk.decode('utf-8')
+                          for chunk in response.streaming_content]
+            self.assertEqual('text/event-stream', response['Content-Type'])
+            self.assertEqual([events[1].id], self._ids(chunks))
+            request = RequestFactory().get(reverse('complex:event-feed'),
+                                           {'last_event_id': 'x'})
+            request.user = self.user
+            response = EventFeedView.as_view()(request)
+            self.assertEqual(400, response.status_code)
+        finally:
+            complex.feed._feed = None
+
+    def test_07_late_commit_below_head_is_not_skipped(self):
+        head = self.feed.last_id
+        events = self._save(3)
+        late = Event.objects.get(pk=events[1].pk)
+        Event.objects.filter(pk=late.pk).delete()
+        self.feed.settle = 60
+        self.assertEqual(1, self.feed.poll())
+        self.assertEqual(events[0].id, self.feed.last_id)
+        late.save(force_insert=True)
+        self.assertEqual(2, self.feed.poll())
+        entries, complete, last = self.feed.since(head)
+        self.assertEqual([e.id for e in events], [entry[0] for entry in entries])
+        self.assertEqual([e.id for e in events[1:]],
+                         self._ids(self._read(after=events[0].id)))
+
+    def test_08_gap_older_than_settle_is_skipped(self):
+        events = self._save(3)
+        Event.objects.filter(pk=events[1].pk).delete()
+        self.feed.settle = 60
+        self.assertEqual(1, self.feed.poll())
+        self.assertEqual(0, self.feed.poll())
+        self.feed.settle = 0
+        self.assertEqual(1, self.feed.poll())
+        self.assertEqual(events[2].id, self.feed.last_id)
+
+    def test_09_deleted_rows_close_gaps(self):
+        events = self._save(3)
+        Event.objects.filter(pk=events[1].pk).update(deleted=True)
+        self.feed.settle = 60
+        self.assertEqual(2, self.feed.poll())
+        self.assertEqual(events[2].id, self.feed.last_id)
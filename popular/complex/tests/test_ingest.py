@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from json import dumps, loads
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.exceptions import PermissionDenied
+from django.core.urlresolvers import reverse
+from django.db import IntegrityError, connection, transaction
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from complex.ingest import ingest_events, parse_ndjson, save_events
+from complex.models import Event, Sensor
+from complex.views import EventIngestView
+from complex.tests.utils import get_altitude, get_avg_pressure, get_avg_temp
+from complex.tests.utils import get_camera, get_pct_humidity, get_random_location
+from complex.tests.utils import get_status, get_timestamp, get_windspeed
+
+class TestEventIngest(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+        self.factory = RequestFactory()
+        self.url = reverse('complex:event-ingest')
+
+    def tearDown(self):
+        self.user = None
+        self.sensor = None
+        self.factory = None
+
+    def _get_row(self, **kwargs):
+        row = {'sensor': self.sensor.id,
+               'timestamp': get_timestamp().isoformat(),
+               'location': get_random_location(),
+               'status': get_status(),
+               'camera': get_camera(),
+               'avg_temp': get_avg_temp(),
+               'avg_pressure': get_avg_pressure(),
+               'pct_humidity': get_pct_humidity(),
+               'altitude': get_altitude(),
+               'windspeed': get_windspeed()}
+        row.update(kwargs)
+        return row
+
+    def _post(self, lines, user=None):
+        request = self.factory.post(path=self.url,
+                                    data='\n'.join(lines),
+                                    content_type='application/x-ndjson')
+        request.user = user or self.user
+        return EventIngestView.as_view()(request)
+
+    def test_01_parse_ndjson(self):
+        lines = [dumps(self._get_row()), '', '{broken', '[1, 2]']
+        rows = list(parse_ndjson(lines))
+        self.assertEqual(3, len(rows))
+        self.assertEqual(1, rows[0][0])
+        self.assertIsNone(rows[0][2])
+        self.assertEqual(3, rows[1][0])
+        self.assertIsNone(rows[1][1])
+        self.assertIn('__all__', rows[1][2])
+        self.assertIn('__all__', rows[2][2])
+
+    def test_02_ingest_all_valid(self):
+        count = Event.objects.count()
+        lines = [dumps(self._get_row()) for i in range(25)]
+        results = ingest_events(lines, self.user)
+        self.assertEqual(25, len(results))
+        self.assertTrue(all(r['accepted'] for r in results))
+        self.assertEqual(count + 25, Event.objects.count())
+
+    def test_03_ingest_defaults(self):
+        count = Event.objects.count()
+        row = {'sensor': self.sensor.id,
+               'timestamp': '2017-11-01T08:30:00Z'}
+        results = ingest_events([dumps(row)], self.user)
+        self.assertTrue(results[0]['accepted'])
+        self.assertEqual(count + 1, Event.objects.count())
+        event = Event.objects.order_by('-id')[0]
+        self.assertEqual(Event.COCKPIT, event.location)
+        self.assertEqual(Event.ONLINE, event.status)
+
+    def test_04_ingest_partial_reject(self):
+        count = Event.objects.count()
+        other = User.objects.get(username='add')
+        foreign = Sensor.objects.create(created_by=other,
+                                        name='Foreign',
+                                        sku='111-11111-111',
+                                        serial_no='FOREIGN01')
+        lines = [dumps(self._get_row()),
+                 dumps(self._get_row(location=99)),
+                 dumps(self._get_row(sensor=foreign.id)),
+                 dumps(self._get_row(timestamp='yesterday')),
+                 'not json']
+        results = ingest_events(lines, self.user)
+        self.assertEqual([True, False, False, False, False],
+                         [r['accepted'] for r in results])
+        self.assertIn('location', results[1]['errors'])
+        self.assertIn('sensor', results[2]['errors'])
+        self.assertIn('timestamp', results[3]['errors'])
+        self.assertIn('__all__', results[4]['errors'])
+        self.assertEqual(count + 1, Event.objects.count())
+
+    def test_05_view(self):
+        count = Event.objects.count()
+        lines = [dumps(self._get_row()) for i in range(3)]
+        lines.append(dumps(self._get_row(sensor=None)))
+        response = self._post(lines)
+        self.assertEqual(200, response.status_code)
+        content = loads(response.content.decode('utf-8'))
+        self.assertEqual(3, content['accepted'])
+        self.assertEqual(1, content['rejected'])
+        self.assertEqual(4, len(content['results']))
+        self.assertEqual(count + 3, Event.objects.count())
+
+    def test_06_view_too_large(self):
+        with self.settings(EVENT_INGEST_MAX_ROWS=2):
+            lines = [dumps(self._get_row()) for i in range(3)]
+            response = self._post(lines)
+        self.assertEqual(413, response.status_code)
+
+    def test_07_view_anonymous(self):
+        request = self.factory.post(path=self.url,
+                                    data=dumps(self._get_row()),
+                                    content_type='application/x-ndjson')
+        request.user = AnonymousUser()
+        with self.assertRaises(PermissionDenied):
+            EventIngestView.as_view()(request)
+
+    def test_08_view_method_not_allowed(self):
+        request = self.factory.get(path=self.url)
+        request.user = self.user
+        response = EventIngestView.as_view()(request)
+        self.assertEqual(405, response.status_code)
+
+    def test_09_parse_ndjson_skip(self):
+        lines = ['{broken', '[1, 2]', dumps(self._get_row())]
+        rows = list(parse_ndjson(lines, skip=2))
+        self.assertEqual(1, len(rows))
+        self.assertEqual(3, rows[0][0])
+        self.assertIsNone(rows[0][2])
+
+class TestEventUpsert(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+
+    def tearDown(self):
+        self.user = None
+        self.sensor = None
+
+    def _get_events(self, timestamps, **kwargs):
+        return [Event(sensor=self.sensor, timestamp=t, **kwargs)
+                for t in timestamps]
+
+    def test_01_insert_new(self):
+        count = Event.objects.count()
+        timestamps = [get_timestamp() for i in range(5)]
+        counts = save_events(self._get_events(timestamps))
+        self.assertEqual({'created': 5, 'updated': 0, 'unchanged': 0}, counts)
+        self.assertEqual(count + 5, Event.objects.count())
+
+    def test_02_replay_is_noop(self):
+        timestamps = [get_timestamp() for i in range(5)]
+        save_events(self._get_events(timestamps, altitude=100))
+        count = Event.objects.count()
+        counts = save_events(self._get_events(timestamps, altitude=100))
+        self.assertEqual({'created': 0, 'updated': 0, 'unchanged': 5}, counts)
+        self.assertEqual(count, Event.objects.count())
+
+    def test_03_update_changed(self):
+        timestamps = [get_timestamp() for i in range(3)]
+        save_events(self._get_events(timestamps, altitude=100))
+        count = Event.objects.count()
+        events = self._get_events(timestamps, altitude=100)
+        events[1].altitude = 200
+        events.append(Event(sensor=self.sensor, timestamp=get_timestamp()))
+        counts = save_events(events)
+        self.assertEqual({'created': 1, 'updated': 1, 'unchanged': 2}, counts)
+        self.assertEqual(count + 1, Event.objects.count())
+        actual = Event.objects.get(sensor=self.sensor, timestamp=timestamps[1])
+        self.assertEqual(200, actual.altitude)
+
+    def test_04_duplicates_within_batch(self):
+        count = Event.objects.count()
+        timestamp = get_timestamp()
+        events = self._get_events([timestamp, timestamp], altitude=100)
+        events[1].altitude = 300
+        counts = save_events(events)
+        self.assertEqual({'created': 1, 'updated': 0, 'unchanged': 0}, counts)
+        self.assertEqual(count + 1, Event.objects.count())
+        actual = Event.objects.get(sensor=self.sensor, timestamp=timestamp)
+        self.assertEqual(300, actual.altitude)
+
+    def test_05_ingest_replay(self):
+        lines = [dumps({'sensor': self.sensor.id,
+                        'timestamp': get_timestamp().isoformat(),
+                        'windspeed': i}) for i in range(4)]
+        ingest_events(lines, self.user)
+        count = Event.objects.count()
+        results = ingest_events(lines, self.user)
+        self.assertTrue(all(r['accepted'] for r in results))
+        self.assertEqual(count, Event.objects.count())
+
+    def test_06_unique_constraint(self):
+        timestamp = get_timestamp()
+        Event.objects.create(sensor=self.sensor, timestamp=timestamp)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Event.objects.create(sensor=self.sensor, timestamp=timestamp)
+
+    def test_07_replay_keeps_soft_delete(self):
+        timestamps = [get_timestamp() for i in range(2)]
+        save_events(self._get_events(timestamps, altitude=100))
+        Event.objects.filter(sensor=self.sensor,
+                             timestamp=timestamps[0]).update(deleted=True)
+        counts = save_events(self._get_events(timestamps, altitude=100))
+        self.assertEqual({'created': 0, 'updated': 0, 'unchanged': 2}, counts)
+        events = self._get_events(timestamps, altitude=200)
+        events[1].windspeed = 7
+        with CaptureQueriesContext(connection) as queries:
+            counts = save_events(events)
+        self.assertEqual(1, len([q for q in queries
+                                 if q['sql'].startswith('UPDATE "complex_event"')]))
+        self.assertEqual({'created': 0, 'updated': 2, 'unchanged': 0}, counts)
+        rows = Event.objects.filter(sensor=self.sensor,
+                                    timestamp__in=timestamps).order_by(
+                                    'timestamp').values_list(
+                                    'deleted', 'altitude', 'windspeed')
+        self.assertEqual([(True, 200), (False, 200)],
+                         [row[:2] for row in rows])
+        self.assertEqual(7, rows[1][2])
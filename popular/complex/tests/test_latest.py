@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import RequestFactory, TestCase
+from django.utils.six import StringIO
+from django.utils.timezone import utc
+
+from complex.ingest import save_events
+from complex.latest import update_latest
+from complex.models import Event, Sensor, SensorLatest
+from complex.views import FleetStatusView
+
+NOW = datetime(2017, 11, 1, 10, tzinfo=utc)
+
+class TestSensorLatest(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+
+    def tearDown(self):
+        self.user = None
+        self.sensor = None
+
+    def _get_event(self, minutes, **kwargs):
+        return Event(sensor=self.sensor,
+                     timestamp=NOW + timedelta(minutes=minutes),
+                     **kwargs)
+
+    def test_01_ingest_keeps_newest(self):
+        save_events([self._get_event(10, status=Event.LOW_POWER),
+                     self._get_event(5, status=Event.ONLINE)])
+        latest = SensorLatest.objects.get(sensor=self.sensor)
+        self.assertEqual(NOW + timedelta(minutes=10), latest.timestamp)
+        self.assertEqual(Event.LOW_POWER, latest.status)
+
+    def test_02_older_batch_does_not_rewind(self):
+        save_events([self._get_event(10, avg_temp=Decimal('3.00'))])
+        save_events([self._get_event(1, avg_temp=Decimal('9.00'))])
+        latest = SensorLatest.objects.get(sensor=self.sensor)
+        self.assertEqual(Decimal('3.00'), latest.avg_temp)
+        save_events([self._get_event(10, avg_temp=Decimal('4.00'))])
+        latest = SensorLatest.objects.get(sensor=self.sensor)
+        self.assertEqual(Decimal('4.00'), latest.avg_temp)
+
+    def test_03_soft_delete_falls_back(self):
+        save_events([self._get_event(1, windspeed=1),
+                     self._get_event(2, windspeed=2)])
+        event = Event.objects.get(sensor=self.sensor,
+                                  timestamp=NOW + timedelta(minutes=2))
+        event.deleted = True
+        event.save()
+        update_latest([event])
+        latest = SensorLatest.objects.get(sensor=self.sensor)
+        self.assertEqual(NOW + timedelta(minutes=1), latest.timestamp)
+        self.assertEqual(1, latest.windspeed)
+
+    def test_04_rebuild_from_history(self):
+        out = StringIO()
+        call_command('rebuild_latest', stdout=out)
+        reported = Event.objects.filter(deleted=False).values(
+                       'sensor').distinct().count()
+        self.assertEqual(reported, SensorLatest.objects.count())
+        for latest in SensorLatest.objects.all():
+            newest = Event.objects.filter(sensor=latest.sensor_id,
+                                          deleted=False).order_by(
+                                          '-timestamp')[0]
+            self.assertEqual(newest.timestamp, latest.timestamp)
+            self.assertEqual(newest.status, latest.status)
+        self.assertIn('rebuilt latest state for {} sensors'.format(reported),
+                      out.getvalue())
+
+    def test_05_fleet_status_view(self):
+        call_command('rebuild_latest', stdout=StringIO())
+        request = RequestFactory().get(reverse('complex:fleet-status'))
+        request.user = self.user
+        with self.assertNumQueries(1):
+            response = FleetStatusView.as_view()(request)
+            response.render()
+        rows = response.context_data['object_list']
+        self.assertTrue(rows)
+        for latest in rows:
+            self.assertEqual(self.user, latest.sensor.created_by)
+            self.assertIn(latest.status, dict(Event.STATUS).values())
@@ -3,7 +3,9 @@ from __future__ import unicode_literals
 
 from django.contrib.auth.models import User
 from django.core.management import call_command
+from django.core.urlresolvers import reverse
 from django.test import TestCase
+from django.utils.timezone import timedelta
 
 from complex.models import Event, Sensor
 from complex.tests.utils import get_alt_units, get_pressure_units
@@ -131,14 +133,33 @@ class TestEventModel(TestCase):
         s = Sensor.objects.create(**self.sensor_data)
         self.event_data.update({'sensor': s}) 
         expected = Event(**self.event_data)
-        expected.save()
         self.assertIsNone(expected.link)
         self.assertIsNone(expected.dlink)
         self.assertIsNone(expected.ulink)
+        expected.save()
+        kwargs = {'pk': expected.pk}
+        self.assertEqual(reverse('complex:event-detail', kwargs=kwargs),
+                         expected.link)
+        self.assertEqual(reverse('complex:event-update', kwargs=kwargs),
+                         expected.ulink)
+        self.assertEqual(reverse('complex:event-delete', kwargs=kwargs),
+                         expected.dlink)
         actual = Event.objects.get(id=expected.id)
-        self.assertIsNotNone(actual.link)
-        self.assertIsNotNone(actual.dlink)
-        self.assertIsNotNone(actual.ulink)
+        self.assertEqual(expected.link, actual.link)
+
+    def test_08_sensor_range(self):
+        s = Sensor.objects.create(**self.sensor_data)
+        t0 = get_timestamp()
+        for minutes in [5, 1, 3, 9, 7]:
+            self.event_data.update({'sensor': s,
+                                    'timestamp': t0 + timedelta(minutes=minutes)})
+            Event.objects.create(**self.event_data)
+        actual = Event.objects.sensor_range(s,
+                                            t0 + timedelta(minutes=3),
+                                            t0 + timedelta(minutes=9))
+        self.assertEqual([t0 + timedelta(minutes=m) for m in [3, 5, 7]],
+                         [e.timestamp for e in actual])
+        self.assertEqual(5, Event.objects.sensor_range(s.pk).count())
 
 class TestSensorModel(TestCase):
     fixtures = ['sensor', 'user']
@@ -214,12 +235,17 @@ class TestSensorModel(TestCase):
 
     def test_07_save(self):
         expected = Sensor(**self.data)
-        expected.save()
         self.assertIsNone(expected.link)
         self.assertIsNone(expected.dlink)
         self.assertIsNone(expected.ulink)
+        expected.save()
+        kwargs = {'pk': expected.pk}
+        self.assertEqual(reverse('complex:sensor-detail', kwargs=kwargs),
+                         expected.link)
+        self.assertEqual(reverse('complex:sensor-update', kwargs=kwargs),
+                         expected.ulink)
+        self.assertEqual(reverse('complex:sensor-delete', kwargs=kwargs),
+                         expected.dlink)
         actual = Sensor.objects.get(id=expected.id)
-        self.assertIsNotNone(actual.link)
-        self.assertIsNotNone(actual.dlink)
-        self.assertIsNotNone(actual.ulink)
+        self.assertEqual(expected.link, actual.link)
 
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import date, datetime
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.utils.six import StringIO
+from django.utils.timezone import get_fixed_timezone
+
+from complex.partitions import PartitioningUnsupported, check_supported
+from complex.partitions import create_partition_sql, drop_partition_sql
+from complex.partitions import month_start, next_month, parse_month
+from complex.partitions import partition_name
+
+class TestEventPartitions(TestCase):
+
+    def test_01_month_start_is_utc(self):
+        value = datetime(2017, 11, 1, 1, 30,
+                         tzinfo=get_fixed_timezone(300))
+        self.assertEqual(date(2017, 10, 1), month_start(value))
+        self.assertEqual(date(2017, 11, 1), month_start(date(2017, 11, 30)))
+
+    def test_02_next_month(self):
+        self.assertEqual(date(2018, 1, 1), next_month(date(2017, 12, 1)))
+        self.assertEqual(date(2017, 12, 1), next_month(date(2017, 11, 1)))
+
+    def test_03_parse_month(self):
+        self.assertEqual(date(2017, 3, 1), parse_month('2017-03'))
+        with self.assertRaises(ValueError):
+            parse_month('March')
+
+    def test_04_partition_sql(self):
+        month = date(2017, 12, 1)
+        self.assertEqual('complex_event_y2017m12', partition_name(month))
+        sql = create_partition_sql(month)
+        self.assertIn('PARTITION OF "complex_event"', sql)
+        self.assertIn("FROM ('2017-12-01T00:00:00+00:00') "
+                      "TO ('2018-01-01T00:00:00+00:00')", sql)
+        detach, drop = drop_partition_sql(month)
+        self.assertIn('DETACH PARTITION "complex_event_y2017m12"', detach)
+        self.assertEqual('DROP TABLE "complex_event_y2017m12"', drop)
+
+    def test_05_unsupported_backend(self):
+        if connection.vendor == 'postgresql':
+            return
+        with self.assertRaises(PartitioningUnsupported):
+            check_supported()
+        with self.assertRaises(CommandError):
+            call_command('event_partitions', ensure=2, stdout=StringIO())
+
+    def test_06_command_arguments(self):
+        with self.assertRaises(CommandError):
+            call_command('event_partitions', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('event_partitions', drop=['2017/11'], stdout=StringIO())
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.six import StringIO
+from django.utils.timezone import utc
+
+from complex.ingest import save_events
+from complex.models import Event, Sensor, SensorHourlyRollup
+from complex.rollups import hour_floor, refresh_rollups
+
+HOUR = datetime(2017, 11, 1, 10, tzinfo=utc)
+
+class TestSensorHourlyRollup(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+
+    def tearDown(self):
+        self.user = None
+        self.sensor = None
+
+    def _get_event(self, minutes, **kwargs):
+        return Event(sensor=self.sensor,
+                     timestamp=HOUR + timedelta(minutes=minutes),
+                     **kwargs)
+
+    def _get_rollup(self, hour=HOUR):
+        return SensorHourlyRollup.objects.get(sensor=self.sensor, hour=hour)
+
+    def test_01_hour_floor(self):
+        value = datetime(2017, 11, 1, 10, 59, 59, 999999, tzinfo=utc)
+        self.assertEqual(HOUR, hour_floor(value))
+
+    def test_02_ingest_updates_rollup(self):
+        save_events([self._get_event(5, avg_temp=Decimal('10.00'), windspeed=4),
+                     self._get_event(20, avg_temp=Decimal('20.00'), windspeed=9,
+                                     status=Event.CLIMATE_FAULT),
+                     self._get_event(70, avg_temp=Decimal('1.00'))])
+        rollup = self._get_rollup()
+        self.assertEqual(2, rollup.count)
+        self.assertEqual(Decimal('30.00'), rollup.avg_temp_sum)
+        self.assertEqual(Decimal('10.00'), rollup.avg_temp_min)
+        self.assertEqual(Decimal('20.00'), rollup.avg_temp_max)
+        self.assertEqual(Decimal('15'), rollup.mean('avg_temp'))
+        self.assertEqual(9, rollup.windspeed_max)
+        self.assertEqual(1, rollup.online)
+        self.assertEqual(1, rollup.climate_fault)
+        self.assertEqual(1, rollup.faults)
+        self.assertEqual(1, self._get_rollup(HOUR + timedelta(hours=1)).count)
+
+    def test_03_upsert_replaces_extremes(self):
+        save_events([self._get_event(5, windspeed=4),
+                     self._get_event(20, windspeed=90)])
+        self.assertEqual(90, self._get_rollup().windspeed_max)
+        save_events([self._get_event(20, windspeed=7)])
+        rollup = self._get_rollup()
+        self.assertEqual(2, rollup.count)
+        self.assertEqual(7, rollup.windspeed_max)
+        self.assertEqual(11, rollup.windspeed_sum)
+
+    def test_04_deleted_events_drop_bucket(self):
+        save_events([self._get_event(5)])
+        event = Event.objects.get(sensor=self.sensor, timestamp=HOUR +
+                                  timedelta(minutes=5))
+        event.delete()
+        refresh_rollups([(event.sensor_id, event.timestamp)])
+        self.assertFalse(SensorHourlyRollup.objects.filter(
+                         sensor=self.sensor, hour=HOUR).exists())
+
+    def test_05_rebuild_matches_incremental(self):
+        save_events([self._get_event(i * 17, pct_humidity=i) for i in range(10)])
+        fields = [f.name for f in SensorHourlyRollup._meta.fields
+                  if f.name != 'id']
+        rollups = SensorHourlyRollup.objects.sensor_range(
+                      self.sensor, HOUR, HOUR + timedelta(hours=3))
+        incremental = list(rollups.values_list(*fields))
+        self.assertEqual(3, len(incremental))
+        SensorHourlyRollup.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertEqual(incremental, list(rollups.values_list(*fields)))
+        self.assertIn('rebuilt {} hourly rollups'.format(
+                      SensorHourlyRollup.objects.count()), out.getvalue())
+
+    def test_06_rebuild_window(self):
+        save_events([self._get_event(5), self._get_event(65)])
+        SensorHourlyRollup.objects.all().delete()
+        call_command('rebuild_rollups', sensor=[self.sensor.id],
+                     start=HOUR.isoformat(),
+                     end=(HOUR + timedelta(minutes=30)).isoformat(),
+                     stdout=StringIO())
+        self.assertEqual([HOUR], list(SensorHourlyRollup.objects.values_list(
+                                      'hour', flat=True)))
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+from json import loads
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.http import Http404
+from django.test import RequestFactory, TestCase
+from django.utils.timezone import utc
+
+from complex.ingest import save_events
+from complex.models import Event, Sensor
+from complex.series import SeriesTooLarge, load_hourly_series, load_series
+from complex.series import lttb, minmax
+from complex.views import EventSeriesView
+
+START = datetime(2017, 11, 1, tzinfo=utc)
+
+class TestDownsampling(TestCase):
+
+    def setUp(self):
+        self.x = np.arange(1000, dtype=np.float64)
+        self.y = np.sin(self.x / 50.0)
+        self.y[437] = 25.0
+        self.y[801] = -25.0
+
+    def tearDown(self):
+        self.x = None
+        self.y = None
+
+    def test_01_lttb_keeps_shape(self):
+        kept = lttb(self.x, self.y, 50)
+        self.assertEqual(50, len(kept))
+        self.assertEqual(0, kept[0])
+        self.assertEqual(999, kept[-1])
+        self.assertTrue(np.all(np.diff(kept) > 0))
+        self.assertIn(437, kept)
+        self.assertIn(801, kept)
+
+    def test_02_lttb_short_series(self):
+        self.assertEqual(list(range(10)), lttb(self.x[:10], self.y[:10], 50).tolist())
+        self.assertEqual(0, len(lttb(self.x[:0], self.y[:0], 50)))
+
+    def test_03_minmax_keeps_extremes(self):
+        kept = minmax(self.x, self.y, 40)
+        self.assertTrue(len(kept) <= 40)
+        self.assertTrue(np.all(np.diff(kept) > 0))
+        self.assertIn(437, kept)
+        self.assertIn(801, kept)
+
+class TestEventSeriesView(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+        self.factory = RequestFactory()
+        save_events([Event(sensor=self.sensor,
+                           timestamp=START + timedelta(minutes=i),
+                           windspeed=i % 60)
+                     for i in range(600)])
+
+    def tearDown(self):
+        self.user = None
+        self.sensor = None
+        self.factory = None
+
+    def _get(self, sensor=None, **params):
+        url = reverse('complex:sensor-series',
+                      kwargs={'pk': (sensor or self.sensor).pk})
+        request = self.factory.get(url, params)
+        request.user = self.user
+        return EventSeriesView.as_view()(request, pk=(sensor or self.sensor).pk)
+
+    def test_01_load_series(self):
+        x, y = load_series(self.sensor, 'windspeed', START,
+                           START + timedelta(minutes=10))
+        self.assertEqual(10, len(x))
+        self.assertEqual((START - datetime(1970, 1, 1, tzinfo=utc)).total_seconds(),
+                         x[0])
+        self.assertEqual(list(range(10)), y.tolist())
+
+    def test_02_series_is_bounded(self):
+        response = self._get(measurement='windspeed',
+                             start=START.isoformat(),
+                             points=40)
+        self.assertEqual(200, response.status_code)
+        content = loads(response.content.decode('utf-8'))
+        self.assertEqual(600, content['count'])
+        self.assertEqual('lttb', content['method'])
+        self.assertEqual(40, len(content['points']))
+        self.assertEqual(59, max(v for t, v in content['points']))
+
+    def test_03_minmax(self):
+        response = self._get(measurement='windspeed',
+                             start=START.isoformat(),
+                             points=40,
+                             method='minmax')
+        content = loads(response.content.decode('utf-8'))
+        values = [v for t, v in content['points']]
+        self.assertTrue(len(values) <= 40)
+        self.assertEqual(0, min(values))
+        self.assertEqual(59, max(values))
+
+    def test_04_invalid_measurement(self):
+        response = self._get(measurement='deleted')
+        self.assertEqual(400, response.status_code)
+        self.assertIn('measurement',
+                      loads(response.content.decode('utf-8'))['errors'])
+
+    def test_05_foreign_sensor(self):
+        other = Sensor.objects.create(created_by=User.objects.get(username='add'),
+                                      name='Foreign',
+                                      sku='111-11111-111',
+                                      serial_no='FOREIGN03')
+        with self.assertRaises(Http404):
+            self._get(sensor=other, measurement='windspeed')
+
+    def test_06_max_rows(self):
+        with self.assertRaises(SeriesTooLarge):
+            load_series(self.sensor, 'windspeed', START, max_rows=599)
+        x, y = load_series(self.sensor, 'windspeed', START, max_rows=600)
+        self.assertEqual(600, len(y))
+
+    def test_07_large_window_reads_hourly_rollups(self):
+        x, y = load_hourly_series(self.sensor, 'windspeed', START)
+        self.assertEqual(10, len(x))
+        self.assertEqual([29.5] * 10, y.tolist())
+        x, y = load_hourly_series(self.sensor, 'windspeed', START,
+                                  extremes=True)
+        self.assertEqual([0.0, 59.0] * 10, y.tolist())
+        with self.settings(EVENT_SERIES_MAX_ROWS=100):
+            response = self._get(measurement='windspeed',
+                                 start=START.isoformat(),
+                                 method='minmax')
+        self.assertEqual(200, response.status_code)
+        content = loads(response.content.decode('utf-8'))
+        self.assertEqual('hour', content['resolution'])
+        self.assertEqual(600, content['count'])
+        self.assertEqual(20, len(content['points']))
+        self.assertEqual(0, min(v for t, v in content['points']))
+        self.assertEqual(59, max(v for t, v in content['points']))
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from json import loads
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import RequestFactory, TestCase
+from django.utils.six import StringIO
+
+from complex.models import Event
+from complex.stats import event_stats, grouped_stats, iter_columns
+from complex.views import EventStatsView
+
+class TestEventStats(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+
+    def tearDown(self):
+        self.user = None
+
+    def test_01_grouped_stats_match_numpy(self):
+        keys = np.array([3, 1, 3, 1, 3, 2, 3], dtype=np.int64)
+        values = np.array([4.0, 7.0, 1.0, 5.0, 9.0, 2.0, 3.0])
+        stats = grouped_stats(keys, values, (10, 50, 90))
+        self.assertEqual([1, 2, 3], list(stats))
+        group = values[keys == 3]
+        self.assertEqual(4, stats[3]['count'])
+        self.assertAlmostEqual(group.mean(), stats[3]['mean'])
+        self.assertAlmostEqual(group.std(), stats[3]['std'])
+        self.assertEqual(1.0, stats[3]['min'])
+        self.assertEqual(9.0, stats[3]['max'])
+        for p in (10, 50, 90):
+            self.assertAlmostEqual(np.percentile(group, p),
+                                   stats[3]['p{}'.format(p)])
+        self.assertEqual(0.0, stats[2]['std'])
+        self.assertEqual(2.0, stats[2]['p90'])
+
+    def test_02_chunked_load(self):
+        queryset = Event.objects.filter(deleted=False)
+        chunks = list(iter_columns(queryset, 'sensor', ['windspeed'],
+                                   chunk_size=3))
+        self.assertTrue(all(len(keys) <= 3 for keys, values in chunks))
+        expected = list(queryset.order_by('id').values_list('sensor_id',
+                                                            'windspeed'))
+        self.assertEqual([k for k, v in expected],
+                         [k for keys, values in chunks for k in keys.tolist()])
+        self.assertEqual([float(v) for k, v in expected],
+                         [v for keys, values in chunks
+                            for v in values[:, 0].tolist()])
+
+    def test_03_event_stats_by_location(self):
+        stats = event_stats(group_by='location', measurements=['altitude'])
+        for location, measurements in stats.items():
+            altitudes = list(Event.objects.filter(
+                                 location=location, deleted=False).values_list(
+                                 'altitude', flat=True))
+            self.assertEqual(len(altitudes), measurements['altitude']['count'])
+            self.assertEqual(max(altitudes), measurements['altitude']['max'])
+
+    def test_04_view(self):
+        url = reverse('complex:event-stats')
+        request = RequestFactory().get(url, {'group_by': 'location',
+                                             'measurement': ['avg_temp',
+                                                             'windspeed']})
+        request.user = self.user
+        response = EventStatsView.as_view()(request)
+        self.assertEqual(200, response.status_code)
+        content = loads(response.content.decode('utf-8'))
+        owned = Event.objects.filter(sensor__created_by=self.user,
+                                     deleted=False)
+        self.assertEqual(owned.count(),
+                         sum(g['stats']['windspeed']['count']
+                             for g in content['groups']))
+        for group in content['groups']:
+            self.assertEqual(dict(Event.LOCATIONS)[group['key']], group['label'])
+            self.assertEqual(['avg_temp', 'windspeed'], sorted(group['stats']))
+
+    def test_05_view_invalid_group(self):
+        request = RequestFactory().get(reverse('complex:event-stats'),
+                                       {'group_by': 'camera'})
+        request.user = self.user
+        response = EventStatsView.as_view()(request)
+        self.assertEqual(400, response.status_code)
+
+    def test_06_command(self):
+        out = StringIO()
+        call_command('event_stats', measurement=['windspeed'],
+                     percentile=[50], chunk_size=2, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual('sensor\tmeasurement\tcount\tmean\tstd\tmin\tmax\tp50',
+                         lines[0])
+        sensors = Event.objects.filter(deleted=False).values(
+                      'sensor').distinct().count()
+        self.assertEqual(sensors, len(lines) - 1)
+
+    def test_07_streamed_moments_and_sample(self):
+        queryset = Event.objects.filter(deleted=False)
+        exact = event_stats(queryset, measurements=['altitude'],
+                            chunk_size=1000)
+        streamed = event_stats(queryset, measurements=['altitude'],
+                               chunk_size=3)
+        sampled = event_stats(queryset, measurements=['altitude'],
+                              chunk_size=3, sample_size=2)
+        self.assertEqual(list(exact), list(streamed))
+        for key, measurements in exact.items():
+            expected = measurements['altitude']
+            for name in ('count', 'mean', 'std', 'min', 'max', 'p50'):
+                self.assertAlmostEqual(expected[name],
+                                       streamed[key]['altitude'][name])
+            stats = sampled[key]['altitude']
+            for name in ('count', 'mean', 'std', 'min', 'max'):
+                self.assertAlmostEqual(expected[name], stats[name])
+            self.assertTrue(expected['min'] <= stats['p50'] <= expected['max'])
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from csv import reader
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import RequestFactory, TestCase
+from django.utils.six import StringIO
+from django.utils.timezone import utc
+
+from complex.export import iter_event_csv
+from complex.ingest import save_events
+from complex.models import Event, Sensor
+from complex.units import SensorUnits, convert, convert_events
+from complex.views import EventDetailView, EventExportView
+
+START = datetime(2017, 11, 1, tzinfo=utc)
+
+class TestUnitConversion(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        sensors = Sensor.objects.filter(created_by=self.user)
+        self.metric = sensors[0]
+        self.imperial = sensors[1]
+        Sensor.objects.filter(pk=self.metric.pk).update(
+            temp_units=Sensor.CELSIUS, pressure_units=Sensor.ATM,
+            alt_units=Sensor.KILOMETERS, ws_units=Sensor.KILOMETERS_PER_HOUR)
+        Sensor.objects.filter(pk=self.imperial.pk).update(
+            temp_units=Sensor.FAHRENHEIT, pressure_units=Sensor.PSI,
+            alt_units=Sensor.MILES, ws_units=Sensor.MILES_PER_HOUR)
+        save_events([Event(sensor_id=sensor.pk,
+                           timestamp=START,
+                           avg_temp=Decimal('100.00'),
+                           avg_pressure=Decimal('1.00'),
+                           altitude=10,
+                           windspeed=100)
+                     for sensor in (self.metric, self.imperial)])
+
+    def tearDown(self):
+        self.user = None
+        self.metric = None
+        self.imperial = None
+
+    def test_01_convert(self):
+        values = convert([Decimal('100.00'), Decimal('-40.00'), 0],
+                         [Sensor.FAHRENHEIT, Sensor.FAHRENHEIT, Sensor.CELSIUS])
+        self.assertEqual([212.0, -40.0, 0.0], values.tolist())
+        self.assertEqual([14.7], convert([1], [Sensor.PSI]).tolist())
+        self.assertEqual([62.14], convert([100], [Sensor.MILES]).tolist())
+        self.assertEqual([6.21], convert([10], [Sensor.MILES_PER_HOUR]).tolist())
+
+    def test_02_convert_events_per_sensor(self):
+        events = list(Event.objects.select_related('sensor').filter(
+                          timestamp=START).order_by('sensor'))
+        with self.assertNumQueries(0):
+            convert_events(events)
+        metric, imperial = sorted(events, key=lambda e: e.sensor_id != self.metric.pk)
+        self.assertEqual(100.0, metric.display['avg_temp'])
+        self.assertEqual('Celsius', metric.display['temp_units'])
+        self.assertEqual(212.0, imperial.display['avg_temp'])
+        self.assertEqual('Fahrenheit', imperial.display['temp_units'])
+        self.assertEqual(14.7, imperial.display['avg_pressure'])
+        self.assertEqual(6.21, imperial.display['altitude'])
+        self.assertEqual(62.14, imperial.display['windspeed'])
+        self.assertEqual(Decimal('100.00'), imperial.avg_temp)
+
+    def test_03_sensor_units_caches_sensors(self):
+        columns = ['id', 'sensor_id', 'avg_temp']
+        units = SensorUnits(columns)
+        rows = list(Event.objects.filter(sensor=self.imperial, timestamp=START)
+                                 .values_list(*columns))
+        with self.assertNumQueries(1):
+            units.convert_rows(rows)
+            converted = units.convert_rows(rows)
+        self.assertEqual(212.0, converted[0][2])
+
+    def test_04_detail_view(self):
+        event = Event.objects.get(sensor=self.imperial, timestamp=START)
+        request = RequestFactory().get(reverse('complex:event-detail',
+                                               kwargs={'pk': event.pk}))
+        request.user = self.user
+        response = EventDetailView.as_view()(request, pk=event.pk)
+        response.render()
+        self.assertIn('212.0 Fahrenheit', response.content.decode('utf-8'))
+
+    def test_05_export_in_sensor_units(self):
+        queryset = Event.objects.filter(timestamp=START)
+        lines = list(iter_event_csv(queryset, sensor_units=True))
+        rows = list(reader(StringIO(''.join(lines))))
+        temps = dict((int(row[1]), row[6]) for row in rows[1:])
+        self.assertEqual('212.0', temps[self.imperial.pk])
+        self.assertEqual('100.0', temps[self.metric.pk])
+        request = RequestFactory().get(reverse('complex:event-export'),
+                                       {'units': 'sensor',
+                                        'sensor': self.imperial.pk,
+                                        'start': START.isoformat()})
+        request.user = self.user
+        response = EventExportView.as_view()(request)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn(',212.0,14.7,', content)
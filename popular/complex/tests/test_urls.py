@@ -68,6 +68,11 @@ class TestEventURLConf(TestCase):
         self.assertEqual(expected, reverse_lazy('complex:event-list',
                                                 kwargs={'page': 2}))
 
+    def test_07_ingest(self):
+        expected = '/complex/events/ingest/'
+        self.assertEqual(expected, reverse('complex:event-ingest'))
+        self.assertEqual(expected, reverse_lazy('complex:event-ingest'))
+
 
 class TestSensorURLConf(TestCase):
     def setUp(self):
@@ -118,3 +123,10 @@ class TestSensorURLConf(TestCase):
                                            kwargs={'page': 2}))
         self.assertEqual(expected, reverse_lazy('complex:sensor-list',
                                                 kwargs={'page': 2}))
+
+    def test_07_events(self):
+        expected = '/complex/sensors/1/events/'
+        self.assertEqual(expected, reverse('complex:sensor-events',
+                                           kwargs={'pk': 1}))
+        self.assertEqual(expected, reverse_lazy('complex:sensor-events',
+                                                kwargs={'pk': 1}))
@@ -7,12 +7,17 @@ from django.contrib import admin
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import Group, Permission, User
 from django.core.urlresolvers import reverse
+from django.http import Http404
 from django.http import HttpRequest
+from django.utils.timezone import datetime, pytz, timedelta
 from django.shortcuts import get_object_or_404
+from django.db import connection
 from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 
 from complex.models import Event, Sensor
 from complex.forms import EventForm, SensorForm
+from complex.views import EventListView, EventRangeView
 from complex.views import SensorCreateView, SensorDeleteView, SensorDetailView
 from complex.views import SensorListView, SensorUpdateView
 from complex.tests.utils import get_alt_units, get_pressure_units
@@ -251,3 +256,159 @@ class TestSensorView(TestCase):
         soup = BeautifulSoup(response.content, 'html.parser')
         print(soup.prettify())
         self.assertTrue(False)
+
+class TestEventRangeView(TestCase):
+    fixtures = ['sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.sensor = Sensor.objects.filter(created_by=self.user)[0]
+        self.other = Sensor.objects.filter(created_by=self.user)[1]
+        self.factory = RequestFactory()
+        self.t0 = datetime(2017, 11, 1, tzinfo=pytz.utc)
+        for i in range(10):
+            Event.objects.create(sensor=self.sensor,
+                                 timestamp=self.t0 + timedelta(minutes=10 - i),
+                                 altitude=i)
+            Event.objects.create(sensor=self.other,
+                                 timestamp=self.t0 + timedelta(minutes=i))
+
+    def tearDown(self):
+        self.user = None
+        self.sensor = None
+        self.other = None
+        self.factory = None
+
+    def _get(self, pk, **params):
+        url = reverse('complex:sensor-events', kwargs={'pk': pk})
+        request = self.factory.get(path=url, data=params)
+        request.user = self.user
+        return EventRangeView.as_view()(request, pk=pk)
+
+    def test_01_window_in_timestamp_order(self):
+        start = self.t0 + timedelta(minutes=3)
+        end = self.t0 + timedelta(minutes=7)
+        response = self._get(self.sensor.pk,
+                             start=start.isoformat(),
+                             end=end.isoformat())
+        self.assertEqual(200, response.status_code)
+        content = loads(response.content.decode('utf-8'))
+        self.assertEqual([7, 6, 5, 4], [e['altitude'] for e in content['events']])
+        self.assertIsNone(content['next'])
+
+    def test_02_truncated_window_resumes(self):
+        response = self._get(self.sensor.pk, limit=4)
+        content = loads(response.content.decode('utf-8'))
+        self.assertEqual([9, 8, 7, 6], [e['altitude'] for e in content['events']])
+        self.assertIsNotNone(content['next'])
+        path, query = content['next'].split('?')
+        request = self.factory.get('{}?{}'.format(path, query))
+        request.user = self.user
+        response = EventRangeView.as_view()(request, pk=self.sensor.pk)
+        content = loads(response.content.decode('utf-8'))
+        self.assertEqual([5, 4, 3, 2], [e['altitude'] for e in content['events']])
+
+    def test_03_invalid_datetime(self):
+        response = self._get(self.sensor.pk, start='last tuesday')
+        self.assertEqual(400, response.status_code)
+
+    def test_04_foreign_sensor(self):
+        sensor = Sensor.objects.create(created_by=User.objects.get(username='add'),
+                                       name='Foreign',
+                                       sku='111-11111-111',
+                                       serial_no='FOREIGN02')
+        with self.assertRaises(Http404):
+            self._get(sensor.pk)
+
+class TestKeysetPagination(TestCase):
+    fixtures = ['event', 'sensor', 'user']
+
+    def setUp(self):
+        self.user = User.objects.get(username='qa')
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.user = None
+        self.factory = None
+
+    def _get(self, view, url):
+        request = self.factory.get(url)
+        request.user = self.user
+        response = view.as_view()(request)
+        self.assertEqual(200, response.status_code)
+        return response.context_data
+
+    def _walk(self, view, url, key):
+        seen = []
+        context = self._get(view, url)
+        self.assertIsNone(context['prev_url'])
+        pages = [context]
+        while True:
+            seen.extend(key(obj) for obj in context['object_list'])
+            if not context['next_url']:
+                break
+            context = self._get(view, context['next_url'])
+            pages.append(context)
+        return (seen, pages)
+
+    def test_01_sensor_pages(self):
+        url = reverse('complex:sensor-list')
+        seen, pages = self._walk(SensorListView, url, lambda s: s.id)
+        expected = list(Sensor.objects.filter(created_by=self.user)
+                                      .order_by('id')
+                                      .values_list('id', flat=True))
+        self.assertEqual(expected, seen)
+        self.assertEqual(2, len(pages))
+        context = self._get(SensorListView, pages[-1]['prev_url'])
+        self.assertEqual(expected[:5], [s.id for s in context['object_list']])
+        self.assertIsNone(context['prev_url'])
+
+    def test_02_event_pages_without_count(self):
+        # a second sensor reporting at the same instant exercises the id
+        # tie-breaker in the (timestamp, id) keyset
+        event = Event.objects.order_by('timestamp')[0]
+        sensor = Sensor.objects.exclude(pk=event.sensor_id)[0]
+        Event.objects.create(sensor=sensor, timestamp=event.timestamp)
+        url = reverse('complex:event-list')
+        with CaptureQueriesContext(connection) as queries:
+            seen, pages = self._walk(EventListView, url,
+                                     lambda e: (e.timestamp, e.id))
+        self.assertEqual(sorted(Event.objects.values_list('timestamp', 'id')),
+                         seen)
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+        context = self._get(EventListView, pages[3]['prev_url'])
+        self.assertEqual([(e.timestamp, e.id) for e in pages[2]['object_list']],
+                         [(e.timestamp, e.id) for e in context['object_list']])
+
+    def test_03_invalid_cursor(self):
+        url = '{}?cursor=garbage'.format(reverse('complex:sensor-list'))
+        request = self.factory.get(url)
+        request.user = self.user
+        with self.assertRaises(Http404):
+            SensorListView.as_view()(request)
+
+    def test_04_page_mode_kept(self):
+        url = '{}?page=2'.format(reverse('complex:sensor-list'))
+        context = self._get(SensorListView, url)
+        self.assertTrue(context['is_paginated'])
+        self.assertEqual(2, context['page_obj'].number)
+
+    def test_05_event_page_single_query(self):
+        request = self.factory.get(reverse('complex:event-list'))
+        request.user = self.user
+        with self.assertNumQueries(1):
+            response = EventListView.as_view()(request)
+            response.render()
+        events = response.context_data['object_list']
+        self.assertEqual(5, len(events))
+        for event in events:
+            self.assertIn(event.location, dict(Event.LOCATIONS).values())
+
+    def test_06_seek_bounds_leading_field(self):
+        first = self._get(EventListView, reverse('complex:event-list'))
+        with CaptureQueriesContext(connection) as queries:
+            context = self._get(EventListView, first['next_url'])
+            self._get(EventListView, context['prev_url'])
+        forward, backward = [q['sql'] for q in queries]
+        self.assertIn('"complex_event"."timestamp" >= ', forward)
+        self.assertIn('"complex_event"."timestamp" <= ', backward)
@@ -3,8 +3,13 @@ from django.contrib import admin
 
 from complex.views import CreatedView, DeletedView, UpdatedView
 from complex.views import EventCreateView, EventDeleteView
-from complex.views import EventDetailView, EventListView
-from complex.views import EventUpdateView, HomePageView
+from complex.views import EventDetailView, EventExportView, EventFeedView
+from complex.views import EventIngestView
+from complex.views import EventListView
+from complex.views import EventRangeView, EventSeriesView, EventStatsView
+from complex.views import EventUpdateView
+from complex.views import FaultDashboardView, FleetStatusView
+from complex.views import HomePageView
 from complex.views import SensorCreateView, SensorDeleteView
 from complex.views import SensorDetailView, SensorListView
 from complex.views import SensorUpdateView, ThanksView
@@ -29,6 +34,18 @@ urlpatterns = [
     url(r'^events/add/$',
         EventCreateView.as_view(),
         name='event-create'),
+    url(r'^events/export/$',
+        EventExportView.as_view(),
+        name='event-export'),
+    url(r'^events/feed/$',
+        EventFeedView.as_view(),
+        name='event-feed'),
+    url(r'^events/ingest/$',
+        EventIngestView.as_view(),
+        name='event-ingest'),
+    url(r'^events/stats/$',
+        EventStatsView.as_view(),
+        name='event-stats'),
     url(r'^events/(?P<pk>\d+)/delete/$',
         EventDeleteView.as_view(),
         name='event-delete'),
@@ -44,12 +61,24 @@ urlpatterns = [
     url(r'^events/(?P<pk>\d+)/update/$',
         EventUpdateView.as_view(),
         name='event-update'),
+    url(r'^faults/$',
+        FaultDashboardView.as_view(),
+        name='fault-dashboard'),
+    url(r'^fleet/$',
+        FleetStatusView.as_view(),
+        name='fleet-status'),
     url(r'^sensors/add/$',
         SensorCreateView.as_view(),
         name='sensor-create'),
     url(r'^sensors/(?P<pk>\d+)/delete/$',
         SensorDeleteView.as_view(),
         name='sensor-delete'),
+    url(r'^sensors/(?P<pk>\d+)/events/$',
+        EventRangeView.as_view(),
+        name='sensor-events'),
+    url(r'^sensors/(?P<pk>\d+)/series/$',
+        EventSeriesView.as_view(),
+        name='sensor-series'),
     url(r'^sensors/(?P<pk>\d+)/$',
         SensorDetailView.as_view(),
         name='sensor-detail'),
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import datetime
+
+from django.core.management.base import CommandError
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import is_naive, make_aware, utc
+
+EPOCH = datetime(1970, 1, 1, tzinfo=utc)
+MEASUREMENT_CHOICES = (
+    ('avg_temp', 'Average Temperature'),
+    ('avg_pressure', 'Average Pressure'),
+    ('pct_humidity', 'Percentage Humidity'),
+    ('altitude', 'Altitude'),
+    ('windspeed', 'Windspeed')
+)
+MEASUREMENTS = [name for name, label in MEASUREMENT_CHOICES]
+
+def parse_iso_datetime(value):
+    """
+    value: str, ISO 8601 datetime with optional 'T' separator and offset
+    return: aware datetime, a naive one taken in the current time zone, or
+            None when value is not a valid datetime
+    """
+    try:
+        parsed = parse_datetime(value.strip())
+    except ValueError as e:
+        return None
+    if parsed is not None and is_naive(parsed):
+        parsed = make_aware(parsed)
+    return parsed
+
+def datetime_option(name, value):
+    """
+    name: str, command line option without the leading dashes
+    value: str or None as given on the command line
+    return: aware datetime or None when the option was not given
+    raise: CommandError when value is not an ISO 8601 datetime
+    """
+    if value is None:
+        return None
+    parsed = parse_iso_datetime(value)
+    if parsed is None:
+        raise CommandError('--{} is not an ISO 8601 datetime: {}'.format(
+                           name, value))
+    return parsed
+
+def date_option(value):
+    """
+    value: str, YYYY-MM-DD as given on the command line
+    return: date
+    raise: CommandError when value is not a valid date
+    """
+    try:
+        day = parse_date(value)
+    except ValueError as e:
+        day = None
+    if day is None:
+        raise CommandError('not a YYYY-MM-DD date: {}'.format(value))
+    return day
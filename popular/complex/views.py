@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from tempfile import TemporaryFile
+
+from django.conf import settings
 from django.core.paginator import InvalidPage, Paginator
 from django.core.urlresolvers import reverse_lazy
 from django.contrib import messages
@@ -8,14 +11,33 @@ from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
 from django.db import IntegrityError, models
-from django.http import Http404, HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_list_or_404, get_object_or_404, render
+from django.utils.timezone import now, timedelta
 from django.views.decorators.cache import cache_page
 from django.views.generic import CreateView, DeleteView, DetailView
-from django.views.generic import ListView, TemplateView, UpdateView
-
-from complex.forms import EventForm, SensorForm, SensorUpdateForm
-from complex.models import Event, Sensor 
+from django.views.generic import ListView, TemplateView, UpdateView, View
+
+from complex.anomalies import detect_anomalies
+from complex.buffer import BufferFull, get_event_buffer
+from complex.export import iter_event_csv, write_event_npz
+from complex.faults import FAULT_BUCKETS, fault_buckets, fault_cache_prefix
+from complex.faults import invalidate_faults
+from complex.feed import get_event_feed, iter_event_stream
+from complex.forms import EventExportForm, EventFeedForm, EventForm
+from complex.forms import EventRangeForm
+from complex.forms import EventSeriesForm, EventStatsForm, FaultDashboardForm
+from complex.forms import SensorForm, SensorUpdateForm
+from complex.ingest import ingest_events
+from complex.latest import refresh_latest
+from complex.models import Event, Sensor, SensorLatest
+from complex.pagination import KeysetPaginationMixin
+from complex.rollups import refresh_rollups
+from complex.series import DOWNSAMPLERS, SeriesTooLarge, load_hourly_series
+from complex.series import load_series
+from complex.stats import event_stats
+from complex.units import convert_events
 
 
 class EventCreateView(CreateView):
@@ -38,6 +60,11 @@ class EventCreateView(CreateView):
 
     def form_valid(self, form):
         self.object = form.save()
+        keys = [(self.object.sensor_id, self.object.timestamp)]
+        refresh_rollups(keys)
+        invalidate_faults(keys)
+        refresh_latest([self.object.sensor_id])
+        detect_anomalies([self.object])
         self.success_url = reverse_lazy('complex:created',
                                         kwargs={'pk': self.object.pk})
         return super(EventCreateView, self).form_valid(form)
@@ -52,7 +79,12 @@ class EventDeleteView(DeleteView):
         self.object = self.get_object()
         self.success_url = reverse_lazy('complex:deleted',
                                         kwargs={'pk': self.object.pk})
-        return super(EventDeleteView, self).delete(request, *args, **kwargs)
+        response = super(EventDeleteView, self).delete(request, *args, **kwargs)
+        keys = [(self.object.sensor_id, self.object.timestamp)]
+        refresh_rollups(keys)
+        invalidate_faults(keys)
+        refresh_latest([self.object.sensor_id])
+        return response
 
     def get_object(self, queryset=None):
         object = Event.objects.get(pk=self.kwargs['pk'])
@@ -70,17 +102,121 @@ class EventDetailView(DetailView):
                             kwargs={'pk': self.pk})
 
     def get_object(self, queryset=None):
-        event = Event.objects.get(pk=self.kwargs['pk'])
+        event = Event.objects.select_related('sensor').get(pk=self.kwargs['pk'])
+        convert_events([event])
         event.location = event.get_location_display()
         event.status = event.get_status_display()
         event.camera = event.get_camera_display()
         return event
 
-class EventListView(ListView):
+class EventExportView(LoginRequiredMixin, View):
+    """
+    GET /complex/events/export/?sensor=<pk>&location=<n>&status=<n>
+        &start=<iso>&end=<iso>&format=csv|npz&units=stored|sensor
+    streams the user's non-deleted events in id order, as CSV in the
+    layout import_events accepts or as a .npz of typed column arrays
+    """
+    http_method_names = ['get']
+    raise_exception = True
+
+    def get(self, request, *args, **kwargs):
+        form = EventExportForm(data=request.GET, user=request.user)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        queryset = Event.objects.filter(sensor__created_by=request.user,
+                                        deleted=False)
+        for name in ['sensor', 'location', 'status']:
+            if form.cleaned_data[name]:
+                queryset = queryset.filter(**{'{}__in'.format(name):
+                                              form.cleaned_data[name]})
+        if form.cleaned_data['start'] is not None:
+            queryset = queryset.filter(timestamp__gte=form.cleaned_data['start'])
+        if form.cleaned_data['end'] is not None:
+            queryset = queryset.filter(timestamp__lt=form.cleaned_data['end'])
+        sensor_units = form.cleaned_data['units'] == 'sensor'
+        if form.cleaned_data['format'] == 'npz':
+            archive = TemporaryFile()
+            write_event_npz(queryset, archive, sensor_units=sensor_units)
+            archive.seek(0)
+            response = FileResponse(archive,
+                                    content_type='application/octet-stream')
+        else:
+            response = StreamingHttpResponse(
+                           iter_event_csv(queryset, sensor_units=sensor_units),
+                           content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="events.{}"'.format(
+                                              form.cleaned_data['format'])
+        return response
+
+class EventFeedView(LoginRequiredMixin, View):
+    """
+    GET /complex/events/feed/?sensor=<pk>&location=<n>&last_event_id=<id>
+    text/event-stream of the user's newly stored events, one 'reading'
+    message per event with the event id as its id; reconnecting clients
+    resume through the Last-Event-ID header
+    """
+    http_method_names = ['get']
+    raise_exception = True
+
+    def get(self, request, *args, **kwargs):
+        data = request.GET.copy()
+        if 'HTTP_LAST_EVENT_ID' in request.META:
+            data['last_event_id'] = request.META['HTTP_LAST_EVENT_ID']
+        form = EventFeedForm(data=data, user=request.user)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        response = StreamingHttpResponse(
+                       iter_event_stream(get_event_feed(),
+                                         request.user,
+                                         form.cleaned_data['sensor'],
+                                         form.cleaned_data['location'],
+                                         form.cleaned_data['last_event_id']),
+                       content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class EventIngestView(LoginRequiredMixin, View):
+    """
+    POST a newline-delimited JSON body, one event per line, e.g.
+    {"sensor": 1, "timestamp": "2017-10-31T21:24:06Z", "avg_temp": 21.5}
+    With settings.EVENT_WRITE_BEHIND accepted rows are queued for the
+    background writer and the response is 202 instead of 200.
+    """
+    http_method_names = ['post']
+    raise_exception = True
+
+    def post(self, request, *args, **kwargs):
+        try:
+            lines = request.body.decode('utf-8').splitlines()
+        except UnicodeDecodeError as e:
+            return JsonResponse({'error': 'body must be UTF-8 encoded'},
+                                status=400)
+        if len(lines) > settings.EVENT_INGEST_MAX_ROWS:
+            error = 'batch exceeds {} rows'.format(settings.EVENT_INGEST_MAX_ROWS)
+            return JsonResponse({'error': error}, status=413)
+        buffer = None
+        status = 200
+        if settings.EVENT_WRITE_BEHIND:
+            buffer = get_event_buffer()
+            status = 202
+        try:
+            results = ingest_events(lines, request.user, buffer)
+        except BufferFull as e:
+            return JsonResponse({'error': 'ingest backlog full, retry later'},
+                                status=503)
+        accepted = len([r for r in results if r['accepted']])
+        return JsonResponse({'accepted': accepted,
+                             'rejected': len(results) - accepted,
+                             'results': results},
+                            status=status)
+
+class EventListView(KeysetPaginationMixin, ListView):
     allow_empty = True
     context_object_name = 'object_list'
     http_method_not_allowed = ['delete', 'patch', 'post', 'put']
     form = EventForm
+    keyset_fields = ('timestamp', 'id')
     paginate_by = 5
     paginate_orphans = 0
     paginator_class = Paginator
@@ -88,11 +224,137 @@ class EventListView(ListView):
     #queryset = Event.objects.all()
     template_name = 'complex/event_list.html'
 
-    def get_queryset(self):
-        queryset = Event.objects.all()
-        for event in queryset:
+    def get_context_data(self, **kwargs):
+        context = super(EventListView, self).get_context_data(**kwargs)
+        for event in convert_events(list(context['object_list'])):
             event.location = event.get_location_display()
-        return queryset
+        return context
+
+    def get_queryset(self):
+        return Event.objects.select_related('sensor')
+
+class EventRangeView(LoginRequiredMixin, View):
+    """
+    GET /complex/sensors/<pk>/events/?start=<iso>&end=<iso>&limit=<n>
+    returns the sensor's events for [start, end) in timestamp order;
+    a truncated window carries a 'next' url resuming after the last row
+    """
+    http_method_names = ['get']
+    raise_exception = True
+    fields = ['id', 'timestamp', 'location', 'status', 'camera', 'avg_temp',
+              'avg_pressure', 'pct_humidity', 'altitude', 'windspeed']
+
+    def get(self, request, *args, **kwargs):
+        sensor = get_object_or_404(Sensor,
+                                   pk=self.kwargs['pk'],
+                                   created_by=request.user)
+        form = EventRangeForm(data=request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        start = form.cleaned_data['start']
+        end = form.cleaned_data['end']
+        after = form.cleaned_data['after']
+        limit = min(form.cleaned_data['limit'] or settings.EVENT_RANGE_MAX_ROWS,
+                    settings.EVENT_RANGE_MAX_ROWS)
+        queryset = Event.objects.sensor_range(sensor, start, end)
+        if after is not None:
+            queryset = queryset.filter(timestamp__gt=after)
+        events = list(queryset.values(*self.fields)[:limit + 1])
+        context = {'sensor': sensor.pk,
+                   'start': start,
+                   'end': end,
+                   'events': events[:limit],
+                   'next': None}
+        if len(events) > limit:
+            params = request.GET.copy()
+            params['after'] = events[limit - 1]['timestamp'].isoformat()
+            context['next'] = '{}?{}'.format(request.path, params.urlencode())
+        return JsonResponse(context)
+
+class EventSeriesView(LoginRequiredMixin, View):
+    """
+    GET /complex/sensors/<pk>/series/?measurement=avg_temp&start=<iso>
+        &end=<iso>&points=<k>&method=lttb|minmax
+    returns at most k [epoch seconds, value] pairs for charting, however
+    many readings fall inside [start, end); a window of more than
+    settings.EVENT_SERIES_MAX_ROWS readings is downsampled from the
+    hourly rollups and reported with resolution 'hour'
+    """
+    http_method_names = ['get']
+    raise_exception = True
+
+    def get(self, request, *args, **kwargs):
+        sensor = get_object_or_404(Sensor,
+                                   pk=self.kwargs['pk'],
+                                   created_by=request.user)
+        form = EventSeriesForm(data=request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        measurement = form.cleaned_data['measurement']
+        method = form.cleaned_data['method']
+        resolution = 'raw'
+        try:
+            x, y = load_series(sensor,
+                               measurement,
+                               form.cleaned_data['start'],
+                               form.cleaned_data['end'])
+            count = len(x)
+        except SeriesTooLarge as e:
+            x, y = load_hourly_series(sensor,
+                                      measurement,
+                                      form.cleaned_data['start'],
+                                      form.cleaned_data['end'],
+                                      extremes=method == 'minmax')
+            resolution = 'hour'
+            count = e.args[0]
+        kept = DOWNSAMPLERS[method](x, y, form.cleaned_data['points'])
+        points = [[int(t), round(v, 2)]
+                  for t, v in zip(x[kept].tolist(), y[kept].tolist())]
+        return JsonResponse({'sensor': sensor.pk,
+                             'measurement': measurement,
+                             'method': method,
+                             'resolution': resolution,
+                             'start': form.cleaned_data['start'],
+                             'end': form.cleaned_data['end'],
+                             'count': count,
+                             'points': points})
+
+class EventStatsView(LoginRequiredMixin, View):
+    """
+    GET /complex/events/stats/?group_by=sensor|location&measurement=avg_temp
+        &start=<iso>&end=<iso>
+    returns count, mean, std, min, max and percentiles of each measurement
+    per group over the user's non-deleted events
+    """
+    http_method_names = ['get']
+    raise_exception = True
+
+    def get(self, request, *args, **kwargs):
+        form = EventStatsForm(data=request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        group_by = form.cleaned_data['group_by']
+        queryset = Event.objects.filter(sensor__created_by=request.user,
+                                        deleted=False)
+        if form.cleaned_data['start'] is not None:
+            queryset = queryset.filter(timestamp__gte=form.cleaned_data['start'])
+        if form.cleaned_data['end'] is not None:
+            queryset = queryset.filter(timestamp__lt=form.cleaned_data['end'])
+        stats = event_stats(queryset,
+                            group_by,
+                            form.cleaned_data['measurement'])
+        labels = dict(Event.LOCATIONS)
+        groups = []
+        for key, measurements in stats.items():
+            group = {'key': key,
+                     'stats': measurements}
+            if group_by == 'location':
+                group['label'] = labels.get(key)
+            groups.append(group)
+        return JsonResponse({'group_by': group_by,
+                             'start': form.cleaned_data['start'],
+                             'end': form.cleaned_data['end'],
+                             'groups': groups})
 
 class EventUpdateView(UpdateView):
     model = Event
@@ -103,6 +365,13 @@ class EventUpdateView(UpdateView):
 
     def form_valid(self, form):
         form.save()
+        # form.initial still holds the key the event was stored under
+        keys = [(form.initial['sensor'].pk, form.initial['timestamp']),
+                (self.object.sensor_id, self.object.timestamp)]
+        refresh_rollups(keys)
+        invalidate_faults(keys)
+        refresh_latest([form.initial['sensor'].pk, self.object.sensor_id])
+        detect_anomalies([self.object])
         self.success_url = reverse_lazy('complex:updated',
                                         kwargs={'pk': self.object.pk})
         return super(EventUpdateView, self).form_valid(form)
@@ -119,6 +388,64 @@ class EventUpdateView(UpdateView):
                 'altitude': self.object.altitude,
                 'windspeed': self.object.windspeed}
 
+class FaultDashboardView(LoginRequiredMixin, View):
+    """
+    GET /complex/faults/?bucket=5m|1h|1d&start=<iso>&end=<iso>
+    returns fault counts per location per bucket over the user's sensors,
+    by default for the last EVENT_FAULT_BUCKETS buckets
+    """
+    http_method_names = ['get']
+    raise_exception = True
+
+    def get(self, request, *args, **kwargs):
+        form = FaultDashboardForm(data=request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        bucket = form.cleaned_data['bucket']
+        size = FAULT_BUCKETS[bucket]
+        end = form.cleaned_data['end'] or now()
+        start = form.cleaned_data['start'] or \
+                end - timedelta(seconds=size * settings.EVENT_FAULT_BUCKETS)
+        if end <= start:
+            return JsonResponse({'errors': {'end': ['end must follow start']}},
+                                status=400)
+        if (end - start).total_seconds() / size > settings.EVENT_FAULT_MAX_BUCKETS:
+            error = 'window exceeds {} buckets'.format(
+                        settings.EVENT_FAULT_MAX_BUCKETS)
+            return JsonResponse({'errors': {'__all__': [error]}}, status=400)
+        queryset = Event.objects.filter(sensor__created_by=request.user)
+        buckets = fault_buckets(queryset, start, end, size,
+                                fault_cache_prefix(request.user.pk))
+        return JsonResponse({'bucket': bucket,
+                             'start': start,
+                             'end': end,
+                             'locations': dict(Event.LOCATIONS),
+                             'buckets': [{'start': b, 'counts': counts}
+                                         for b, counts in buckets]})
+
+class FleetStatusView(LoginRequiredMixin, ListView):
+    """
+    current status of every sensor owned by the user, one SensorLatest
+    row each instead of a greatest-per-group query over Event
+    """
+    allow_empty = True
+    context_object_name = 'object_list'
+    http_method_not_allowed = ['delete', 'patch', 'post', 'put']
+    template_name = 'complex/fleet_status.html'
+
+    def get_context_data(self, **kwargs):
+        context = super(FleetStatusView, self).get_context_data(**kwargs)
+        for latest in context['object_list']:
+            latest.location = latest.get_location_display()
+            latest.status = latest.get_status_display()
+            latest.camera = latest.get_camera_display()
+        return context
+
+    def get_queryset(self):
+        return SensorLatest.objects.filter(
+                   sensor__created_by=self.request.user).select_related(
+                   'sensor')
+
 class HomePageView(TemplateView):
     template_name = 'complex/index.html'
 
@@ -173,11 +500,12 @@ class SensorDetailView(DetailView):
         sensor.ws_units = sensor.get_ws_units_display()
         return sensor
 
-class SensorListView(ListView):
+class SensorListView(KeysetPaginationMixin, ListView):
     allow_empty = True
     context_object_name = 'object_list'
     form = SensorForm
     http_method_not_allowed = ['delete', 'patch', 'post', 'put']
+    keyset_fields = ('id',)
     paginate_by = 5
     paginate_orphans = 0
     paginator_class = Paginator
@@ -185,26 +513,10 @@ class SensorListView(ListView):
     template_name = 'complex/sensor_list.html'
 
     def get_queryset(self):
-        return get_list_or_404(Sensor,
-                               created_by=self.request.user)
-        print('request attrs: {}'.format(self.request.GET))
-        qs = get_list_or_404(Sensor, 
-                             created_by=self.request.user)
-        page = self.get_paginate_by(self.request.GET.get('page'))
-        return self.paginate_queryset(qs, page)
-        #attrs: ['__class__', '__delattr__', '__dict__', '__doc__', '__format__',
-        #        '__getattribute__', '__hash__', '__init__', '__module__', '__new__',
-        #        '__reduce__', '__reduce_ex__', '__repr__', '__setattr__', '__sizeof__',
-        #        '__str__', '__subclasshook__', '__weakref__', '_allowed_methods',
-        #        'allow_empty', 'args', 'as_view', 'content_type', 'context_object_name',
-        #        'dispatch', 'form', 'get', 'get_allow_empty', 'get_context_data',
-        #        'get_context_object_name', 'get_ordering', 'get_paginate_by',
-        #        'get_paginate_orphans', 'get_paginator', 'get_queryset', 'get_template_names',
-        #        'head', 'http_method_names', 'http_method_not_allowed', 'kwargs', 'model',
-        #        'options', 'ordering', 'page_kwarg', 'paginate_by', 'paginate_orphans',
-        #        'paginate_queryset', 'paginator_class', 'queryset', 'render_to_response',
-        #        'request', 'response_class', 'template_engine', 'template_name',
-        #        'template_name_suffix']
+        queryset = Sensor.objects.filter(created_by=self.request.user)
+        if not queryset.exists():
+            raise Http404('No Sensor matches the given query.')
+        return queryset
 
 class SensorUpdateView(UpdateView):
     model = Sensor
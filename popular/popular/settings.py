@@ -73,6 +73,8 @@ WSGI_APPLICATION = 'popular.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
+# complex_event is partitioned by month only on PostgreSQL 11 or later
+# (migration 0008, manage.py event_partitions); on SQLite it is one table.
 
 DATABASES = {
     'default': {
@@ -143,3 +145,29 @@ CACHES = {
         'LOCATION': '127.0.0.1:11211',
     }
 }
+EVENT_INGEST_BATCH_SIZE = 500
+EVENT_INGEST_MAX_ROWS = 10000
+EVENT_WRITE_BEHIND = False
+EVENT_BUFFER_FLUSH_MS = 500
+EVENT_BUFFER_FLUSH_ROWS = 1000
+EVENT_BUFFER_MAX_ROWS = 100000
+EVENT_RANGE_MAX_ROWS = 5000
+EVENT_SERIES_POINTS = 300
+EVENT_SERIES_MAX_POINTS = 1000
+EVENT_SERIES_MAX_ROWS = 500000
+EVENT_STATS_CHUNK_ROWS = 50000
+EVENT_STATS_SAMPLE_ROWS = 10000
+EVENT_FAULT_BUCKETS = 24
+EVENT_FAULT_MAX_BUCKETS = 500
+EVENT_FAULT_GRACE = 300
+EVENT_EXPORT_CHUNK_ROWS = 2000
+EVENT_ARCHIVE_DIR = os.path.join(BASE_DIR, 'archive')
+EVENT_ANOMALY_ZSCORE = 4.0
+EVENT_ANOMALY_MIN_COUNT = 30
+EVENT_ANOMALY_WINDOW = 1000
+EVENT_FEED_POLL_MS = 1000
+EVENT_FEED_BACKLOG = 1000
+EVENT_FEED_SETTLE_MS = 5000
+EVENT_FEED_HEARTBEAT = 15
+EVENT_FEED_MAX_SECONDS = 300
+EVENT_FEED_RETRY_MS = 3000